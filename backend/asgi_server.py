@@ -0,0 +1,671 @@
+# Asynchronous (ASGI) variant of server.py, serving the same routes with Starlette:
+#   uvicorn asgi_server:app --host 0.0.0.0 --port 3050
+#   (or: python asgi_server.py)
+#
+# Request bodies are received on the event loop, so one process can hold many slow
+# mobile uploads open. CPU work is handed to executors in stages, each with its own
+# cap on concurrent requests:
+#   decode    - JSON/base64 parsing, image decoding and preprocessing (thread pool)
+#   inference - TFLite invokes, which release the GIL (thread pool)
+#   rgb       - the RGB distance classifier (process pool)
+# Requests over a stage's cap wait on the event loop without holding a thread.
+import os
+import time
+import signal
+import asyncio
+import binascii
+import threading
+import logging
+import functools
+import contextlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+# server.py preloads models and starts the model and dataset watchers when it is
+# imported. Here the lifespan hook does that instead, so the RGB processes, which
+# import server.py too, only load the reference images (see start_rgb_workers).
+# The environment is changed before any thread exists and is inherited by them.
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+DATASET_WATCH_INTERVAL = float(os.environ.get("DATASET_MANIFEST_CHECK_INTERVAL", "0"))
+PRELOAD_MODELS = [name for name in os.environ.get("PRELOAD_MODELS", "").split(",") if name]
+os.environ.update(MODEL_WATCH_INTERVAL="0", DATASET_MANIFEST_CHECK_INTERVAL="0", PRELOAD_MODELS="")
+
+from server import (MAX_UPLOAD_BYTES, VALID_COLORS, VALIDATION_MODELS, PoolTimeoutError,
+                    build_full_report, check_admin_token, classify_image_api, format_classification_result,
+                    format_validation_result, image_digest, init_worker, is_report_cacheable, json_body_limit,
+                    load_input_array_cached, measure_rgb_difference, model_registry, parse_json_images,
+                    parse_threshold, predict_binary_classification, predict_classification, preprocess_cache,
+                    preprocess_image_bytes, refresh_dataset_manifest, result_cache, start_dataset_watcher,
+                    upload_body_limit)
+
+logger = logging.getLogger(__name__)
+
+# ============= CONFIGURATION =============
+# Requests allowed in each stage at once
+DECODE_CONCURRENCY = int(os.environ.get("ASGI_DECODE_CONCURRENCY", os.cpu_count() or 1))
+INFERENCE_CONCURRENCY = int(os.environ.get("ASGI_INFERENCE_CONCURRENCY", os.cpu_count() or 1))
+RGB_CONCURRENCY = int(os.environ.get("ASGI_RGB_CONCURRENCY", os.cpu_count() or 1))
+
+# Processes running the RGB distance classifier. They are started fresh (spawn)
+# rather than forked from this multithreaded server, and memory-map the reference
+# packs, so they share the reference images through the page cache.
+RGB_PROCESSES = int(os.environ.get("ASGI_RGB_PROCESSES", RGB_CONCURRENCY))
+# =========================================
+
+# One thread per stage slot; model loads and admin work use the same pool
+stage_executor = ThreadPoolExecutor(max_workers=DECODE_CONCURRENCY + INFERENCE_CONCURRENCY + RGB_CONCURRENCY,
+                                    thread_name_prefix="asgi-stage")
+rgb_executor = None
+rgb_executor_lock = threading.Lock()
+
+# Stages by name, created once the event loop runs (see lifespan)
+stages = {}
+
+
+class Stage:
+    """
+    A step of request processing run in an executor, with a cap on how many
+    requests it runs at once.
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._active = 0
+        self._waiting = 0
+        self._completed = 0
+        self._busy_seconds = 0.0
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Run function(*args, **kwargs) in the stage thread pool once a slot is free.
+
+        Returns:
+            The function's return value (its exceptions are re-raised)
+        """
+        self._waiting += 1
+        async with self._semaphore:
+            self._waiting -= 1
+            self._active += 1
+            start_time = time.perf_counter()
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(stage_executor, functools.partial(function, *args, **kwargs))
+            finally:
+                self._active -= 1
+                self._completed += 1
+                self._busy_seconds += time.perf_counter() - start_time
+
+    def metrics(self):
+        """Return the stage's cap, current load and completed work."""
+        return {
+            "limit": self.limit,
+            "active": self._active,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "avg_ms": self._busy_seconds / self._completed * 1000 if self._completed else 0.0
+        }
+
+
+async def run_blocking(function, *args):
+    """Run a blocking call outside of any stage (model loads, admin work)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(stage_executor, functools.partial(function, *args))
+
+def init_rgb_worker():
+    """Ignore Ctrl-C in the RGB processes; the server stops them on shutdown."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def start_rgb_workers():
+    """
+    Start the RGB classifier processes, replacing (and shutting down) the current ones.
+    
+    The new processes load the reference images from the reference packs as they
+    are on disk now, so this is also how they pick up a dataset reload. The
+    current processes keep serving requests until the new ones are ready.
+    """
+    global rgb_executor
+    with rgb_executor_lock:
+        old_executor = rgb_executor
+        new_executor = ProcessPoolExecutor(max_workers=RGB_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=init_rgb_worker)
+        # Each submit with no idle worker starts a new process; wait until all are up
+        for future in [new_executor.submit(os.getpid) for _ in range(RGB_PROCESSES)]:
+            future.result()
+        rgb_executor = new_executor
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+
+def on_dataset_reload(reloaded_colors):
+    """Restart the RGB processes with the reloaded reference images and drop stale results."""
+    start_rgb_workers()
+    # Results computed by the old processes may have been cached during the restart
+    result_cache.clear()
+    logger.info(f"RGB classifier processes restarted for {', '.join(reloaded_colors)}")
+
+def classify_in_rgb_worker(cache_key, input_array, color, pyramid):
+    """
+    Classify an image in an RGB classifier process, sharing the result through the
+    result cache. Runs in an rgb stage thread, which waits for the process.
+    """
+    executor = rgb_executor
+    return result_cache.get_or_compute(
+        cache_key,
+        lambda: executor.submit(classify_image_api, input_array, color,
+                                max_images=20, verbose=True, pyramid=pyramid).result()
+    )
+
+
+class UploadParser(MultiPartParser):
+    """Multipart parser keeping uploaded files in memory instead of spooling files over 1 MB to disk."""
+
+    # Bodies are bounded by BodySizeLimitMiddleware
+    max_file_size = MAX_UPLOAD_BYTES
+
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies over the limit of their route with 413: up front from the
+    Content-Length, or while a chunked body is received.
+
+    Once a chunked body goes over the limit the app is told the client
+    disconnected, and whatever it does about that (an error, or a response of
+    its own) is discarded in favor of the 413.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = get_body_limit(scope["path"])
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = PlainTextResponse("Request Entity Too Large", status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if too_large:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+
+        if too_large and not response_started:
+            response = PlainTextResponse("Request Entity Too Large", status_code=413)
+            await response(scope, receive, send)
+
+def get_body_limit(path):
+    """Largest body accepted by a route (same limits as server.py)."""
+    num_images = 2 if path.startswith("/rgb-difference") else 1
+    if path.endswith("/upload"):
+        return upload_body_limit(num_images)
+    return json_body_limit(num_images)
+
+# ============= REQUEST PARSING =============
+async def read_json_images(request, field_names=("image",)):
+    """
+    Receive a JSON request and decode its base64 image fields (see
+    server.parse_json_images) in the decode stage. Bodies that are not JSON are
+    rejected with 415.
+
+    Returns:
+        tuple: (data, images) as returned by parse_json_images
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type != "application/json" and not content_type.endswith("+json"):
+        raise HTTPException(status_code=415, detail="Request Content-Type must be application/json")
+    body = await request.body()
+    return await stages["decode"].run(parse_json_images, body, field_names)
+
+async def read_image_json_request(request, endpoint_name):
+    """
+    Receive a JSON request of the TF endpoints ({"image", "mimeType", ...}).
+
+    Returns:
+        tuple: (data, img_bytes, None), or (None, None, error response)
+    """
+    try:
+        data, (img_bytes,) = await read_json_images(request)
+        if not img_bytes or not data.get("mimeType"):
+            return None, None, JSONResponse({"error": "Invalid input - missing image or mimeType"}, 400)
+        return data, img_bytes, None
+    except binascii.Error as e:
+        logger.error(f"Invalid base64 image data: {e}")
+        return None, None, JSONResponse({"error": "Error processing image"}, 400)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in {endpoint_name} endpoint: {e}")
+        return None, None, JSONResponse({"error": str(e)}, 500)
+
+async def read_uploaded_images(request, field_names=("image",)):
+    """
+    Receive the images of an upload request, sent either as multipart/form-data
+    files or (for a single image) as a raw image/* or application/octet-stream body.
+
+    Returns:
+        tuple: (images, values) with the raw encoded image bytes per field (None for
+        fields not sent), and the form fields and query parameters
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    values = {}
+
+    if content_type == "multipart/form-data":
+        try:
+            form = await UploadParser(request.headers, request.stream()).parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        try:
+            images = []
+            for name in field_names:
+                upload = form.get(name)
+                images.append(await upload.read() if hasattr(upload, "read") else None)
+            values.update((key, value) for key, value in form.items() if isinstance(value, str))
+        finally:
+            await form.close()
+    elif len(field_names) == 1 and (content_type.startswith("image/") or
+                                    content_type == "application/octet-stream"):
+        images = [await request.body()]
+    else:
+        images = [None] * len(field_names)
+
+    # Query parameters take precedence, as in Flask's request.values
+    values.update(request.query_params)
+
+    if any(image and len(image) > MAX_UPLOAD_BYTES for image in images):
+        raise HTTPException(status_code=413)
+    return images, values
+
+# =========================================
+
+# ============= PROCESSING =============
+async def predict_image(img_bytes):
+    """Classify the wood type of an image with the default model."""
+    try:
+        model_pool = await run_blocking(model_registry.get, 'default')
+        if not model_pool:
+            return JSONResponse({"error": "Model not loaded"}, 500)
+
+        model_spec = model_registry.spec('default')
+        preprocessed_image = await stages["decode"].run(
+            preprocess_image_bytes, img_bytes, model_spec.get("color_space", "lab"), model_registry.input_size('default'))
+        if preprocessed_image is None:
+            return JSONResponse({"error": "Error processing image"}, 400)
+
+        # Retries and identical concurrent uploads share one inference
+        cache_key = ("predict", "default", image_digest(img_bytes))
+        result = await stages["inference"].run(
+            result_cache.get_or_compute, cache_key,
+            lambda: predict_classification(model_pool, preprocessed_image, model_registry.class_names('default')))
+        return JSONResponse(result)
+
+    except PoolTimeoutError as e:
+        logger.warning(str(e))
+        return JSONResponse({"error": str(e)}, 503)
+    except Exception as e:
+        logger.error(f"Error in prediction endpoint: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+async def validate_image(model_name, img_bytes, threshold=None):
+    """Check whether an image is within range for a color with its validation model."""
+    try:
+        threshold = parse_threshold(threshold)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, 400)
+
+    try:
+        # Threshold, color space and input size come from the model manifest
+        model_spec = model_registry.spec(model_name) or {}
+        if threshold is None:
+            threshold = model_spec.get("threshold", 0.5)
+        color_space = model_spec.get("color_space", "lab")
+
+        model_pool = await run_blocking(model_registry.get, model_name)
+        if not model_pool:
+            return JSONResponse({"error": f"Model {model_name} not loaded"}, 500)
+
+        preprocessed_image = await stages["decode"].run(
+            preprocess_image_bytes, img_bytes, color_space, model_registry.input_size(model_name))
+        if preprocessed_image is None:
+            return JSONResponse({"error": "Error processing image"}, 400)
+
+        # Retries and identical concurrent uploads share one inference
+        cache_key = ("validate", model_name, image_digest(img_bytes), threshold)
+        prediction_result = await stages["inference"].run(
+            result_cache.get_or_compute, cache_key,
+            lambda: predict_binary_classification(model_pool, preprocessed_image, threshold=threshold))
+        if "error" in prediction_result:
+            return JSONResponse(prediction_result, 500)
+
+        return JSONResponse(format_validation_result(prediction_result, color_space, threshold))
+
+    except PoolTimeoutError as e:
+        logger.warning(str(e))
+        return JSONResponse({"error": str(e)}, 503)
+    except Exception as e:
+        logger.error(f"Error in {model_name} validation endpoint: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+async def generate_report(img_bytes, color_space='lab'):
+    """Classify the wood type of an image and run the specialized tests of that type."""
+    try:
+        main_pool = await run_blocking(model_registry.get, 'default')
+        if not main_pool:
+            return JSONResponse({"error": "Default model not loaded"}, 500)
+
+        preprocessed_image = await stages["decode"].run(preprocess_image_bytes, img_bytes, color_space)
+        if preprocessed_image is None:
+            return JSONResponse({"error": "Error processing image"}, 400)
+
+        # Retries and identical concurrent uploads share one report
+        cache_key = ("report", image_digest(img_bytes), color_space)
+        report = await stages["inference"].run(
+            result_cache.get_or_compute, cache_key,
+            lambda: build_full_report(main_pool, preprocessed_image, color_space), is_report_cacheable)
+        return JSONResponse(report)
+
+    except PoolTimeoutError as e:
+        logger.warning(str(e))
+        return JSONResponse({"error": str(e)}, 503)
+    except Exception as e:
+        logger.error(f"Error generating full report: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+async def compare_rgb_images(image1_data, image2_data):
+    """Calculate the RGB Euclidean difference between two encoded images."""
+    try:
+        return JSONResponse(await stages["decode"].run(measure_rgb_difference, image1_data, image2_data))
+    except Exception as e:
+        return JSONResponse({
+            'status': 'error',
+            'message': f'Error calculating RGB difference: {str(e)}'
+        }, 500)
+
+async def classify_wood_image(image_data, color, pyramid=False):
+    """Classify a wood veneer image against the reference images of a color."""
+    if color not in VALID_COLORS:
+        return JSONResponse({
+            'success': False,
+            'error': f'Invalid color. Must be one of: {", ".join(VALID_COLORS)}'
+        }, 400)
+
+    logger.info(f"Processing image with color: {color}")
+
+    try:
+        input_array = await stages["decode"].run(load_input_array_cached, image_data)
+    except Exception as e:
+        logger.error(f"Invalid image data: {str(e)}")
+        return JSONResponse({
+            'success': False,
+            'error': f'Invalid image data: {str(e)}'
+        }, 400)
+
+    try:
+        cache_key = ("classify-wood", image_digest(image_data), color, pyramid)
+        result = await stages["rgb"].run(classify_in_rgb_worker, cache_key, input_array, color, pyramid)
+        logger.info(f"Classification result: {result}")
+    except Exception as e:
+        logger.error(f"Error in classification: {str(e)}")
+        result = {"error": f"Classification error: {str(e)}"}
+
+    if 'error' in result:
+        return JSONResponse({
+            'success': False,
+            'error': result['error']
+        }, 500)
+
+    return JSONResponse(format_classification_result(result, color))
+# =========================================
+
+# ============= API ENDPOINTS =============
+async def health_check(request):
+    return PlainTextResponse("Backend server is running! All systems operational.")
+
+def is_admin_request(request):
+    """Check the X-Admin-Token header (see check_admin_token in server.py)."""
+    return check_admin_token(request.headers.get("X-Admin-Token"))
+
+async def reload_dataset(request):
+    if not is_admin_request(request):
+        return JSONResponse({"error": "Forbidden"}, 403)
+    try:
+        reloaded_colors = await run_blocking(refresh_dataset_manifest, True)
+        # The RGB processes hold copies of the old reference images
+        await run_blocking(on_dataset_reload, reloaded_colors)
+        return JSONResponse({"status": "ok", "reloaded_colors": reloaded_colors})
+    except Exception as e:
+        logger.error(f"Error reloading dataset: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+async def reload_models(request):
+    if not is_admin_request(request):
+        return JSONResponse({"error": "Forbidden"}, 403)
+    try:
+        reload_result = await run_blocking(model_registry.reload)
+        result_cache.clear()
+        return JSONResponse({"status": "ok", **reload_result})
+    except Exception as e:
+        logger.error(f"Error reloading models: {e}")
+        return JSONResponse({"error": str(e)}, 500)
+
+async def metrics(request):
+    return JSONResponse({
+        "model_registry": model_registry.metrics(),
+        "preprocess_cache": preprocess_cache.metrics(),
+        "result_cache": result_cache.metrics(),
+        "stages": {name: stage.metrics() for name, stage in stages.items()}
+    })
+
+async def predict(request):
+    data, img_bytes, error_response = await read_image_json_request(request, "prediction")
+    if error_response is not None:
+        return error_response
+    return await predict_image(img_bytes)
+
+async def predict_upload(request):
+    (img_bytes,), values = await read_uploaded_images(request)
+    if not img_bytes:
+        return JSONResponse({"error": "Invalid input - missing image"}, 400)
+    return await predict_image(img_bytes)
+
+async def validate(request):
+    model_name = VALIDATION_MODELS.get(request.path_params["color"])
+    if not model_name:
+        return JSONResponse({"error": f"Unknown color {request.path_params['color']}"}, 404)
+
+    data, img_bytes, error_response = await read_image_json_request(request, f"{model_name} validation")
+    if error_response is not None:
+        return error_response
+    return await validate_image(model_name, img_bytes, data.get("threshold"))
+
+async def validate_upload(request):
+    model_name = VALIDATION_MODELS.get(request.path_params["color"])
+    if not model_name:
+        return JSONResponse({"error": f"Unknown color {request.path_params['color']}"}, 404)
+
+    (img_bytes,), values = await read_uploaded_images(request)
+    if not img_bytes:
+        return JSONResponse({"error": "Invalid input - missing image"}, 400)
+    return await validate_image(model_name, img_bytes, values.get("threshold"))
+
+async def generate_full_report(request):
+    data, img_bytes, error_response = await read_image_json_request(request, "full report")
+    if error_response is not None:
+        return error_response
+    return await generate_report(img_bytes, data.get("colorSpace", "lab"))
+
+async def generate_full_report_upload(request):
+    (img_bytes,), values = await read_uploaded_images(request)
+    if not img_bytes:
+        return JSONResponse({"error": "Invalid input - missing image"}, 400)
+    return await generate_report(img_bytes, values.get("colorSpace", "lab"))
+
+async def calculate_rgb_difference(request):
+    try:
+        try:
+            data, (image1_data, image2_data) = await read_json_images(request, ("image1", "image2"))
+        except binascii.Error:
+            return JSONResponse({
+                'status': 'error',
+                'message': 'Invalid base64 image data'
+            }, 400)
+
+        if image1_data is None or image2_data is None:
+            return JSONResponse({
+                'status': 'error',
+                'message': 'Missing required image data'
+            }, 400)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({
+            'status': 'error',
+            'message': f'Error calculating RGB difference: {str(e)}'
+        }, 500)
+
+    return await compare_rgb_images(image1_data, image2_data)
+
+async def calculate_rgb_difference_upload(request):
+    (image1_data, image2_data), values = await read_uploaded_images(request, ("image1", "image2"))
+    if not image1_data or not image2_data:
+        return JSONResponse({
+            'status': 'error',
+            'message': 'Missing required image data'
+        }, 400)
+    return await compare_rgb_images(image1_data, image2_data)
+
+async def classify_wood_rgb(request):
+    # Handle preflight OPTIONS request
+    if request.method == 'OPTIONS':
+        return JSONResponse({'status': 'ok'})
+
+    try:
+        try:
+            data, (image_data,) = await read_json_images(request)
+        except binascii.Error as e:
+            logger.error(f"Invalid base64 image data: {str(e)}")
+            return JSONResponse({
+                'success': False,
+                'error': f'Invalid base64 image data: {str(e)}'
+            }, 400)
+
+        logger.info(f"Received request to /api/classify-wood with data keys: {list(data.keys())}")
+
+        if image_data is None:
+            return JSONResponse({
+                'success': False,
+                'error': 'No image data provided'
+            }, 400)
+        if not image_data:
+            return JSONResponse({
+                'success': False,
+                'error': 'Empty image data'
+            }, 400)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in classify_wood_rgb endpoint: {str(e)}")
+        return JSONResponse({
+            'success': False,
+            'error': f'Error processing image: {str(e)}'
+        }, 500)
+
+    return await classify_wood_image(image_data, data.get('color', 'medium-cherry'), bool(data.get('pyramid', False)))
+
+async def classify_wood_rgb_upload(request):
+    (image_data,), values = await read_uploaded_images(request)
+    if not image_data:
+        return JSONResponse({
+            'success': False,
+            'error': 'No image data provided'
+        }, 400)
+
+    pyramid = values.get('pyramid', 'false').lower() in ('1', 'true', 'yes')
+    return await classify_wood_image(image_data, values.get('color', 'medium-cherry'), pyramid)
+# =========================================
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Create the stages and the RGB processes, load the preloaded models and start the watchers."""
+    stages["decode"] = Stage("decode", DECODE_CONCURRENCY)
+    stages["inference"] = Stage("inference", INFERENCE_CONCURRENCY)
+    stages["rgb"] = Stage("rgb", RGB_CONCURRENCY)
+    await run_blocking(start_rgb_workers)
+    await run_blocking(init_worker, MODEL_WATCH_INTERVAL, 0, PRELOAD_MODELS)
+    # Dataset refreshes run here and restart the RGB processes; the processes never check
+    if DATASET_WATCH_INTERVAL > 0:
+        start_dataset_watcher(DATASET_WATCH_INTERVAL, on_reload=on_dataset_reload)
+    logger.info(f"Stages: decode={DECODE_CONCURRENCY}, inference={INFERENCE_CONCURRENCY}, "
+                f"rgb={RGB_CONCURRENCY} ({RGB_PROCESSES} processes)")
+    yield
+    rgb_executor.shutdown(wait=False)
+    stage_executor.shutdown(wait=False)
+
+app = Starlette(
+    routes=[
+        Route('/', health_check, methods=['GET']),
+        Route('/admin/reload-dataset', reload_dataset, methods=['POST']),
+        Route('/admin/reload-models', reload_models, methods=['POST']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/predict', predict, methods=['POST']),
+        Route('/predict/upload', predict_upload, methods=['POST']),
+        Route('/validate/{color}', validate, methods=['POST']),
+        Route('/validate/{color}/upload', validate_upload, methods=['POST']),
+        Route('/generate-full-report', generate_full_report, methods=['POST']),
+        Route('/generate-full-report/upload', generate_full_report_upload, methods=['POST']),
+        Route('/rgb-difference', calculate_rgb_difference, methods=['POST']),
+        Route('/rgb-difference/upload', calculate_rgb_difference_upload, methods=['POST']),
+        Route('/api/classify-wood', classify_wood_rgb, methods=['POST', 'OPTIONS']),
+        Route('/api/classify-wood/upload', classify_wood_rgb_upload, methods=['POST']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["GET", "POST", "OPTIONS"],
+                   allow_headers=["Content-Type", "Authorization"]),
+        Middleware(BodySizeLimitMiddleware)
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get("PORT", "3050")))
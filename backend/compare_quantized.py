@@ -0,0 +1,175 @@
+import os
+import time
+import logging
+import argparse
+import numpy as np
+
+import server
+from server import (BASE_DATASET_PATH, MODEL_MANIFEST_PATH, InterpreterPool,
+                    ModelRegistry, preprocess_image_bytes)
+
+# ============= CONFIGURATION =============
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+# =========================================================
+
+def get_dataset_images(dataset_path=BASE_DATASET_PATH, max_images_per_category=None):
+    """
+    List the images of every color and category of the dataset.
+
+    Args:
+        dataset_path: Root of the dataset (color/category/image)
+        max_images_per_category: Optional limit of images per category
+
+    Returns:
+        list: Image paths
+    """
+    image_paths = []
+    for color in sorted(os.listdir(dataset_path)):
+        color_path = os.path.join(dataset_path, color)
+        if not os.path.isdir(color_path):
+            continue
+        for category in sorted(os.listdir(color_path)):
+            category_path = os.path.join(color_path, category)
+            if not os.path.isdir(category_path):
+                continue
+            files = sorted(f for f in os.listdir(category_path) if f.lower().endswith(IMAGE_EXTENSIONS))
+            if max_images_per_category:
+                files = files[:max_images_per_category]
+            image_paths.extend(os.path.join(category_path, f) for f in files)
+    return image_paths
+
+def get_decision(output, spec):
+    """
+    Turn a model output into the decision the endpoints report.
+
+    Args:
+        output: Dequantized model output for one image
+        spec: Manifest entry of the model
+
+    Returns:
+        The in-range flag for binary models, the predicted class index otherwise
+    """
+    if spec.get("type") == "binary":
+        return bool(float(output.reshape(-1)[0]) > spec.get("threshold", 0.5))
+    return int(np.argmax(output))
+
+def time_inference(pool, input_data):
+    """Run one inference and return the output and its latency in seconds."""
+    start_time = time.perf_counter()
+    output = pool.run(input_data)
+    return output, time.perf_counter() - start_time
+
+def compare_model(registry, model_name, image_paths):
+    """
+    Run the fp32 and int8 variants of a model over the same images.
+
+    Args:
+        registry: ModelRegistry of the manifest
+        model_name: Name of the model in the manifest
+        image_paths: Images to run
+
+    Returns:
+        dict: Decision agreement, output difference and latency of both variants
+    """
+    spec = registry.spec(model_name)
+    color_space = spec.get("color_space", "lab")
+    input_size = registry.input_size(model_name)
+
+    fp32_pool = InterpreterPool(model_name, os.path.join(registry.models_dir, spec["file"]), 1)
+    int8_pool = InterpreterPool(model_name, os.path.join(registry.models_dir, spec["quantized_file"]), 1)
+    fp32_pool.warm_up()
+    int8_pool.warm_up()
+
+    agreements = 0
+    differences = []
+    fp32_times = []
+    int8_times = []
+    for image_path in image_paths:
+        with open(image_path, 'rb') as f:
+            img_bytes = f.read()
+
+        # Each pool normalizes (fp32) or quantizes (int8) the image into its own input tensor
+        prepared_image = preprocess_image_bytes(img_bytes, color_space, input_size)
+        if prepared_image is None:
+            continue
+
+        fp32_output, fp32_time = time_inference(fp32_pool, prepared_image)
+        int8_output, int8_time = time_inference(int8_pool, prepared_image)
+
+        agreements += get_decision(fp32_output, spec) == get_decision(int8_output, spec)
+        differences.append(float(np.max(np.abs(fp32_output - int8_output))))
+        fp32_times.append(fp32_time)
+        int8_times.append(int8_time)
+
+    total = len(differences)
+    if total == 0:
+        return {"total": 0}
+
+    fp32_ms = float(np.median(fp32_times)) * 1000
+    int8_ms = float(np.median(int8_times)) * 1000
+    return {
+        "total": total,
+        "agreement": agreements / total * 100,
+        "mean_abs_diff": float(np.mean(differences)),
+        "max_abs_diff": float(np.max(differences)),
+        "fp32_ms": fp32_ms,
+        "int8_ms": int8_ms,
+        "speedup": fp32_ms / int8_ms if int8_ms > 0 else 0.0
+    }
+
+def compare_quantized_models(model_names=None, dataset_path=BASE_DATASET_PATH, max_images_per_category=None,
+                             manifest_path=MODEL_MANIFEST_PATH):
+    """
+    Compare every model that declares a quantized_file against its fp32 version.
+
+    Args:
+        model_names: Optional list of models to compare (defaults to all with a quantized_file)
+        dataset_path: Root of the dataset to run
+        max_images_per_category: Optional limit of images per category
+        manifest_path: Path to the model manifest
+
+    Returns:
+        dict: Comparison results per model
+    """
+    # Only used for the manifest entries; the variants are loaded explicitly below
+    registry = ModelRegistry(os.path.dirname(os.path.abspath(manifest_path)), manifest_path, 0)
+    candidates = [name for name, spec in registry.specs.items() if spec.get("quantized_file")]
+    model_names = [name for name in (model_names or candidates) if name in candidates]
+    if not model_names:
+        print("No models with a quantized_file in the manifest")
+        return {}
+
+    image_paths = get_dataset_images(dataset_path, max_images_per_category)
+    print(f"Comparing fp32 and int8 on {len(image_paths)} images from {dataset_path}")
+
+    results = {}
+    for model_name in model_names:
+        stats = compare_model(registry, model_name, image_paths)
+        results[model_name] = stats
+        if stats["total"] == 0:
+            print(f"\n{model_name}: no images could be processed")
+            continue
+        print(f"\n{model_name}")
+        print(f"  Decision agreement: {stats['agreement']:.2f}% ({stats['total']} images)")
+        print(f"  Output difference: mean {stats['mean_abs_diff']:.4f}, max {stats['max_abs_diff']:.4f}")
+        print(f"  Latency: fp32 {stats['fp32_ms']:.2f} ms, int8 {stats['int8_ms']:.2f} ms "
+              f"({stats['speedup']:.2f}x)")
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare fp32 and int8 model variants on the reference dataset.')
+    parser.add_argument('--models', type=str, nargs='+', help='Models to compare (default: every model with a quantized_file)')
+    parser.add_argument('--dataset', type=str, default=BASE_DATASET_PATH, help='Dataset to run')
+    parser.add_argument('--max_images', type=int, help='Maximum images per category')
+    parser.add_argument('--manifest', type=str, default=MODEL_MANIFEST_PATH, help='Path to the model manifest')
+
+    args = parser.parse_args()
+
+    # Per-image server logging would drown the report
+    logging.getLogger(server.__name__).setLevel(logging.WARNING)
+
+    compare_quantized_models(args.models, args.dataset, args.max_images, args.manifest)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import json
+
+import numpy as np
+import pytest
+
+import server
+
+
+class StubInterpreter:
+    """
+    Stand-in for a TFLite interpreter, configured by the JSON "model file" it is created from.
+
+    Output row i is the mean of input row i times the model's "scale", so tests
+    can tell which request and which version of a model produced a result.
+    Model file keys:
+        input_shape: Input shape without the batch dimension (default [4, 4, 3])
+        scale: Output multiplier (default 1.0)
+        fixed_batch: Fail to allocate any batch size other than one
+        fail: Raise from invoke()
+        quantization: {"input": [scale, zero_point], "output": [scale, zero_point]}
+                      makes an int8 model
+    """
+
+    def __init__(self, model_path, num_threads=None, delegate=None, delegate_options=None):
+        with open(model_path) as f:
+            self.model = json.load(f)
+        self.options = {"num_threads": num_threads, "delegate": delegate}
+        quantization = self.model.get("quantization")
+        self.dtype = np.int8 if quantization else np.float32
+        self.input_quantization = tuple(quantization["input"]) if quantization else (0.0, 0)
+        self.output_quantization = tuple(quantization["output"]) if quantization else (0.0, 0)
+        self.allocations = 0
+        self.batch_sizes = []
+        self._pending_shape = tuple([1] + self.model.get("input_shape", [4, 4, 3]))
+        self.allocate_tensors()
+
+    def get_input_details(self):
+        return [{"index": 0, "shape": np.array(self._input.shape), "dtype": self.dtype,
+                 "quantization": self.input_quantization}]
+
+    def get_output_details(self):
+        return [{"index": 1, "shape": np.array(self._output.shape), "dtype": self.dtype,
+                 "quantization": self.output_quantization}]
+
+    def get_tensor_details(self):
+        return self.get_input_details() + self.get_output_details()
+
+    def resize_tensor_input(self, index, shape):
+        self._pending_shape = tuple(shape)
+
+    def allocate_tensors(self):
+        if self.model.get("fixed_batch") and self._pending_shape[0] != 1:
+            raise RuntimeError("Cannot allocate tensors: the model has a fixed batch size of 1")
+        self._input = np.zeros(self._pending_shape, dtype=self.dtype)
+        self._output = np.zeros((self._pending_shape[0], 1), dtype=self.dtype)
+        self.allocations += 1
+
+    def tensor(self, index):
+        return lambda: self._input if index == 0 else self._output
+
+    def set_tensor(self, index, value):
+        self._input[...] = value
+
+    def invoke(self):
+        if self.model.get("fail"):
+            raise RuntimeError("invoke failed")
+        self.batch_sizes.append(len(self._input))
+        rows = self._input.reshape(len(self._input), -1).astype(np.float32)
+        if self.model.get("quantization"):
+            scale, zero_point = self.input_quantization
+            rows = (rows - zero_point) * scale
+        values = rows.mean(axis=1, keepdims=True) * self.model.get("scale", 1.0)
+        if self.model.get("quantization"):
+            scale, zero_point = self.output_quantization
+            values = np.clip(np.round(values / scale + zero_point), -128, 127)
+        self._output[...] = values
+
+
+def write_stub_model(path, **model):
+    """Write a stub model file (see StubInterpreter) and return its path."""
+    with open(path, "w") as f:
+        json.dump(model, f)
+    return str(path)
+
+
+@pytest.fixture
+def stub_interpreters(monkeypatch):
+    """Make the server build StubInterpreters instead of TFLite interpreters."""
+    monkeypatch.setattr(server, "create_interpreter", StubInterpreter)
+    return StubInterpreter
+
+
+@pytest.fixture
+def stub_registry(tmp_path, stub_interpreters, monkeypatch):
+    """
+    Serve stub models from a temporary manifest instead of assets/models.
+
+    Returns a function taking {model name: manifest entry}; the stub model keys
+    of an entry (see StubInterpreter) go under "stub" and are written to its file.
+    """
+    def make_registry(models, **defaults):
+        manifest = {"defaults": dict({"input_shape": [1, 4, 4, 3], "color_space": "lab"}, **defaults),
+                    "models": {}}
+        for name, entry in models.items():
+            entry = dict(entry)
+            write_stub_model(tmp_path / entry["file"], **entry.pop("stub", {}))
+            manifest["models"][name] = entry
+        with open(tmp_path / "manifest.json", "w") as f:
+            json.dump(manifest, f)
+
+        registry = server.ModelRegistry(str(tmp_path), str(tmp_path / "manifest.json"), 64 * 1024 * 1024)
+        monkeypatch.setattr(server, "model_registry", registry)
+        return registry
+
+    server.result_cache.clear()
+    yield make_registry
+    server.result_cache.clear()
+
+
+def pool_interpreters(pool):
+    """Return the idle interpreters of an InterpreterPool."""
+    return list(pool._idle.queue)
@@ -0,0 +1,63 @@
+# Production server settings, used with:
+#   gunicorn -c gunicorn.conf.py server:app
+#
+# The app is imported once in the master process (preload_app), so the TFLite
+# runtime and the RGB reference images are loaded before the workers are forked
+# and shared with them copy-on-write. TFLite interpreters are not: their XNNPACK
+# thread pools and delegate state do not survive a fork. The master only checks
+# that the models in PRELOAD_MODELS load (on_starting), and every worker builds
+# and warms up its own interpreters (see init_worker in server.py). The model
+# files are memory-mapped, so the workers still share their pages.
+import os
+import multiprocessing
+
+# ============= CONFIGURATION =============
+bind = f"0.0.0.0:{os.environ.get('PORT', '3050')}"
+
+# Worker processes; each one serves `threads` requests at once. When changing
+# the worker count, retune the models for it (tune_models.py --workers N) so
+# workers do not oversubscribe the cores.
+workers = int(os.environ.get("WEB_CONCURRENCY", min(2, multiprocessing.cpu_count())))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+
+# Cold RGB classifications and model loads can take longer than gunicorn's default 30s
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Load the app (TFLite runtime and reference caches) in the master before forking
+preload_app = True
+
+# Models the endpoints use, loaded by every worker before its first request
+# instead of by the master
+preload_models = [name for name in os.environ.get("PRELOAD_MODELS", ",".join([
+    "default",
+    "validation_model_medium_cherry",
+    "validation_model_desert_oak",
+    "validation_model_graphite_walnut"
+])).split(",") if name]
+os.environ["PRELOAD_MODELS"] = ""
+
+# Threads do not survive a fork: the master must not start the model or dataset
+# watchers, every worker starts its own in post_fork
+model_watch_interval = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+os.environ["MODEL_WATCH_INTERVAL"] = "0"
+dataset_watch_interval = float(os.environ.get("DATASET_MANIFEST_CHECK_INTERVAL", "0"))
+os.environ["DATASET_MANIFEST_CHECK_INTERVAL"] = "0"
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+# =========================================
+
+def on_starting(arbiter):
+    """Check the preloaded models in the master, so broken files show up before any worker starts."""
+    from server import model_registry
+    model_registry.check(preload_models)
+
+def post_fork(arbiter, worker):
+    """Start the worker's background threads and load and warm up its models."""
+    from server import init_worker
+    init_worker(model_watch_interval, dataset_watch_interval, preload_models)
+    worker.log.info(f"Worker {worker.pid} ready")
@@ -1,11 +1,13 @@
 print("running script ")
-import tensorflow as tf
-from tensorflow.lite.python.interpreter import Interpreter
+# Prefer the standalone TFLite runtime; full TensorFlow is only a fallback
+try:
+   from tflite_runtime.interpreter import Interpreter
+except ImportError:
+   from tensorflow.lite.python.interpreter import Interpreter
 import logging
 import sys
 import json
 import base64
-from tensorflow.keras.preprocessing.image import img_to_array
 from PIL import Image
 import io
 import numpy as np
@@ -62,7 +64,7 @@ def preprocess_image(base64_string):
 
 
        # Convert to numpy array
-       img_array = img_to_array(img)
+       img_array = np.asarray(img, dtype=np.float32)
 
 
        # Normalize pixel values
@@ -113,7 +115,8 @@ def predict_image(base64_image):
 
 
        # Apply softmax if not already applied in the model
-       probabilities = tf.nn.softmax(probabilities).numpy()
+       exps = np.exp(probabilities - np.max(probabilities))
+       probabilities = exps / np.sum(exps)
        logger.info(f"Probabilities after softmax: {probabilities}")
 
 
@@ -1,4 +1,7 @@
 import os
+import time
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from PIL import Image
 import matplotlib.pyplot as plt
@@ -6,6 +9,9 @@ import pandas as pd
 from tqdm import tqdm
 import argparse
 from scipy.spatial.distance import euclidean
+from rgb_reference import (CATEGORIES, REFERENCE_PACK_ROOT, calculate_distances_batch, compute_source_hash,
+                           downsample_images, hash_image_file, list_category_images, load_image_array,
+                           load_input_array, load_reference_pack, save_reference_pack)
 
 # ============= CONFIGURATION =============
 # Base dataset path
@@ -30,14 +36,21 @@ COLOR_CONFIG = {
 # Default color if none specified
 DEFAULT_COLOR = "medium-cherry"
 
-# Categories in order (must match the CSV columns)
-CATEGORIES = [
-    "out-of-range-too-light",
-    "in-range-light",
-    "in-range-standard", 
-    "in-range-dark",
-    "out-of-range-too-dark"
-]
+# Coarse-to-fine mode: compare at 1/PYRAMID_FACTOR resolution first (300x300 -> 150x150)
+# and only refine at full resolution when the top two normalized similarity
+# scores are closer than PYRAMID_MARGIN
+PYRAMID_FACTOR = 2
+PYRAMID_MARGIN = 0.02
+
+# Pairwise image distances keyed by image content hash and comparison size,
+# reused by --validate and --build_profiles across runs
+PAIRWISE_STORE_PATH = os.path.join(REFERENCE_PACK_ROOT, "pairwise_distances.sqlite")
+
+# Decoded reference images, keyed by dataset path (filled by get_reference_cache)
+reference_caches = {}
+
+# Downsampled copies for the coarse pyramid pass, keyed by (dataset path, factor)
+coarse_reference_caches = {}
 # ========================================
 
 def calculate_euclidean_distance(img_path1, img_path2, resize_to=(300, 300)):
@@ -53,34 +66,9 @@ def calculate_euclidean_distance(img_path1, img_path2, resize_to=(300, 300)):
         float: The average RGB Euclidean distance
     """
     try:
-        # Load images
-        img1 = Image.open(img_path1)
-        img2 = Image.open(img_path2)
-        
-        # Resize images to a standard size for comparison
-        img1 = img1.resize(resize_to)
-        img2 = img2.resize(resize_to)
-        
-        # Convert images to RGB if they aren't already
-        if img1.mode != 'RGB':
-            img1 = img1.convert('RGB')
-        if img2.mode != 'RGB':
-            img2 = img2.convert('RGB')
-        
-        # Convert to numpy arrays for efficient calculation
-        img1_array = np.array(img1)
-        img2_array = np.array(img2)
-        
-        # Calculate squared differences for each RGB channel
-        r_diff = (img1_array[:,:,0].astype(float) - img2_array[:,:,0].astype(float)) ** 2
-        g_diff = (img1_array[:,:,1].astype(float) - img2_array[:,:,1].astype(float)) ** 2
-        b_diff = (img1_array[:,:,2].astype(float) - img2_array[:,:,2].astype(float)) ** 2
-        
-        # Sum the channel differences for each pixel
-        pixel_diff = np.sqrt(r_diff + g_diff + b_diff)
-        
-        # Return the average difference across all pixels
-        return np.mean(pixel_diff)
+        img1_array = load_image_array(img_path1, resize_to)
+        img2_array = load_image_array(img_path2, resize_to)
+        return calculate_distances_batch(img1_array, img2_array[np.newaxis])[0]
     except Exception as e:
         print(f"Error comparing images: {str(e)}")
         return np.nan
@@ -96,56 +84,92 @@ def get_image_paths_from_category(category_path, max_images=None):
     Returns:
         list: List of image paths
     """
-    valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
-    
-    image_paths = [
-        os.path.join(category_path, f) for f in os.listdir(category_path)
-        if os.path.isfile(os.path.join(category_path, f)) and
-        os.path.splitext(f)[1].lower() in valid_extensions
-    ]
+    image_paths = list_category_images(category_path)
     
     # Optionally limit the number of images
     if max_images and len(image_paths) > max_images:
-        np.random.seed(42)  # For reproducibility
-        image_paths = np.random.choice(image_paths, max_images, replace=False).tolist()
+        indices = sample_image_indices(len(image_paths), max_images)
+        image_paths = [image_paths[i] for i in indices]
     
     return image_paths
 
-def calculate_image_distribution(input_image_path, dataset_path, max_images_per_category=None, normalize=True):
+def sample_image_indices(num_images, max_images=None):
+    """
+    Pick which images of a category take part in a comparison.
+    
+    Args:
+        num_images: Number of images available in the category
+        max_images: Maximum number of images to include (optional, for sampling)
+        
+    Returns:
+        list: Indices of the selected images
+    """
+    if not max_images or num_images <= max_images:
+        return list(range(num_images))
+    
+    # Private generator; same draw as np.random.seed(42) followed by np.random.choice
+    rng = np.random.RandomState(42)
+    return rng.choice(num_images, max_images, replace=False).tolist()
+
+def get_coarse_reference_cache(dataset_path, factor):
+    """
+    Return the reference images of a dataset downsampled by the given factor.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        factor: Integer reduction factor (see downsample_images)
+        
+    Returns:
+        dict: Category -> {"paths": ..., "pixels": ...} at the reduced resolution
+    """
+    key = (dataset_path, factor)
+    if key not in coarse_reference_caches:
+        coarse_reference_caches[key] = {
+            category: {"paths": entry["paths"], "pixels": downsample_images(entry["pixels"], factor)}
+            for category, entry in get_reference_cache(dataset_path).items()
+        }
+    return coarse_reference_caches[key]
+
+def calculate_image_distribution(input_image, dataset_path, max_images_per_category=None, normalize=True,
+                                 downsample=1):
     """
     Calculate the average RGB Euclidean distance between the input image and
     all images in each category.
     
     Args:
-        input_image_path: Path to the input image
+        input_image: Path to the input image, its raw bytes, or a decoded RGB array
         dataset_path: Path to the dataset root folder
         max_images_per_category: Maximum number of images to use from each category
         normalize: Whether to normalize distances to 0-100 scale
+        downsample: Compare at 1/downsample of the 300x300 resolution (1 = full resolution)
         
     Returns:    
         pandas.Series: Average distances to each category
     """
-    if not os.path.exists(input_image_path):
-        raise ValueError(f"Input image path does not exist: {input_image_path}")
+    # Decode the input once; every category comparison reuses this array
+    input_array = load_input_array(input_image)
     
     # Dictionary to store distances
     distances = {cat: [] for cat in CATEGORIES}
     
     print("Calculating distances between input image and each category...")
     
+    reference_cache = get_reference_cache(dataset_path)
+    
+    if downsample > 1:
+        input_array = downsample_images(input_array[np.newaxis], downsample)[0]
+        reference_cache = get_coarse_reference_cache(dataset_path, downsample)
+    
     for category in CATEGORIES:
-        category_path = os.path.join(dataset_path, category)
-        
-        if not os.path.exists(category_path):
-            print(f"Warning: Category path not found: {category_path}")
+        if category not in reference_cache:
+            print(f"Warning: Category path not found: {os.path.join(dataset_path, category)}")
             continue
-            
-        category_images = get_image_paths_from_category(category_path, max_images_per_category)
-        print(f"  Processing {len(category_images)} images from {category}...")
         
-        for image_path in tqdm(category_images, desc=f"{category}"):
-            distance = calculate_euclidean_distance(input_image_path, image_path)
-            distances[category].append(distance)
+        reference_pixels = reference_cache[category]["pixels"]
+        indices = sample_image_indices(len(reference_pixels), max_images_per_category)
+        print(f"  Processing {len(indices)} images from {category}...")
+        
+        distances[category] = calculate_distances_batch(input_array, reference_pixels, indices).tolist()
     
     # Calculate average distance for each category
     avg_distances = {}
@@ -168,6 +192,355 @@ def calculate_image_distribution(input_image_path, dataset_path, max_images_per_
     else:
         return distance_profile
 
+def build_reference_cache(dataset_path, resize_to=(300, 300)):
+    """
+    Decode and resize every reference image of a dataset once.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        resize_to: Tuple (width, height) to resize images to
+        
+    Returns:
+        dict: Category -> {"paths": list of image paths,
+                           "pixels": uint8 array of shape (N, height, width, 3)}
+    """
+    reference_cache = {}
+    
+    for category in CATEGORIES:
+        category_path = os.path.join(dataset_path, category)
+        
+        if not os.path.exists(category_path):
+            print(f"Warning: Category path not found: {category_path}")
+            continue
+        
+        image_paths = []
+        arrays = []
+        for image_path in get_image_paths_from_category(category_path):
+            try:
+                arrays.append(load_image_array(image_path, resize_to))
+                image_paths.append(image_path)
+            except Exception as e:
+                print(f"Warning: Skipping unreadable reference image {image_path}: {str(e)}")
+        
+        # One contiguous block per category so comparisons can stream through it
+        pixels = np.empty((len(arrays), resize_to[1], resize_to[0], 3), dtype=np.uint8)
+        for i, array in enumerate(arrays):
+            pixels[i] = array
+        
+        reference_cache[category] = {"paths": image_paths, "pixels": pixels}
+    
+    return reference_cache
+
+def get_reference_cache(dataset_path):
+    """
+    Return the decoded reference images for a dataset, loading them on first use.
+    
+    Uses the prebuilt reference pack when it matches the images on disk and
+    falls back to decoding the JPEGs otherwise.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        
+    Returns:
+        dict: Category -> {"paths": ..., "pixels": ...} as built by build_reference_cache
+    """
+    if dataset_path not in reference_caches:
+        reference_cache = load_reference_pack(dataset_path)
+        if reference_cache is None:
+            print(f"No up-to-date reference pack for {dataset_path}, decoding images...")
+            reference_cache = build_reference_cache(dataset_path)
+        reference_caches[dataset_path] = reference_cache
+    return reference_caches[dataset_path]
+
+def build_reference_packs(dataset_version=BASE_DATASET_PATH, force=False):
+    """
+    Pack every color of a dataset version into memory-mappable reference stacks.
+    
+    Args:
+        dataset_version: Dataset root folder, e.g. images-dataset-5.0
+        force: Rebuild packs even if they are up to date
+    """
+    for color in COLOR_CONFIG:
+        dataset_path = os.path.join(dataset_version, color)
+        
+        if not os.path.exists(dataset_path):
+            print(f"Warning: Dataset path not found: {dataset_path}")
+            continue
+        
+        source_hash = compute_source_hash(dataset_path)
+        if not force and load_reference_pack(dataset_path, source_hash=source_hash) is not None:
+            print(f"{color}: reference pack is up to date")
+            continue
+        
+        start_time = time.time()
+        reference_cache = build_reference_cache(dataset_path)
+        manifest_path = save_reference_pack(reference_cache, dataset_path, source_hash)
+        
+        num_images = sum(len(entry["paths"]) for entry in reference_cache.values())
+        print(f"{color}: packed {num_images} images in {time.time() - start_time:.1f}s -> {manifest_path}")
+
+def get_category_stacks(dataset_path, downsample=1):
+    """
+    Get the reference stacks of a dataset in CATEGORIES order.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        downsample: Use the stacks reduced by this factor (1 = full resolution)
+        
+    Returns:
+        tuple: (categories, stacks, image_paths) for the categories present in the
+        dataset, with image_paths listing every image across the stacks in order
+    """
+    if downsample > 1:
+        reference_cache = get_coarse_reference_cache(dataset_path, downsample)
+    else:
+        reference_cache = get_reference_cache(dataset_path)
+    
+    categories = [category for category in CATEGORIES if category in reference_cache]
+    stacks = [reference_cache[category]["pixels"] for category in categories]
+    image_paths = [path for category in categories for path in reference_cache[category]["paths"]]
+    return categories, stacks, image_paths
+
+def calculate_distance_row(stacks, row, columns):
+    """
+    Calculate the distances from one image to a set of other images.
+    
+    Images are numbered across all stacks in order.
+    
+    Args:
+        stacks: List of uint8 reference stacks (see get_category_stacks)
+        row: Index of the image across all stacks
+        columns: Indices of the images to compare against
+        
+    Returns:
+        tuple: (row, columns, distances)
+    """
+    offsets = np.cumsum([0] + [len(stack) for stack in stacks])
+    columns = np.asarray(columns, dtype=np.intp)
+    
+    stack_index = int(np.searchsorted(offsets, row, side='right')) - 1
+    input_array = stacks[stack_index][row - offsets[stack_index]]
+    
+    row_distances = np.empty(len(columns))
+    for offset, stack in zip(offsets, stacks):
+        in_stack = (columns >= offset) & (columns < offset + len(stack))
+        if in_stack.any():
+            row_distances[in_stack] = calculate_distances_batch(input_array, stack, columns[in_stack] - offset)
+    
+    return row, columns, row_distances
+
+def _calculate_distance_row_worker(task):
+    # Stacks come from the worker's own reference cache, loaded once per color
+    dataset_path, downsample, row, columns = task
+    return calculate_distance_row(get_category_stacks(dataset_path, downsample)[1], row, columns)
+
+def open_pairwise_store(store_path=PAIRWISE_STORE_PATH):
+    """
+    Open the SQLite store of pairwise image distances, creating it if needed.
+    
+    Args:
+        store_path: Path to the SQLite database
+        
+    Returns:
+        sqlite3.Connection: Open connection to the store
+    """
+    os.makedirs(os.path.dirname(store_path) or '.', exist_ok=True)
+    connection = sqlite3.connect(store_path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS pair_distances ("
+        "hash_a TEXT NOT NULL, hash_b TEXT NOT NULL, size TEXT NOT NULL, distance REAL NOT NULL, "
+        "PRIMARY KEY (hash_a, hash_b, size))"
+    )
+    return connection
+
+def get_pairwise_distances(dataset_path, downsample=1, workers=1, store_path=PAIRWISE_STORE_PATH,
+                           executor=None):
+    """
+    Get the full matrix of pairwise distances between the images of one color.
+    
+    Distances found in the pairwise store (matched by image content hash and
+    comparison size) are reused, so only pairs involving new or changed images
+    are computed. New distances are written back to the store.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        downsample: Compare at 1/downsample of the 300x300 resolution
+        workers: Number of worker processes for the missing distances (the
+            size of executor, when one is given)
+        store_path: Path to the pairwise store (None to disable it)
+        executor: Existing process pool to use instead of starting one
+        
+    Returns:
+        tuple: (categories, offsets, distances) where the images of categories[c]
+        occupy rows offsets[c]:offsets[c + 1] of the symmetric distances matrix
+    """
+    categories, stacks, image_paths = get_category_stacks(dataset_path, downsample)
+    offsets = np.cumsum([0] + [len(stack) for stack in stacks])
+    num_images = len(image_paths)
+    size = f"{stacks[0].shape[2]}x{stacks[0].shape[1]}" if stacks else ""
+    
+    distances = np.full((num_images, num_images), np.nan)
+    np.fill_diagonal(distances, 0.0)
+    
+    # The same content may appear under several paths
+    image_hashes = [hash_image_file(path) for path in image_paths]
+    positions = {}
+    for index, image_hash in enumerate(image_hashes):
+        positions.setdefault(image_hash, []).append(index)
+    for indices in positions.values():
+        distances[np.ix_(indices, indices)] = 0.0
+    
+    store = open_pairwise_store(store_path) if store_path else None
+    if store is not None:
+        for hash_a, hash_b, distance in store.execute(
+                "SELECT hash_a, hash_b, distance FROM pair_distances WHERE size = ?", (size,)):
+            if hash_a in positions and hash_b in positions:
+                distances[np.ix_(positions[hash_a], positions[hash_b])] = distance
+                distances[np.ix_(positions[hash_b], positions[hash_a])] = distance
+    
+    # Only the upper triangle is computed; the matrix is symmetric
+    tasks = []
+    for row in range(num_images):
+        columns = np.flatnonzero(np.isnan(distances[row, row + 1:])) + row + 1
+        if len(columns):
+            tasks.append((row, columns))
+    
+    num_pairs = num_images * (num_images - 1) // 2
+    num_missing = sum(len(columns) for _, columns in tasks)
+    print(f"{num_images} images at {size}: {num_pairs - num_missing} pairs from store, "
+          f"computing {num_missing} with {workers} worker(s)...")
+    
+    new_rows = []
+    start_time = time.time()
+    
+    owns_executor = executor is None and workers > 1 and bool(tasks)
+    if owns_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    
+    if executor is not None and tasks:
+        worker_tasks = [(dataset_path, downsample, row, columns) for row, columns in tasks]
+        results = executor.map(_calculate_distance_row_worker, worker_tasks, chunksize=4)
+    else:
+        results = (calculate_distance_row(stacks, row, columns) for row, columns in tasks)
+    
+    try:
+        for row, columns, row_distances in tqdm(results, total=len(tasks), desc="pairwise distances"):
+            distances[row, columns] = row_distances
+            distances[columns, row] = row_distances
+            for column, distance in zip(columns, row_distances):
+                hash_a, hash_b = sorted((image_hashes[row], image_hashes[column]))
+                new_rows.append((hash_a, hash_b, size, float(distance)))
+    finally:
+        if owns_executor:
+            executor.shutdown()
+    
+    if num_missing:
+        elapsed = time.time() - start_time
+        print(f"Computed {num_missing} image pairs in {elapsed:.1f}s "
+              f"({num_missing / max(elapsed, 1e-9):.0f} pairs/sec)")
+    
+    if store is not None:
+        with store:
+            store.executemany("INSERT OR REPLACE INTO pair_distances VALUES (?, ?, ?, ?)", new_rows)
+        store.close()
+    
+    return categories, offsets, distances
+
+def calculate_input_distance_row(input_array, stacks):
+    """
+    Calculate the distances from one decoded image to every image of the stacks.
+    
+    Args:
+        input_array: Decoded input image as an (height, width, 3) uint8 array
+        stacks: Reference stacks, as returned by get_category_stacks
+        
+    Returns:
+        numpy.ndarray: Distances to the images of all stacks in order, laid out
+        like a row of the pairwise distances matrix
+    """
+    return np.concatenate([calculate_distances_batch(input_array, stack) for stack in stacks])
+
+def get_profile_from_distances(row_distances, categories, offsets, max_images_per_category=None):
+    """
+    Build the normalized distance profile of a dataset image from precomputed distances.
+    
+    Gives the same result as calculate_image_distribution(..., normalize=True)
+    for that image, without comparing any pixels.
+    
+    Args:
+        row_distances: The image's row of the pairwise distances matrix
+        categories: Categories present in the matrix (see get_pairwise_distances)
+        offsets: Row offsets of each category in the matrix
+        max_images_per_category: Maximum number of images to use from each category
+        
+    Returns:
+        pandas.Series: Normalized average distances to each category
+    """
+    profile = {}
+    for category in CATEGORIES:
+        profile[category] = np.nan
+        if category not in categories:
+            continue
+        
+        c = categories.index(category)
+        indices = np.asarray(sample_image_indices(offsets[c + 1] - offsets[c], max_images_per_category))
+        if len(indices):
+            distance = np.nanmean(row_distances[offsets[c] + indices])
+            profile[category] = min(100, distance / 2.55) if not np.isnan(distance) else np.nan
+    
+    return pd.Series(profile)
+
+def build_category_profiles(dataset_path, workers=1, store_path=PAIRWISE_STORE_PATH):
+    """
+    Build the normalized category distance profile matrix of one color.
+    
+    Each entry is the average distance between all pairs of images from the two
+    categories (excluding an image paired with itself), normalized to 0-100.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        workers: Number of worker processes for the pairwise distances
+        store_path: Path to the pairwise distance store (None to disable it)
+        
+    Returns:
+        pandas.DataFrame: Profiles with CATEGORIES as both index and columns
+    """
+    categories, offsets, distances = get_pairwise_distances(dataset_path, workers=workers, store_path=store_path)
+    
+    profiles = pd.DataFrame(np.nan, index=CATEGORIES, columns=CATEGORIES)
+    for a, row_category in enumerate(categories):
+        for b, column_category in enumerate(categories):
+            block = distances[offsets[a]:offsets[a + 1], offsets[b]:offsets[b + 1]]
+            
+            # The diagonal of a same-category block pairs each image with itself
+            num_pairs = block.size - (len(block) if a == b else 0)
+            if num_pairs > 0:
+                profiles.loc[row_category, column_category] = min(100, block.sum() / num_pairs / 2.55)
+    
+    return profiles
+
+def build_profile_csv(color, output_csv=None, workers=1, store_path=PAIRWISE_STORE_PATH):
+    """
+    Rebuild the category distance profile CSV of one color.
+    
+    Args:
+        color: Wood color from COLOR_CONFIG
+        output_csv: Where to write the CSV (defaults to the configured reference_csv)
+        workers: Number of worker processes for the pairwise distances
+        store_path: Path to the pairwise distance store (None to disable it)
+        
+    Returns:
+        pandas.DataFrame: The written profiles
+    """
+    config = COLOR_CONFIG[color]
+    output_csv = output_csv or config["reference_csv"]
+    
+    profiles = build_category_profiles(config["dataset_path"], workers, store_path)
+    profiles.to_csv(output_csv)
+    print(f"{color}: reference profiles saved to {output_csv}")
+    
+    return profiles
+
 def load_reference_profiles(csv_path):
     """
     Load reference category profiles from CSV.
@@ -344,6 +717,55 @@ def plot_all_reference_profiles(reference_profiles, output_path=None):
     else:
         plt.show()
 
+def get_score_margin(similarity_scores):
+    """
+    Get the gap between the two best normalized similarity scores.
+    
+    Args:
+        similarity_scores: Series with a similarity score per category
+        
+    Returns:
+        float: Difference between the top two scores after normalizing to sum to 1
+    """
+    normalized_scores = np.sort((similarity_scores / similarity_scores.sum()).to_numpy())
+    if len(normalized_scores) < 2:
+        return 1.0
+    return float(normalized_scores[-1] - normalized_scores[-2])
+
+def classify_pyramid(input_image, dataset_path, reference_profiles, max_images_per_category=None,
+                     pyramid=False, pyramid_margin=PYRAMID_MARGIN):
+    """
+    Classify an image, optionally deciding at low resolution when the result is clear.
+    
+    Args:
+        input_image: Path to the input image, its raw bytes, or a decoded RGB array
+        dataset_path: Path to the dataset root folder
+        reference_profiles: DataFrame with reference category profiles
+        max_images_per_category: Maximum number of images to use from each category
+        pyramid: Try the coarse (1/PYRAMID_FACTOR) resolution first
+        pyramid_margin: Minimum normalized score gap for the coarse result to stand
+        
+    Returns:
+        tuple: (predicted_category, similarity_scores, image_profile, pyramid_level)
+        where pyramid_level is "coarse" or "full"
+    """
+    # Decode the input once for every resolution level
+    input_array = load_input_array(input_image)
+    
+    if pyramid:
+        image_profile = calculate_image_distribution(
+            input_array, dataset_path, max_images_per_category, normalize=True, downsample=PYRAMID_FACTOR
+        )
+        predicted_category, similarity_scores = classify_image(image_profile, reference_profiles)
+        if get_score_margin(similarity_scores) >= pyramid_margin:
+            return predicted_category, similarity_scores, image_profile, "coarse"
+    
+    image_profile = calculate_image_distribution(
+        input_array, dataset_path, max_images_per_category, normalize=True
+    )
+    predicted_category, similarity_scores = classify_image(image_profile, reference_profiles)
+    return predicted_category, similarity_scores, image_profile, "full"
+
 def get_main_category(category):
     """
     Get the main category (in-range or out-of-range) from the detailed category.
@@ -361,15 +783,20 @@ def get_main_category(category):
     else:
         return 'unknown'
 
-def classify_image_api(input_image_path, color="medium-cherry", max_images=20, verbose=False):
+def classify_image_api(input_image, color="medium-cherry", max_images=20, verbose=False,
+                       pyramid=False, pyramid_margin=PYRAMID_MARGIN):
     """
     API function for classifying a single image that can be called from external code.
     
     Args:
-        input_image_path: Path to the input image
+        input_image: Path to the input image, its raw encoded bytes, or an
+            already decoded RGB array
         color: Wood color to use for classification (medium-cherry, desert-oak, graphite-walnut)
         max_images: Maximum number of images to use per category for comparison
         verbose: Whether to print detailed information
+        pyramid: Classify at low resolution first and refine at full resolution
+            only when the top two similarity scores are within pyramid_margin
+        pyramid_margin: Minimum normalized score gap for the coarse result to stand
         
     Returns:
         dict: Classification results
@@ -391,30 +818,29 @@ def classify_image_api(input_image_path, color="medium-cherry", max_images=20, v
         # Load reference profiles
         reference_profiles = load_reference_profiles(reference_csv)
         
-        # Calculate distance profile
-        image_profile = calculate_image_distribution(
-            input_image_path, dataset_path, max_images, normalize=True
+        # Calculate the distance profile and classify the image
+        predicted_category, similarity_scores, image_profile, pyramid_level = classify_pyramid(
+            input_image, dataset_path, reference_profiles, max_images, pyramid, pyramid_margin
         )
         
-        # Classify the image
-        predicted_category, similarity_scores = classify_image(image_profile, reference_profiles)
-        
         # Get main category
         main_category = get_main_category(predicted_category)
         
         # Prepare result
         result = {
-            "image_path": input_image_path,
+            "image_path": input_image if isinstance(input_image, str) else None,
             "color": color,
             "predicted_category": predicted_category,
             "main_category": main_category,
             "similarity_scores": {k: float(v) for k, v in similarity_scores.items()},
-            "distance_profile": {k: float(v) for k, v in image_profile.items()}
+            "distance_profile": {k: float(v) for k, v in image_profile.items()},
+            "pyramid_level": pyramid_level
         }
         
         if verbose:
             print(f"Predicted category: {predicted_category}")
             print(f"Main category: {main_category}")
+            print(f"Decided at {pyramid_level} resolution")
         
         return result
         
@@ -423,20 +849,38 @@ def classify_image_api(input_image_path, color="medium-cherry", max_images=20, v
         print(error_message)
         return {"error": error_message}
 
-def validate_classifier_accuracy(dataset_path, reference_profiles_csv, max_images_per_category=None):
+def validate_classifier_accuracy(dataset_path, reference_profiles_csv, max_images_per_category=None,
+                                 pyramid=False, pyramid_margin=PYRAMID_MARGIN,
+                                 store_path=PAIRWISE_STORE_PATH, workers=1, executor=None, draft_input=False):
     """
     Run through all images in the dataset and check if predictions match true categories.
     Also tracks if the prediction matches the correct main category (in-range vs out-of-range).
     
+    Distance profiles are read from the pairwise distances of the dataset, so
+    with the pairwise store only images added since the last run are compared.
+    With draft_input, each image is instead decoded the way the server decodes
+    uploads (JPEG draft mode, see load_input_array) and compared with the
+    full-resolution reference images, which measures the accuracy the server
+    actually gets.
+    
     Args:
         dataset_path: Path to the dataset directory
         reference_profiles_csv: Path to reference profiles CSV
         max_images_per_category: Limit images per category (optional)
+        pyramid: Use coarse-to-fine classification and report accuracy per level
+        pyramid_margin: Minimum normalized score gap for a coarse decision
+        store_path: Path to the pairwise distance store (None to disable it)
+        workers: Number of worker processes for the image comparisons (the
+            size of executor, when one is given)
+        executor: Existing process pool to use instead of starting one
+        draft_input: Compare draft-decoded images instead of reading the pairwise
+            distances (runs in this process; store_path and workers are unused)
         
     Returns:
         dict: Accuracy statistics
     """
     print(f"Starting validation on dataset: {dataset_path}")
+    start_time = time.time()
     
     # Load reference profiles
     reference_profiles = load_reference_profiles(reference_profiles_csv)
@@ -450,19 +894,38 @@ def validate_classifier_accuracy(dataset_path, reference_profiles_csv, max_image
         "by_main_category": {
             "in-range": {"total": 0, "correct": 0},
             "out-of-range": {"total": 0, "correct": 0}
+        },
+        "by_pyramid_level": {
+            "coarse": {"total": 0, "correct": 0, "correctCategory": 0},
+            "full": {"total": 0, "correct": 0, "correctCategory": 0}
         }
     }
     
+    if draft_input:
+        categories, stacks, _ = get_category_stacks(dataset_path)
+        offsets = np.cumsum([0] + [len(stack) for stack in stacks])
+        if pyramid:
+            _, coarse_stacks, _ = get_category_stacks(dataset_path, PYRAMID_FACTOR)
+    else:
+        # The dataset images double as inputs, so every profile comes from pairwise distances
+        categories, offsets, distances = get_pairwise_distances(
+            dataset_path, workers=workers, store_path=store_path, executor=executor
+        )
+        if pyramid:
+            _, _, coarse_distances = get_pairwise_distances(
+                dataset_path, PYRAMID_FACTOR, workers, store_path, executor
+            )
+    reference_cache = get_reference_cache(dataset_path)
+    
     # Process each category in the dataset
     for category in CATEGORIES:
-        category_path = os.path.join(dataset_path, category)
-        
-        if not os.path.exists(category_path):
-            print(f"Warning: Category path not found: {category_path}")
+        if category not in categories:
+            print(f"Warning: Category path not found: {os.path.join(dataset_path, category)}")
             continue
         
         # Get all images in this category
-        image_paths = get_image_paths_from_category(category_path)
+        image_paths = reference_cache[category]["paths"]
+        first_row = offsets[categories.index(category)]
         
         # Get the main category
         main_category = get_main_category(category)
@@ -474,15 +937,37 @@ def validate_classifier_accuracy(dataset_path, reference_profiles_csv, max_image
         print(f"Processing {len(image_paths)} images from {category} (main: {main_category})...")
         
         # Process images in this category
-        for img_path in tqdm(image_paths, desc=category):
+        for row, img_path in enumerate(image_paths, start=first_row):
             try:
-                # Calculate distance profile
-                image_profile = calculate_image_distribution(
-                    img_path, dataset_path, max_images_per_category, normalize=True
-                )
+                if draft_input:
+                    input_array = load_input_array(img_path)
+                
+                # Classify at the coarse level first when the pyramid mode is on
+                pyramid_level = "full"
+                if pyramid:
+                    if draft_input:
+                        coarse_input = downsample_images(input_array[np.newaxis], PYRAMID_FACTOR)[0]
+                        row_distances = calculate_input_distance_row(coarse_input, coarse_stacks)
+                    else:
+                        row_distances = coarse_distances[row]
+                    image_profile = get_profile_from_distances(
+                        row_distances, categories, offsets, max_images_per_category
+                    )
+                    predicted_category, similarity_scores = classify_image(image_profile, reference_profiles)
+                    if get_score_margin(similarity_scores) >= pyramid_margin:
+                        pyramid_level = "coarse"
                 
-                # Classify the image
-                predicted_category, _ = classify_image(image_profile, reference_profiles)
+                if pyramid_level == "full":
+                    # Calculate distance profile and classify the image
+                    if draft_input:
+                        row_distances = calculate_input_distance_row(input_array, stacks)
+                    else:
+                        row_distances = distances[row]
+                    image_profile = get_profile_from_distances(
+                        row_distances, categories, offsets, max_images_per_category
+                    )
+                    predicted_category, _ = classify_image(image_profile, reference_profiles)
+                level_stats = stats["by_pyramid_level"][pyramid_level]
                 
                 # Get the main category of the prediction
                 predicted_main_category = get_main_category(predicted_category)
@@ -491,17 +976,20 @@ def validate_classifier_accuracy(dataset_path, reference_profiles_csv, max_image
                 stats["total"] += 1
                 stats["by_category"][category]["total"] += 1
                 stats["by_main_category"][main_category]["total"] += 1
+                level_stats["total"] += 1
                 
                 # Check if exact category is correct
                 if predicted_category == category:
                     stats["correct"] += 1
                     stats["by_category"][category]["correct"] += 1
+                    level_stats["correct"] += 1
                 
                 # Check if main category is correct
                 if predicted_main_category == main_category:
                     stats["correctCategory"] += 1
                     stats["by_category"][category]["correctCategory"] += 1
                     stats["by_main_category"][main_category]["correct"] += 1
+                    level_stats["correctCategory"] += 1
                     
             except Exception as e:
                 print(f"Error processing {img_path}: {str(e)}")
@@ -519,12 +1007,21 @@ def validate_classifier_accuracy(dataset_path, reference_profiles_csv, max_image
         for main_cat, main_stats in stats["by_main_category"].items():
             if main_stats["total"] > 0:
                 main_stats["accuracy"] = main_stats["correct"] / main_stats["total"] * 100
+        
+        for level_stats in stats["by_pyramid_level"].values():
+            if level_stats["total"] > 0:
+                level_stats["accuracy"] = level_stats["correct"] / level_stats["total"] * 100
+                level_stats["categoryAccuracy"] = level_stats["correctCategory"] / level_stats["total"] * 100
+    
+    stats["wall_time"] = time.time() - start_time
+    stats["images_per_sec"] = stats["total"] / max(stats["wall_time"], 1e-9)
     
     # Print results
     print("\n===== VALIDATION RESULTS =====")
     print(f"Total images: {stats['total']}")
     print(f"Correctly classified (exact category): {stats['correct']} ({stats.get('accuracy', 0):.2f}%)")
     print(f"Correctly classified (main category): {stats['correctCategory']} ({stats.get('categoryAccuracy', 0):.2f}%)")
+    print(f"Wall time: {stats['wall_time']:.1f}s ({stats['images_per_sec']:.1f} images/sec)")
     
     print("\nAccuracy by specific category:")
     for category, cat_stats in sorted(stats["by_category"].items()):
@@ -538,8 +1035,61 @@ def validate_classifier_accuracy(dataset_path, reference_profiles_csv, max_image
         if main_stats["total"] > 0:
             print(f"  {main_cat}: {main_stats.get('accuracy', 0):.2f}% ({main_stats['correct']}/{main_stats['total']})")
     
+    if pyramid:
+        print(f"\nAccuracy by deciding pyramid level (margin {pyramid_margin}):")
+        for level, level_stats in stats["by_pyramid_level"].items():
+            if level_stats["total"] > 0:
+                print(f"  {level}: {level_stats['total']} images, "
+                      f"exact {level_stats.get('accuracy', 0):.2f}%, "
+                      f"main category {level_stats.get('categoryAccuracy', 0):.2f}%")
+    
     return stats
 
+def validate_all_colors(max_images_per_category=None, pyramid=False, pyramid_margin=PYRAMID_MARGIN,
+                        store_path=PAIRWISE_STORE_PATH, workers=1, draft_input=False):
+    """
+    Validate every color in COLOR_CONFIG in one run.
+    
+    All colors share this process's reference cache and a single worker pool.
+    
+    Args:
+        max_images_per_category: Limit images per category (optional)
+        pyramid: Use coarse-to-fine classification and report accuracy per level
+        pyramid_margin: Minimum normalized score gap for a coarse decision
+        store_path: Path to the pairwise distance store (None to disable it)
+        workers: Number of worker processes for the image comparisons
+        draft_input: Classify draft-decoded images (see validate_classifier_accuracy)
+        
+    Returns:
+        dict: Color -> accuracy statistics from validate_classifier_accuracy
+    """
+    start_time = time.time()
+    results = {}
+    
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and not draft_input else None
+    try:
+        for color, config in COLOR_CONFIG.items():
+            print(f"\n===== {color.upper()} =====")
+            results[color] = validate_classifier_accuracy(
+                config["dataset_path"], config["reference_csv"], max_images_per_category,
+                pyramid, pyramid_margin, store_path, workers, executor, draft_input
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    elapsed = time.time() - start_time
+    total_images = sum(stats["total"] for stats in results.values())
+    
+    print("\n===== ALL COLORS =====")
+    for color, stats in results.items():
+        print(f"  {color}: exact {stats.get('accuracy', 0):.2f}%, "
+              f"main category {stats.get('categoryAccuracy', 0):.2f}% "
+              f"({stats['total']} images, {stats['wall_time']:.1f}s)")
+    print(f"Total: {total_images} images in {elapsed:.1f}s ({total_images / max(elapsed, 1e-9):.1f} images/sec)")
+    
+    return results
+
 def main():
     # Set up command line arguments
     parser = argparse.ArgumentParser(description='Classify a wood veneer image based on RGB Euclidean distance profile.')
@@ -550,18 +1100,58 @@ def main():
     parser.add_argument('--output', type=str, help='Output directory for results')
     parser.add_argument('--show_profiles', action='store_true', help='Show all reference profiles')
     parser.add_argument('--validate', action='store_true', help='Run validation on the entire dataset')
+    parser.add_argument('--all-colors', action='store_true', help='Validate every color in one run')
     parser.add_argument('--verbose', action='store_true', help='Show detailed output')
+    parser.add_argument('--pyramid', action='store_true',
+                        help='Classify at low resolution first and refine only close calls')
+    parser.add_argument('--pyramid_margin', type=float, default=PYRAMID_MARGIN,
+                        help='Minimum normalized score gap for a low-resolution decision')
+    parser.add_argument('--draft_input', action='store_true',
+                        help='Validate with images decoded like server uploads (JPEG draft mode)')
+    parser.add_argument('--build_profiles', action='store_true',
+                        help='Rebuild the category distance profile CSV from the dataset')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--pairwise_store', type=str, default=PAIRWISE_STORE_PATH,
+                        help='SQLite store of pairwise image distances reused across runs')
+    parser.add_argument('--no_pairwise_store', action='store_true',
+                        help='Recompute all pairwise distances without reading or writing the store')
+    parser.add_argument('--build_pack', action='store_true', help='Build memory-mappable reference packs for a dataset')
+    parser.add_argument('--dataset', type=str, default=BASE_DATASET_PATH, help='Dataset version to pack')
+    parser.add_argument('--force_rebuild', action='store_true', help='Rebuild reference packs even if up to date')
     
     args = parser.parse_args()
     
+    # Build reference packs if requested
+    if args.build_pack:
+        build_reference_packs(args.dataset, args.force_rebuild)
+        return
+    
     # Get configuration for the specified color
     config = COLOR_CONFIG[args.color]
     dataset_path = config["dataset_path"]
     reference_csv = config["reference_csv"]
     
+    store_path = None if args.no_pairwise_store else args.pairwise_store
+    
+    # Rebuild the reference profiles if requested
+    if args.build_profiles:
+        output_csv = None
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            output_csv = os.path.join(args.output, os.path.basename(reference_csv))
+        build_profile_csv(args.color, output_csv, args.workers, store_path)
+        return
+    
     # Run validation if requested
+    if args.validate and args.all_colors:
+        validate_all_colors(args.max_images, args.pyramid, args.pyramid_margin, store_path, args.workers,
+                            args.draft_input)
+        return
+    
     if args.validate:
-        validate_classifier_accuracy(dataset_path, reference_csv, args.max_images)
+        validate_classifier_accuracy(dataset_path, reference_csv, args.max_images,
+                                     args.pyramid, args.pyramid_margin, store_path, args.workers,
+                                     draft_input=args.draft_input)
         return
     
     # Check if input image exists
@@ -578,7 +1168,9 @@ def main():
         args.image, 
         args.color, 
         args.max_images, 
-        args.verbose
+        args.verbose,
+        args.pyramid,
+        args.pyramid_margin
     )
     
     # Show full results
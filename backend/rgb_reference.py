@@ -0,0 +1,292 @@
+# Reference image decoding, the RGB distance kernel and the reference pack
+# format, shared by the server (server.py) and the classifier command line
+# (rgbImageClassifier.py), so the server memory-maps exactly the packs that
+# --build_pack writes and both compare images the same way.
+import os
+import io
+import json
+import hashlib
+import numpy as np
+from PIL import Image
+
+# ============= CONFIGURATION =============
+# Categories in order (must match the CSV columns)
+CATEGORIES = [
+    "out-of-range-too-light",
+    "in-range-light",
+    "in-range-standard", 
+    "in-range-dark",
+    "out-of-range-too-dark"
+]
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
+
+# Number of reference images compared at once by calculate_distances_batch
+DISTANCE_CHUNK_SIZE = 16
+
+# Prebuilt, memory-mappable reference packs (built with rgbImageClassifier.py --build_pack),
+# next to this file whatever the working directory
+REFERENCE_PACK_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference-packs")
+REFERENCE_PACK_VERSION = 3
+# ========================================
+
+def list_category_images(category_path):
+    """
+    List the image files of a category folder.
+    
+    Args:
+        category_path: Path to the category folder
+        
+    Returns:
+        list: List of image paths, in directory order
+    """
+    return [
+        os.path.join(category_path, f) for f in os.listdir(category_path)
+        if os.path.isfile(os.path.join(category_path, f)) and
+        os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS
+    ]
+
+def load_image_array(image_path, resize_to=(300, 300), draft=False):
+    """
+    Load an image from disk as a resized RGB uint8 array.
+    
+    Args:
+        image_path: Path to the image (or a binary file-like object)
+        resize_to: Tuple (width, height) to resize the image to
+        draft: Let the JPEG decoder scale down by 1/2, 1/4 or 1/8 while staying at
+            least resize_to (no-op for other formats). Only used for the images
+            being classified: reference images are decoded at full resolution,
+            as the reference profiles were built
+        
+    Returns:
+        numpy.ndarray: Array of shape (height, width, 3) with dtype uint8
+    """
+    img = Image.open(image_path)
+    if draft:
+        img.draft('RGB', resize_to)
+    
+    # Resize before converting, exactly as the reference profiles were built
+    img = img.resize(resize_to)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    
+    return np.asarray(img, dtype=np.uint8)
+
+def load_input_array(input_image, resize_to=(300, 300)):
+    """
+    Decode the image being classified once into a resized RGB uint8 array.
+    
+    Args:
+        input_image: Path to the image, raw encoded image bytes, or an
+            already decoded (height, width, 3) RGB array
+        resize_to: Tuple (width, height) to resize the image to
+        
+    Returns:
+        numpy.ndarray: Array of shape (height, width, 3) with dtype uint8
+    """
+    if isinstance(input_image, np.ndarray):
+        if input_image.shape == (resize_to[1], resize_to[0], 3):
+            return np.asarray(input_image, dtype=np.uint8)
+        img = Image.fromarray(np.asarray(input_image, dtype=np.uint8)).resize(resize_to)
+        return np.asarray(img.convert('RGB'), dtype=np.uint8)
+    
+    if isinstance(input_image, (bytes, bytearray, memoryview)):
+        return load_image_array(io.BytesIO(input_image), resize_to, draft=True)
+    
+    if not os.path.exists(input_image):
+        raise ValueError(f"Input image path does not exist: {input_image}")
+    return load_image_array(input_image, resize_to, draft=True)
+
+def calculate_distances_batch(input_array, reference_stack, indices=None, chunk_size=DISTANCE_CHUNK_SIZE):
+    """
+    Calculate the RGB Euclidean distance between one image and a stack of images.
+    
+    The stack is processed in fixed-size chunks using integer arithmetic, so peak
+    memory stays bounded no matter how many reference images are compared.
+    
+    Args:
+        input_array: Decoded input image as an (height, width, 3) uint8 array
+        reference_stack: Reference images as an (N, height, width, 3) uint8 array
+        indices: Optional indices of the stack entries to compare against
+        chunk_size: Number of reference images processed per chunk
+        
+    Returns:
+        numpy.ndarray: The average RGB Euclidean distance to each compared image
+    """
+    if indices is None:
+        indices = np.arange(len(reference_stack))
+    indices = np.asarray(indices, dtype=np.intp)
+    
+    input_pixels = np.asarray(input_array, dtype=np.int32)
+    distances = np.empty(len(indices), dtype=np.float64)
+    
+    for start in range(0, len(indices), chunk_size):
+        chunk_indices = indices[start:start + chunk_size]
+        
+        # Integer differences are exact and squared sums stay below 3 * 255**2
+        chunk = reference_stack[chunk_indices].astype(np.int32)
+        chunk -= input_pixels
+        chunk *= chunk
+        squared_sum = chunk.sum(axis=-1, dtype=np.int32)
+        
+        # Square roots in float64 give the same distances, bit for bit, as
+        # comparing the images one pair at a time in float64
+        pixel_diff = np.sqrt(squared_sum, dtype=np.float64)
+        distances[start:start + len(chunk_indices)] = pixel_diff.mean(axis=(1, 2), dtype=np.float64)
+    
+    return distances
+
+def downsample_images(images, factor):
+    """
+    Shrink a stack of images by averaging factor x factor pixel blocks.
+    
+    Args:
+        images: uint8 array of shape (N, height, width, 3)
+        factor: Integer reduction factor; must divide height and width
+        
+    Returns:
+        numpy.ndarray: uint8 array of shape (N, height // factor, width // factor, 3)
+    """
+    num_images, height, width, channels = images.shape
+    if height % factor or width % factor:
+        raise ValueError(f"Downsample factor {factor} does not divide image size {width}x{height}")
+    
+    blocks = np.asarray(images).reshape(num_images, height // factor, factor, width // factor, factor, channels)
+    return np.rint(blocks.mean(axis=(2, 4))).astype(np.uint8)
+
+def get_reference_pack_dir(dataset_path):
+    """
+    Get the folder holding the prebuilt reference pack of one color.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        
+    Returns:
+        str: Pack folder, e.g. reference-packs/images-dataset-5.0/medium-cherry
+    """
+    dataset_path = os.path.normpath(dataset_path)
+    dataset_version = os.path.basename(os.path.dirname(dataset_path))
+    return os.path.join(REFERENCE_PACK_ROOT, dataset_version, os.path.basename(dataset_path))
+
+def hash_image_file(image_path):
+    """
+    Hash the contents of one image file.
+    
+    Args:
+        image_path: Path to the image
+        
+    Returns:
+        str: Hex SHA-256 digest of the file bytes
+    """
+    with open(image_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def compute_source_hash(dataset_path):
+    """
+    Hash the contents of every reference image of one color.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        
+    Returns:
+        str: Hex SHA-256 digest over category names, file names and file bytes
+    """
+    source_hash = hashlib.sha256()
+    
+    for category in CATEGORIES:
+        category_path = os.path.join(dataset_path, category)
+        if not os.path.exists(category_path):
+            continue
+        
+        source_hash.update(category.encode())
+        for image_path in sorted(list_category_images(category_path)):
+            source_hash.update(os.path.basename(image_path).encode())
+            source_hash.update(bytes.fromhex(hash_image_file(image_path)))
+    
+    return source_hash.hexdigest()
+
+def save_reference_pack(reference_cache, dataset_path, source_hash, resize_to=(300, 300)):
+    """
+    Write decoded reference images to .npy files plus a manifest.
+    
+    Every file is written under a temporary name and moved into place, and the
+    manifest goes last, so readers never see a half-written pack.
+    
+    Args:
+        reference_cache: Category -> {"paths": ..., "pixels": ...} from build_reference_cache
+        dataset_path: Path to the dataset root folder of one color
+        source_hash: Content hash of the source images (see compute_source_hash)
+        resize_to: Tuple (width, height) the images were resized to
+        
+    Returns:
+        str: Path to the written manifest
+    """
+    pack_dir = get_reference_pack_dir(dataset_path)
+    os.makedirs(pack_dir, exist_ok=True)
+    
+    manifest = {
+        "version": REFERENCE_PACK_VERSION,
+        "resize_to": list(resize_to),
+        "source_hash": source_hash,
+        "categories": {}
+    }
+    
+    for category, entry in reference_cache.items():
+        file_name = f"{category}.npy"
+        temp_path = os.path.join(pack_dir, f".{file_name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(entry["pixels"]))
+        os.replace(temp_path, os.path.join(pack_dir, file_name))
+        
+        manifest["categories"][category] = {
+            "file": file_name,
+            "images": [os.path.basename(path) for path in entry["paths"]]
+        }
+    
+    manifest_path = os.path.join(pack_dir, "manifest.json")
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+    
+    return manifest_path
+
+def load_reference_pack(dataset_path, resize_to=(300, 300), source_hash=None):
+    """
+    Memory-map a prebuilt reference pack if it is present and up to date.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        resize_to: Tuple (width, height) the pack must have been built with
+        source_hash: Current content hash of the source images (computed if omitted)
+        
+    Returns:
+        dict or None: Category -> {"paths": ..., "pixels": read-only memmap},
+        or None when the pack is missing or stale
+    """
+    manifest_path = os.path.join(get_reference_pack_dir(dataset_path), "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    
+    if source_hash is None:
+        source_hash = compute_source_hash(dataset_path)
+    if (manifest.get("version") != REFERENCE_PACK_VERSION or
+            manifest.get("resize_to") != list(resize_to) or
+            manifest.get("source_hash") != source_hash):
+        return None
+    
+    reference_cache = {}
+    for category, entry in manifest["categories"].items():
+        pixels = np.load(os.path.join(os.path.dirname(manifest_path), entry["file"]), mmap_mode='r')
+        if len(pixels) != len(entry["images"]):
+            return None
+        
+        reference_cache[category] = {
+            "paths": [os.path.join(dataset_path, category, name) for name in entry["images"]],
+            "pixels": pixels
+        }
+    
+    return reference_cache
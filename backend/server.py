@@ -1,25 +1,45 @@
-import tensorflow as tf
-from tensorflow.lite.python.interpreter import Interpreter
+from tflite_interpreter import TFLITE_BACKEND, create_interpreter
+from rgb_reference import (CATEGORIES, IMAGE_EXTENSIONS, calculate_distances_batch, compute_source_hash,
+                           downsample_images, load_image_array, load_input_array, load_reference_pack,
+                           save_reference_pack)
 import logging
+import math
 import sys
+import re
 import json
 import base64
-from tensorflow.keras.preprocessing.image import img_to_array
+import binascii
+import hashlib
+import hmac
 from PIL import Image
 import io
+import queue
+import contextlib
+from collections import OrderedDict
 import numpy as np
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify
 from skimage import color
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
 import cv2
 import os
-import uuid
-import tempfile
+import time
+import threading
+from concurrent.futures import Future
 import pandas as pd
 from scipy.spatial.distance import euclidean
 from tqdm import tqdm
 
+class UploadRequest(Request):
+    """
+    Request that keeps multipart file parts in memory instead of spooling them to
+    temporary files; upload routes bound the body size (see read_uploaded_images).
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 # Enable CORS with explicit settings
 CORS(app, resources={r"/*": {
     "origins": "*", 
@@ -30,6 +50,7 @@ CORS(app, resources={r"/*": {
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logger.info(f"Using TFLite interpreter from {TFLITE_BACKEND}")
 
 # ============= RGB CLASSIFIER CONFIGURATION =============
 # Base dataset path
@@ -67,58 +88,801 @@ for color, config in COLOR_CONFIG.items():
     print(f"  Dataset path exists: {os.path.exists(config['dataset_path'])}")
     print(f"  Reference CSV exists: {os.path.exists(config['reference_csv'])}")
 
-# Categories in order (must match the CSV columns)
-CATEGORIES = [
-    "out-of-range-too-light",
-    "in-range-light",
-    "in-range-standard", 
-    "in-range-dark",
-    "out-of-range-too-dark"
-]
-
 VALID_COLORS = list(COLOR_CONFIG.keys())
+
+# Coarse-to-fine mode: compare at 1/PYRAMID_FACTOR resolution first (300x300 -> 150x150)
+# and only refine at full resolution when the top two normalized similarity
+# scores are closer than PYRAMID_MARGIN
+PYRAMID_FACTOR = 2
+PYRAMID_MARGIN = 0.02
 # =========================================================
 
 # ============= TENSORFLOW MODEL CONFIGURATION =============
-# Path to TFLite models
-MODELS = {
-    'default': './assets/models/wood_classification.tflite',
-    'binary_model_graphite_walnut': './assets/models/binary_model_graphite_walnut.tflite',
-    'binary_model_medium_cherry': './assets/models/binary_model_medium_cherry.tflite',
-    'multiclass_model_graphite_walnut': './assets/models/multiclass_model_graphite_walnut.tflite',
-    'regression_model_graphite_walnut': './assets/models/regression_model_graphite_walnut.tflite',
-    
-    'validation_model_medium_cherry': './assets/models/medium-cherry_classifier_model_lab.tflite',
-    'validation_model_desert_oak':'./assets/models/desert-oak_classifier_model_lab.tflite',
-    'validation_model_graphite_walnut': './assets/models/graphite-walnut_classifier_model_lab.tflite'
-}
+# TFLite models are declared in a manifest next to the model files (file, type,
+# input shape, color space, class names, default threshold). Undeclared .tflite
+# files in the folder are still served under their file name. Entries can also
+# set num_threads, delegate/delegate_options and max_batch_size, which
+# tune_models.py benchmarks and writes for the current host, and quantized_file,
+# an int8/uint8 variant of the model (see compare_quantized.py). The variant
+# takes its tuned settings from the entry's quantized_settings instead.
+MODELS_DIR = os.path.join(SCRIPT_DIR, "assets", "models")
+MODEL_MANIFEST_PATH = os.path.join(MODELS_DIR, "manifest.json")
+
+# Models are loaded on first use; beyond this budget (MB) the least recently
+# used ones are unloaded. PRELOAD_MODELS lists models to load at startup.
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "512"))
+PRELOAD_MODELS = [name for name in os.environ.get("PRELOAD_MODELS", "").split(",") if name]
+
+# 'int8' serves the quantized_file variant of manifest entries that declare one;
+# entries can override this with their own "precision"
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "fp32")
+
+# Manifest settings that tune_models.py measures separately for each precision
+TUNED_SETTINGS = ("num_threads", "max_batch_size")
+
+# Models and thresholds are reloaded through /admin/reload-models; with a positive
+# MODEL_WATCH_INTERVAL (seconds) changes to the folder are also picked up automatically
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+
+# Interpreters per model: each model can serve this many requests at once.
+# MODEL_POOL_SIZE sets the default, MODEL_POOL_SIZES (JSON) overrides single
+# models, e.g. MODEL_POOL_SIZES='{"default": 4}'
+DEFAULT_POOL_SIZE = int(os.environ.get("MODEL_POOL_SIZE", "2"))
+MODEL_POOL_SIZES = json.loads(os.environ.get("MODEL_POOL_SIZES", "{}"))
+
+# Seconds a request waits for a free interpreter before giving up with a 503
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get("MODEL_POOL_TIMEOUT", "10"))
+
+
+def get_quantization(tensor_details):
+    """
+    Return the (scale, zero_point, dtype name) of an integer tensor, or None for float tensors.
+    
+    Args:
+        tensor_details: Entry of interpreter.get_input_details() / get_output_details()
+    """
+    if not np.issubdtype(tensor_details['dtype'], np.integer):
+        return None
+    scale, zero_point = tensor_details['quantization']
+    return (float(scale), int(zero_point), np.dtype(tensor_details['dtype']).name)
 
-# Define class names for each model
-CLASS_NAMES = {
-    'default': ['desert_oak', 'graphite_walnut', 'medium_cherry'],
-    'binary_model_graphite_walnut': ['Out of Range', 'In Range'],
-    'binary_model_medium_cherry': ['Out of Range', 'In Range'],
-    'multiclass_model_graphite_walnut': ['mediumCherry', 'desertOak', 'graphiteWalnut', 'other'],
-    # No classes for regression model
-    # For validation models - assume binary [Not Valid, Valid]
-    'validation_model_medium_cherry': ['Valid', 'Not Valid'],
-    'validation_model_desert_oak': ['Valid', 'Not Valid'],
-    'validation_model_graphite_walnut': ['Valid', 'Not Valid']
-}
+def quantize(values, quantization):
+    """Quantize float values with a (scale, zero_point, dtype name) tuple."""
+    scale, zero_point, dtype = quantization
+    info = np.iinfo(dtype)
+    return np.clip(np.round(values / scale + zero_point), info.min, info.max).astype(dtype)
+
+def dequantize(values, quantization):
+    """Map quantized integer values back to float32 with a (scale, zero_point, dtype name) tuple."""
+    scale, zero_point, _ = quantization
+    return ((values.astype(np.float32) - zero_point) * scale).astype(np.float32)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no interpreter of a model becomes free within the timeout."""
+
+
+class BatchResizeError(Exception):
+    """Raised when a model cannot be resized to a batch (e.g. it was converted with a fixed batch of one)."""
+
+
+def get_batch_bucket(num_inputs, max_batch_size):
+    """
+    Round a batch up to the next power of two, capped at max_batch_size.
+    
+    Batches are padded to these few sizes, so an interpreter is only resized and
+    reallocated when the bucket changes, not for every number of waiting requests.
+    
+    Args:
+        num_inputs: Number of inputs in the batch
+        max_batch_size: Largest batch the scheduler collects
+        
+    Returns:
+        int: Batch size to run the inputs with
+    """
+    bucket = 1 << (num_inputs - 1).bit_length()
+    return max(num_inputs, min(bucket, max_batch_size))
+
+
+class InterpreterPool:
+    """
+    A fixed set of TFLite interpreters for one model.
+    
+    An interpreter is not safe to share between threads, so every inference
+    checks one out, uses it exclusively and returns it. Requests beyond the
+    pool size wait (up to the checkout timeout) for an interpreter to free up.
+    """
+    
+    def __init__(self, model_name, model_path, size=1, timeout=POOL_CHECKOUT_TIMEOUT, interpreter_options=None):
+        self.model_name = model_name
+        self.model_path = model_path
+        self.size = size
+        self.timeout = timeout
+        self.interpreter_options = interpreter_options or {}
+        
+        # LIFO so the most recently used (cache-warm) interpreter is reused first
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            interpreter = create_interpreter(model_path, **self.interpreter_options)
+            self._idle.put(interpreter)
+        
+        # Quantized (int8/uint8) models take integer inputs and produce integer outputs;
+        # (scale, zero_point, dtype) map them to and from the float values
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        self.input_quantization = get_quantization(input_details)
+        self.output_quantization = get_quantization(output_details)
+        
+        # Rough footprint used for the registry's memory budget: the model file
+        # plus every tensor of each interpreter
+        tensor_bytes = sum(
+            int(np.prod(tensor['shape'])) * np.dtype(tensor['dtype']).itemsize
+            for tensor in interpreter.get_tensor_details()
+        )
+        self.memory_bytes = size * (os.path.getsize(model_path) + tensor_bytes)
+        
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._max_waiting = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+    
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        """
+        Borrow an interpreter for the duration of a with-block.
+        
+        Args:
+            timeout: Seconds to wait for a free interpreter (defaults to the pool timeout)
+            
+        Raises:
+            PoolTimeoutError: If no interpreter became free in time
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start_time = time.time()
+        
+        with self._lock:
+            self._waiting += 1
+            self._max_waiting = max(self._max_waiting, self._waiting)
+        try:
+            interpreter = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(f"No {self.model_name} interpreter became free within {timeout}s")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait += time.time() - start_time
+        try:
+            yield interpreter
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(interpreter)
+    
+    def _write_input(self, input_data, input_tensor):
+        # Write one input (batch dimension of one) into its row of the input tensor
+        if isinstance(input_data, PreparedImage):
+            input_data.write(input_tensor, self.input_quantization)
+        elif self.input_quantization is not None and np.issubdtype(input_data.dtype, np.floating):
+            input_tensor[...] = quantize(input_data[0], self.input_quantization)
+        else:
+            input_tensor[...] = input_data[0]
+    
+    def _resize(self, interpreter, input_details, batch_shape):
+        # Keep the interpreter usable at its current shape if the model cannot take the batch
+        try:
+            interpreter.resize_tensor_input(input_details['index'], batch_shape)
+            interpreter.allocate_tensors()
+        except Exception as e:
+            interpreter.resize_tensor_input(input_details['index'], input_details['shape'])
+            interpreter.allocate_tensors()
+            raise BatchResizeError(f"{self.model_name} cannot run a batch of {batch_shape[0]}: {e}") from e
+    
+    def run_batch(self, inputs, batch_size=None):
+        """
+        Run several inputs as one batched inference on a free interpreter.
+        
+        Inputs are written straight into the interpreter's input tensor, so no
+        batch array is assembled and set_tensor does not copy it again.
+        
+        Args:
+            inputs: List of PreparedImage objects or input tensors with a batch dimension of one;
+                    float tensors for a quantized model are quantized first
+            batch_size: Batch dimension to run with (defaults to len(inputs)); rows past
+                        the inputs are zero-filled and their outputs dropped
+            
+        Returns:
+            numpy.ndarray: The model's first output for the inputs, dequantized to float32
+                           for quantized models
+            
+        Raises:
+            BatchResizeError: If the model cannot be resized to the batch size
+        """
+        batch_size = batch_size or len(inputs)
+        with self.checkout() as interpreter:
+            input_details = interpreter.get_input_details()[0]
+            
+            # Each interpreter keeps the batch size it was last allocated for;
+            # reallocate only when the batch size changes
+            batch_shape = (batch_size,) + tuple(input_details['shape'][1:])
+            if tuple(input_details['shape']) != batch_shape:
+                self._resize(interpreter, input_details, batch_shape)
+                input_details = interpreter.get_input_details()[0]
+            output_details = interpreter.get_output_details()[0]
+            
+            # Views of the interpreter's buffers must be released before it is
+            # resized or reallocated, so they never outlive this block
+            input_tensor = interpreter.tensor(input_details['index'])()
+            for i, input_data in enumerate(inputs):
+                self._write_input(input_data, input_tensor[i])
+            input_tensor[len(inputs):] = 0
+            del input_tensor
+            
+            interpreter.invoke()
+            
+            # The output (a few values per image) is read once from the buffer: dequantized
+            # for quantized models, otherwise copied so it stays valid after checkin
+            output_tensor = interpreter.tensor(output_details['index'])()[:len(inputs)]
+            if self.output_quantization is not None:
+                output_data = dequantize(output_tensor, self.output_quantization)
+            else:
+                output_data = output_tensor.copy()
+            del output_tensor
+        
+        return output_data
+    
+    def run(self, input_data):
+        """
+        Run one inference on a free interpreter.
+        
+        Args:
+            input_data: A PreparedImage, or an input tensor for the model's first input
+                        (the batch dimension may differ from the model's)
+            
+        Returns:
+            numpy.ndarray: The model's first output, dequantized to float32 for quantized models
+        """
+        if isinstance(input_data, PreparedImage):
+            return self.run_batch([input_data])
+        return self.run_batch([input_data[i:i + 1] for i in range(input_data.shape[0])])
+    
+    def warm_up(self):
+        """Run one zero-filled inference on every interpreter of the pool."""
+        interpreters = [self._idle.get() for _ in range(self.size)]
+        try:
+            for interpreter in interpreters:
+                input_details = interpreter.get_input_details()[0]
+                interpreter.set_tensor(input_details['index'], np.zeros(input_details['shape'], dtype=input_details['dtype']))
+                interpreter.invoke()
+        finally:
+            for interpreter in interpreters:
+                self._idle.put(interpreter)
+    
+    def close(self):
+        """Nothing to stop; interpreters are freed once in-flight requests release the pool."""
+    
+    def metrics(self):
+        """Return pool utilisation and queue depth counters."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "num_threads": self.interpreter_options.get("num_threads"),
+                "delegate": self.interpreter_options.get("delegate") or "xnnpack",
+                "in_use": self._in_use,
+                "queue_depth": self._waiting,
+                "max_queue_depth": self._max_waiting,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": self._total_wait / self._checkouts * 1000 if self._checkouts else 0.0
+            }
+
+
+class BatchScheduler:
+    """
+    Micro-batches concurrent inferences for one model.
+    
+    Requests are queued; a dispatcher thread takes the first waiting request,
+    collects more for up to the batch window (or until the batch is full),
+    writes them into one batched invoke on the pool (padded to a power-of-two
+    batch size, see get_batch_bucket) and hands each request its own row of
+    the output. It exposes the same run()/metrics() interface
+    as InterpreterPool, so the predict functions work with either.
+    """
+    
+    def __init__(self, pool, max_batch_size=8, window_ms=5.0):
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self.batching_supported = True
+        self.memory_bytes = pool.memory_bytes
+        self.input_quantization = pool.input_quantization
+        
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._started_pid = None
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+    
+    def _ensure_started(self):
+        # Dispatchers are started lazily, and again in forked worker processes
+        # (threads do not survive a fork)
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._requests = queue.Queue()
+            # One dispatcher per interpreter so batches can run in parallel
+            for _ in range(self.pool.size):
+                threading.Thread(target=self._dispatch_loop, daemon=True).start()
+            self._started_pid = os.getpid()
+    
+    def _collect_batch(self):
+        """Return the next batch and whether the dispatcher was asked to stop."""
+        first = self._requests.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.time() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    
+    def _run_batch(self, batch):
+        if len(batch) > 1 and self.batching_supported:
+            try:
+                batch_size = get_batch_bucket(len(batch), self.max_batch_size)
+                outputs = self.pool.run_batch([input_data for input_data, _ in batch], batch_size)
+            except BatchResizeError as e:
+                # Some models are converted with a fixed batch size of one
+                logger.warning(f"{e}; running {self.pool.model_name} requests one by one")
+                self.batching_supported = False
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            else:
+                for i, (_, future) in enumerate(batch):
+                    future.set_result(outputs[i:i + 1])
+                return
+        
+        for input_data, future in batch:
+            try:
+                future.set_result(self.pool.run(input_data))
+            except Exception as e:
+                future.set_exception(e)
+    
+    def _dispatch_loop(self):
+        while True:
+            batch, stop = self._collect_batch()
+            if batch:
+                with self._lock:
+                    self._batches += 1
+                    self._items += len(batch)
+                    self._max_batch = max(self._max_batch, len(batch))
+                self._run_batch(batch)
+            if stop:
+                return
+    
+    def run(self, input_data):
+        """
+        Queue one inference and wait for its result.
+        
+        Args:
+            input_data: A PreparedImage, or an input tensor with a batch dimension of one
+            
+        Returns:
+            numpy.ndarray: The model's first output for this input (batch dimension of one)
+        """
+        self._ensure_started()
+        future = Future()
+        with self._lock:
+            if self._closed:
+                # Unloaded while this request held a reference; run it unbatched
+                return self.pool.run(input_data)
+            self._requests.put((input_data, future))
+        return future.result()
+    
+    def warm_up(self):
+        """Start the dispatchers and warm up every interpreter of the underlying pool."""
+        self._ensure_started()
+        self.pool.warm_up()
+    
+    def close(self):
+        """Stop the dispatcher threads once the requests queued so far are served."""
+        with self._lock:
+            self._closed = True
+            if self._started_pid == os.getpid():
+                for _ in range(self.pool.size):
+                    self._requests.put(None)
+    
+    def metrics(self):
+        """Return batching counters along with the underlying pool metrics."""
+        pool_metrics = self.pool.metrics()
+        with self._lock:
+            pool_metrics.update({
+                "batches": self._batches,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "max_batch_size_seen": self._max_batch,
+                "batching_supported": self.batching_supported
+            })
+        return pool_metrics
+
+
+# Micro-batching: concurrent requests for a model are grouped for up to
+# BATCH_WINDOW_MS, at most MAX_BATCH_SIZE per invoke (1 disables batching)
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "8"))
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", "5"))
+
+class ModelRegistry:
+    """
+    Serves the models declared in the model manifest, loading them on first use.
+    
+    Loaded models are kept in least-recently-used order; when their estimated
+    memory exceeds the budget, the least recently used ones are unloaded and
+    will be loaded again on their next request.
+    
+    reload() re-reads the manifest and rebuilds models whose file or interpreter
+    settings changed.
+    New interpreters are built and warmed up while the old ones keep serving,
+    then swapped in atomically.
+    """
+    
+    def __init__(self, models_dir, manifest_path, memory_budget_bytes):
+        self.models_dir = models_dir
+        self.manifest_path = manifest_path
+        self.memory_budget_bytes = memory_budget_bytes
+        self.specs = self._read_specs()
+        
+        self._pools = OrderedDict()
+        self._file_stamps = {}
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._loads = 0
+        self._evictions = 0
+        self._reloads = 0
+        self._watcher_pid = None
+    
+    def _read_specs(self):
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        else:
+            logger.warning(f"Model manifest not found at {self.manifest_path}")
+        defaults = manifest.get("defaults", {})
+        
+        specs = {}
+        for name, entry in manifest.get("models", {}).items():
+            spec = dict(defaults, **entry)
+            spec.update(name=name, path=os.path.join(self.models_dir, entry["file"]))
+            
+            # Serve the int8 variant when that precision is selected and the file exists
+            precision = spec.get("precision", MODEL_PRECISION)
+            if precision == "int8" and spec.get("quantized_file"):
+                quantized_path = os.path.join(self.models_dir, spec["quantized_file"])
+                if os.path.exists(quantized_path):
+                    spec["path"] = quantized_path
+                    # Settings tuned for the fp32 file do not carry over to the int8 one
+                    for key in TUNED_SETTINGS:
+                        spec.pop(key, None)
+                        if key in defaults:
+                            spec[key] = defaults[key]
+                    spec.update(entry.get("quantized_settings", {}))
+                else:
+                    logger.warning(f"Quantized model {quantized_path} not found, serving {name} in fp32")
+            specs[name] = spec
+        
+        # Undeclared model files are served under their file name with the defaults
+        declared_files = {spec["file"] for spec in specs.values()} | \
+            {spec["quantized_file"] for spec in specs.values() if spec.get("quantized_file")}
+        if os.path.isdir(self.models_dir):
+            for file_name in sorted(os.listdir(self.models_dir)):
+                if file_name.endswith(".tflite") and file_name not in declared_files:
+                    name = os.path.splitext(file_name)[0]
+                    spec = dict(defaults, file=file_name, name=name, path=os.path.join(self.models_dir, file_name))
+                    specs.setdefault(name, spec)
+        
+        logger.info(f"Model registry: {len(specs)} models available in {self.models_dir}")
+        return specs
+    
+    def spec(self, model_name):
+        """Return the manifest entry of a model, or None if it is unknown."""
+        return self.specs.get(model_name)
+    
+    def class_names(self, model_name):
+        """Return the class names declared for a model (empty if none)."""
+        return self.specs.get(model_name, {}).get("class_names", [])
+    
+    def input_size(self, model_name):
+        """Return the (width, height) a model expects its input images resized to."""
+        input_shape = self.specs.get(model_name, {}).get("input_shape", [1, img_height, img_width, 3])
+        return (input_shape[2], input_shape[1])
+    
+    @staticmethod
+    def _file_stamp(path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime, stat.st_size)
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _load_settings(spec):
+        # A model is rebuilt on reload when any of these change
+        return [spec.get(key) for key in ("path", "num_threads", "delegate", "delegate_options", "max_batch_size")]
+    
+    def _load(self, spec):
+        pool_size = int(MODEL_POOL_SIZES.get(spec["name"], DEFAULT_POOL_SIZE))
+        interpreter_options = {
+            "num_threads": spec.get("num_threads"),
+            "delegate": spec.get("delegate"),
+            "delegate_options": spec.get("delegate_options")
+        }
+        pool = InterpreterPool(spec["name"], spec["path"], pool_size, interpreter_options=interpreter_options)
+        max_batch_size = int(spec.get("max_batch_size", MAX_BATCH_SIZE))
+        if max_batch_size > 1:
+            pool = BatchScheduler(pool, max_batch_size, BATCH_WINDOW_MS)
+        logger.info(f"TFLite model {spec['name']} loaded successfully from {spec['path']} "
+                    f"({pool_size} interpreters, ~{pool.memory_bytes / 1024 / 1024:.1f} MB)")
+        return pool
+    
+    def _evict_over_budget(self, keep):
+        # Called with the registry lock held
+        total_bytes = sum(pool.memory_bytes for pool in self._pools.values())
+        for model_name in list(self._pools):
+            if total_bytes <= self.memory_budget_bytes:
+                break
+            if model_name == keep:
+                continue
+            pool = self._pools.pop(model_name)
+            pool.close()
+            total_bytes -= pool.memory_bytes
+            self._evictions += 1
+            logger.info(f"Unloaded TFLite model {model_name} to stay within the model memory budget")
+    
+    def get(self, model_name):
+        """
+        Return the interpreter pool of a model, loading it if needed.
+        
+        Args:
+            model_name: Name of the model in the manifest
+            
+        Returns:
+            The model's pool (InterpreterPool or BatchScheduler), or None if the
+            model is unknown or could not be loaded
+        """
+        spec = self.specs.get(model_name)
+        if spec is None:
+            return None
+        
+        with self._lock:
+            pool = self._pools.get(model_name)
+            if pool is not None:
+                self._pools.move_to_end(model_name)
+                return pool
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+        
+        # One request loads the model; concurrent requests for it wait here
+        with load_lock:
+            with self._lock:
+                pool = self._pools.get(model_name)
+                if pool is not None:
+                    self._pools.move_to_end(model_name)
+                    return pool
+            file_stamp = self._file_stamp(spec["path"])
+            try:
+                pool = self._load(spec)
+            except Exception as e:
+                logger.error(f"Error loading TFLite model {model_name}: {e}")
+                return None
+            with self._lock:
+                self._pools[model_name] = pool
+                self._file_stamps[model_name] = file_stamp
+                self._loads += 1
+                self._evict_over_budget(keep=model_name)
+        return pool
+    
+    def reload(self):
+        """
+        Re-read the manifest and rebuild the loaded models whose file or settings changed.
+        
+        Thresholds and other metadata take effect immediately. Changed models are
+        built and warmed up while their current pool keeps serving requests,
+        then swapped in; models removed from the folder are unloaded.
+        
+        Returns:
+            dict: Names of the models that were rebuilt and removed
+        """
+        with self._reload_lock:
+            new_specs = self._read_specs()
+            with self._lock:
+                loaded = dict(self._pools)
+            
+            rebuilt, removed = [], []
+            for model_name, old_pool in loaded.items():
+                spec = new_specs.get(model_name)
+                if spec is not None and self._load_settings(spec) == self._load_settings(self.specs[model_name]) \
+                        and self._file_stamp(spec["path"]) == self._file_stamps.get(model_name):
+                    continue
+                
+                new_pool = None
+                if spec is not None:
+                    file_stamp = self._file_stamp(spec["path"])
+                    try:
+                        new_pool = self._load(spec)
+                        new_pool.warm_up()
+                    except Exception as e:
+                        # Keep serving the previous version rather than dropping the model
+                        logger.error(f"Error reloading TFLite model {model_name}, keeping the loaded version: {e}")
+                        continue
+                
+                with self._lock:
+                    if self._pools.get(model_name) is old_pool:
+                        if new_pool is None:
+                            del self._pools[model_name]
+                        else:
+                            self._pools[model_name] = new_pool
+                            self._file_stamps[model_name] = file_stamp
+                old_pool.close()
+                (rebuilt if new_pool is not None else removed).append(model_name)
+            
+            self.specs = new_specs
+            self._reloads += 1
+        
+        logger.info(f"Model registry reloaded: rebuilt {rebuilt or 'none'}, removed {removed or 'none'}")
+        return {"rebuilt": rebuilt, "removed": removed}
+    
+    def _source_stamp(self):
+        paths = {self.manifest_path} | {spec["path"] for spec in self.specs.values()}
+        if os.path.isdir(self.models_dir):
+            paths |= {os.path.join(self.models_dir, file_name) for file_name in os.listdir(self.models_dir)
+                      if file_name.endswith(".tflite")}
+        return [(path, self._file_stamp(path)) for path in sorted(paths)]
+    
+    def start_watcher(self, interval, on_reload=None):
+        """
+        Poll the manifest and model files, reloading when any of them changes.
+        
+        Args:
+            interval: Seconds between checks
+            on_reload: Optional function called with the result of each reload
+        """
+        # Threads do not survive a fork, so forked workers start their own watcher
+        if self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        
+        def watch():
+            last_stamp = self._source_stamp()
+            while True:
+                time.sleep(interval)
+                stamp = self._source_stamp()
+                if stamp == last_stamp:
+                    continue
+                last_stamp = stamp
+                try:
+                    result = self.reload()
+                    if on_reload is not None:
+                        on_reload(result)
+                except Exception as e:
+                    logger.error(f"Error reloading models: {e}")
+        
+        threading.Thread(target=watch, daemon=True).start()
+        logger.info(f"Watching {self.models_dir} for model changes every {interval}s")
+    
+    def preload(self, model_names):
+        """Load the given models ahead of their first request."""
+        for model_name in model_names:
+            self.get(model_name)
+    
+    def check(self, model_names):
+        """
+        Check that the given models load, without keeping them loaded.
+        
+        Used by a server that forks its workers afterwards (see gunicorn.conf.py):
+        interpreters do not survive a fork (XNNPACK thread pools and delegate state
+        are not copied into the child), so the parent only builds a plain
+        single-threaded interpreter per model to catch broken files before any
+        worker starts, and every worker loads its own.
+        
+        Args:
+            model_names: Models to check
+            
+        Returns:
+            list: Names of the models that could not be loaded
+        """
+        failed = []
+        for model_name in model_names:
+            spec = self.specs.get(model_name)
+            if spec is None:
+                logger.error(f"TFLite model {model_name} is not in {self.models_dir}")
+                failed.append(model_name)
+                continue
+            try:
+                create_interpreter(spec["path"], num_threads=1, delegate="none")
+                logger.info(f"TFLite model {model_name} checked ({spec['path']})")
+            except Exception as e:
+                logger.error(f"Error loading TFLite model {model_name}: {e}")
+                failed.append(model_name)
+        return failed
+    
+    def warm_up(self):
+        """Warm up every loaded model, e.g. before a new worker takes requests."""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.warm_up()
+    
+    def metrics(self):
+        """Return the loaded models, their memory use and the pool metrics."""
+        with self._lock:
+            pools = dict(self._pools)
+            loads, evictions = self._loads, self._evictions
+        return {
+            "available_models": len(self.specs),
+            "loaded_models": list(pools),
+            "memory_bytes": sum(pool.memory_bytes for pool in pools.values()),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "loads": loads,
+            "evictions": evictions,
+            "reloads": self._reloads,
+            "model_pools": {name: pool.metrics() for name, pool in pools.items()}
+        }
 
-# Load all models at startup
-interpreters = {}
-for model_name, model_path in MODELS.items():
-    try:
-        interpreters[model_name] = Interpreter(model_path=model_path)
-        interpreters[model_name].allocate_tensors()
-        logger.info(f"TFLite model {model_name} loaded successfully from {model_path}")
-    except Exception as e:
-        logger.error(f"Error loading TFLite model {model_name}: {e}")
 
 # Define image dimensions
 img_height = 224
 img_width = 224
+
+# Models load lazily on first request, except those listed in PRELOAD_MODELS
+model_registry = ModelRegistry(MODELS_DIR, MODEL_MANIFEST_PATH, int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024))
+model_registry.preload(PRELOAD_MODELS)
+if MODEL_WATCH_INTERVAL > 0:
+    model_registry.start_watcher(MODEL_WATCH_INTERVAL, on_reload=lambda result: result_cache.clear())
+
+def init_worker(watch_interval=MODEL_WATCH_INTERVAL, dataset_watch_interval=None, preload_models=()):
+    """
+    Prepare a worker process forked from a preloaded server (see gunicorn.conf.py).
+    
+    Threads and TFLite interpreters do not survive a fork, so each worker
+    starts its own model and dataset watchers, loads its own interpreters and
+    batching dispatchers, and warms them up before serving requests.
+    
+    Args:
+        watch_interval: Seconds between model folder checks (0 disables the watcher)
+        dataset_watch_interval: Seconds between dataset folder checks (0 disables
+            the watcher, None uses DATASET_MANIFEST_CHECK_INTERVAL)
+        preload_models: Models to load before the first request
+    """
+    if watch_interval > 0:
+        model_registry.start_watcher(watch_interval, on_reload=lambda result: result_cache.clear())
+    if dataset_watch_interval is None:
+        dataset_watch_interval = DATASET_MANIFEST_CHECK_INTERVAL
+    if dataset_watch_interval > 0:
+        start_dataset_watcher(dataset_watch_interval)
+    model_registry.preload(preload_models)
+    model_registry.warm_up()
 # =========================================================
 
 # ============= RGB CLASSIFIER FUNCTIONS =============
@@ -135,38 +899,144 @@ def calculate_euclidean_distance(img_path1, img_path2, resize_to=(300, 300)):
         float: The average RGB Euclidean distance
     """
     try:
-        # Load images
-        img1 = Image.open(img_path1)
-        img2 = Image.open(img_path2)
-        
-        # Resize images to a standard size for comparison
-        img1 = img1.resize(resize_to)
-        img2 = img2.resize(resize_to)
-        
-        # Convert images to RGB if they aren't already
-        if img1.mode != 'RGB':
-            img1 = img1.convert('RGB')
-        if img2.mode != 'RGB':
-            img2 = img2.convert('RGB')
-        
-        # Convert to numpy arrays for efficient calculation
-        img1_array = np.array(img1)
-        img2_array = np.array(img2)
-        
-        # Calculate squared differences for each RGB channel
-        r_diff = (img1_array[:,:,0].astype(float) - img2_array[:,:,0].astype(float)) ** 2
-        g_diff = (img1_array[:,:,1].astype(float) - img2_array[:,:,1].astype(float)) ** 2
-        b_diff = (img1_array[:,:,2].astype(float) - img2_array[:,:,2].astype(float)) ** 2
-        
-        # Sum the channel differences for each pixel
-        pixel_diff = np.sqrt(r_diff + g_diff + b_diff)
-        
-        # Return the average difference across all pixels
-        return np.mean(pixel_diff)
+        img1_array = load_image_array(img_path1, resize_to)
+        img2_array = load_image_array(img_path2, resize_to)
+        return calculate_distances_batch(img1_array, img2_array[np.newaxis])[0]
     except Exception as e:
         print(f"Error comparing images: {str(e)}")
         return np.nan
 
+def scan_category_folder(category_path):
+    """
+    List the images of a category folder with their sizes and modification times.
+    
+    Args:
+        category_path: Path to the category folder
+        
+    Returns:
+        dict: {"mtime": folder mtime, "files": [{"path", "size", "mtime"}, ...]}
+    """
+    files = []
+    with os.scandir(category_path) as entries:
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                file_stat = entry.stat()
+                files.append({"path": entry.path, "size": file_stat.st_size, "mtime": file_stat.st_mtime})
+    
+    return {"mtime": os.stat(category_path).st_mtime, "files": files}
+
+def get_category_manifest(category_path):
+    """
+    Get the manifest entry of a category folder, scanning the folder on first use.
+    
+    Args:
+        category_path: Path to the category folder
+        
+    Returns:
+        dict: Manifest entry as built by scan_category_folder
+    """
+    if category_path not in dataset_manifest:
+        dataset_manifest[category_path] = scan_category_folder(category_path)
+    return dataset_manifest[category_path]
+
+def category_folder_changed(category_path, entry):
+    """
+    Check whether a category folder differs from its manifest entry.
+    
+    Besides the folder mtime (files added, removed or renamed), every listed file
+    is stat'ed, so an image overwritten in place is noticed too.
+    
+    Args:
+        category_path: Path to the category folder
+        entry: Manifest entry of the folder (see scan_category_folder), or None
+        
+    Returns:
+        bool: True if the folder must be rescanned
+    """
+    if entry is None:
+        return True
+    
+    try:
+        if os.stat(category_path).st_mtime != entry["mtime"]:
+            return True
+        for file_entry in entry["files"]:
+            file_stat = os.stat(file_entry["path"])
+            if file_stat.st_size != file_entry["size"] or file_stat.st_mtime != file_entry["mtime"]:
+                return True
+    except OSError:
+        return True
+    
+    return False
+
+def refresh_dataset_manifest(force=False):
+    """
+    Rescan category folders that changed and reload the reference images of their colors.
+    
+    Cached endpoint results are dropped when any color is reloaded, since they
+    were computed against the old reference images.
+    
+    Args:
+        force: Rescan every folder and reload every color, even if nothing looks changed
+        
+    Returns:
+        list: Colors whose reference images were reloaded
+    """
+    reloaded_colors = []
+    
+    with dataset_manifest_lock:
+        for color_name, config in COLOR_CONFIG.items():
+            dataset_path = config["dataset_path"]
+            changed = force
+            
+            for category in CATEGORIES:
+                category_path = os.path.join(dataset_path, category)
+                if force or category_folder_changed(category_path, dataset_manifest.get(category_path)):
+                    dataset_manifest.pop(category_path, None)
+                    changed = True
+            
+            if changed:
+                # Build the new cache first, then swap it in for concurrent requests
+                reference_caches[dataset_path] = load_or_build_reference_cache(dataset_path)
+                for key in [key for key in coarse_reference_caches if key[0] == dataset_path]:
+                    coarse_reference_caches.pop(key, None)
+                reloaded_colors.append(color_name)
+                logger.info(f"Reloaded reference images for {color_name}")
+        
+        if reloaded_colors:
+            result_cache.clear()
+    
+    return reloaded_colors
+
+def start_dataset_watcher(interval, on_reload=None):
+    """
+    Check the dataset folders in a background thread, reloading changed colors.
+    
+    Requests keep using the current reference images while a reload (which
+    hashes every image and may rebuild the reference packs) is running.
+    
+    Args:
+        interval: Seconds between checks
+        on_reload: Optional function called with the reloaded colors after each reload
+    """
+    global dataset_watcher_pid
+    # Threads do not survive a fork, so forked workers start their own watcher
+    if dataset_watcher_pid == os.getpid():
+        return
+    dataset_watcher_pid = os.getpid()
+    
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                reloaded_colors = refresh_dataset_manifest()
+                if reloaded_colors and on_reload is not None:
+                    on_reload(reloaded_colors)
+            except Exception as e:
+                logger.error(f"Error reloading dataset: {e}")
+    
+    threading.Thread(target=watch, daemon=True).start()
+    logger.info(f"Watching the reference dataset for changes every {interval}s")
+
 def get_image_paths_from_category(category_path, max_images=None):
     """
     Get paths to all images in a category folder.
@@ -178,56 +1048,98 @@ def get_image_paths_from_category(category_path, max_images=None):
     Returns:
         list: List of image paths
     """
-    valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
-    
-    image_paths = [
-        os.path.join(category_path, f) for f in os.listdir(category_path)
-        if os.path.isfile(os.path.join(category_path, f)) and
-        os.path.splitext(f)[1].lower() in valid_extensions
-    ]
+    image_paths = [entry["path"] for entry in get_category_manifest(category_path)["files"]]
     
     # Optionally limit the number of images
     if max_images and len(image_paths) > max_images:
-        np.random.seed(42)  # For reproducibility
-        image_paths = np.random.choice(image_paths, max_images, replace=False).tolist()
+        indices = sample_image_indices(len(image_paths), max_images)
+        image_paths = [image_paths[i] for i in indices]
     
     return image_paths
 
-def calculate_image_distribution(input_image_path, dataset_path, max_images_per_category=None, normalize=True):
+def sample_image_indices(num_images, max_images=None):
+    """
+    Pick which images of a category take part in a comparison.
+    
+    The sample is drawn once per (num_images, max_images) with a private
+    seeded generator, so requests never touch the global NumPy RNG.
+    
+    Args:
+        num_images: Number of images available in the category
+        max_images: Maximum number of images to include (optional, for sampling)
+        
+    Returns:
+        tuple: Indices of the selected images
+    """
+    if not max_images or num_images <= max_images:
+        return tuple(range(num_images))
+    
+    key = (num_images, max_images)
+    if key not in sample_indices_cache:
+        # Same draw as np.random.seed(42) followed by np.random.choice
+        rng = np.random.RandomState(42)
+        sample_indices_cache[key] = tuple(rng.choice(num_images, max_images, replace=False).tolist())
+    return sample_indices_cache[key]
+
+def get_coarse_reference_cache(dataset_path, factor):
+    """
+    Return the reference images of a dataset downsampled by the given factor.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        factor: Integer reduction factor (see downsample_images)
+        
+    Returns:
+        dict: Category -> {"paths": ..., "pixels": ...} at the reduced resolution
+    """
+    key = (dataset_path, factor)
+    if key not in coarse_reference_caches:
+        coarse_reference_caches[key] = {
+            category: {"paths": entry["paths"], "pixels": downsample_images(entry["pixels"], factor)}
+            for category, entry in get_reference_cache(dataset_path).items()
+        }
+    return coarse_reference_caches[key]
+
+def calculate_image_distribution(input_image, dataset_path, max_images_per_category=None, normalize=True,
+                                 downsample=1):
     """
     Calculate the average RGB Euclidean distance between the input image and
     all images in each category.
     
     Args:
-        input_image_path: Path to the input image
+        input_image: Path to the input image, its raw bytes, or a decoded RGB array
         dataset_path: Path to the dataset root folder
         max_images_per_category: Maximum number of images to use from each category
         normalize: Whether to normalize distances to 0-100 scale
+        downsample: Compare at 1/downsample of the 300x300 resolution (1 = full resolution)
         
     Returns:
         pandas.Series: Average distances to each category
     """
-    if not os.path.exists(input_image_path):
-        raise ValueError(f"Input image path does not exist: {input_image_path}")
+    # Decode the input once; every category comparison reuses this array
+    input_array = load_input_array(input_image)
     
     # Dictionary to store distances
     distances = {cat: [] for cat in CATEGORIES}
     
     print("Calculating distances between input image and each category...")
     
+    reference_cache = get_reference_cache(dataset_path)
+    
+    if downsample > 1:
+        input_array = downsample_images(input_array[np.newaxis], downsample)[0]
+        reference_cache = get_coarse_reference_cache(dataset_path, downsample)
+    
     for category in CATEGORIES:
-        category_path = os.path.join(dataset_path, category)
-        
-        if not os.path.exists(category_path):
-            print(f"Warning: Category path not found: {category_path}")
+        if category not in reference_cache:
+            print(f"Warning: Category path not found: {os.path.join(dataset_path, category)}")
             continue
-            
-        category_images = get_image_paths_from_category(category_path, max_images_per_category)
-        print(f"  Processing {len(category_images)} images from {category}...")
         
-        for image_path in category_images:  # Removing tqdm for server environment
-            distance = calculate_euclidean_distance(input_image_path, image_path)
-            distances[category].append(distance)
+        reference_pixels = reference_cache[category]["pixels"]
+        indices = sample_image_indices(len(reference_pixels), max_images_per_category)
+        print(f"  Processing {len(indices)} images from {category}...")
+        
+        distances[category] = calculate_distances_batch(input_array, reference_pixels, indices).tolist()
     
     # Calculate average distance for each category
     avg_distances = {}
@@ -250,6 +1162,88 @@ def calculate_image_distribution(input_image_path, dataset_path, max_images_per_
     else:
         return distance_profile
 
+def build_reference_cache(dataset_path, resize_to=(300, 300)):
+    """
+    Decode and resize every reference image of a dataset once.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        resize_to: Tuple (width, height) to resize images to
+        
+    Returns:
+        dict: Category -> {"paths": list of image paths,
+                           "pixels": uint8 array of shape (N, height, width, 3)}
+    """
+    reference_cache = {}
+    
+    for category in CATEGORIES:
+        category_path = os.path.join(dataset_path, category)
+        
+        if not os.path.exists(category_path):
+            logger.warning(f"Category path not found: {category_path}")
+            continue
+        
+        image_paths = []
+        arrays = []
+        for image_path in get_image_paths_from_category(category_path):
+            try:
+                arrays.append(load_image_array(image_path, resize_to))
+                image_paths.append(image_path)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable reference image {image_path}: {e}")
+        
+        # One contiguous block per category so comparisons can stream through it
+        pixels = np.empty((len(arrays), resize_to[1], resize_to[0], 3), dtype=np.uint8)
+        for i, array in enumerate(arrays):
+            pixels[i] = array
+        
+        reference_cache[category] = {"paths": image_paths, "pixels": pixels}
+    
+    return reference_cache
+
+def load_or_build_reference_cache(dataset_path):
+    """
+    Load the decoded reference images for a dataset.
+    
+    The prebuilt reference pack is memory-mapped when it matches the images on
+    disk, so worker processes share the same page cache. A missing or stale pack
+    is rebuilt from the JPEGs and written back for the next start.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        
+    Returns:
+        dict: Category -> {"paths": ..., "pixels": ...} as built by build_reference_cache
+    """
+    source_hash = compute_source_hash(dataset_path)
+    reference_cache = load_reference_pack(dataset_path, source_hash=source_hash)
+    
+    if reference_cache is None:
+        logger.info(f"Reference pack for {dataset_path} is missing or stale, rebuilding it")
+        reference_cache = build_reference_cache(dataset_path)
+        if reference_cache:
+            try:
+                save_reference_pack(reference_cache, dataset_path, source_hash)
+                reference_cache = load_reference_pack(dataset_path, source_hash=source_hash) or reference_cache
+            except OSError as e:
+                logger.warning(f"Could not write reference pack for {dataset_path}: {e}")
+    
+    return reference_cache
+
+def get_reference_cache(dataset_path):
+    """
+    Return the decoded reference images for a dataset, loading them on first use.
+    
+    Args:
+        dataset_path: Path to the dataset root folder of one color
+        
+    Returns:
+        dict: Category -> {"paths": ..., "pixels": ...} as built by build_reference_cache
+    """
+    if dataset_path not in reference_caches:
+        reference_caches[dataset_path] = load_or_build_reference_cache(dataset_path)
+    return reference_caches[dataset_path]
+
 def load_reference_profiles(csv_path):
     """
     Load reference category profiles from CSV.
@@ -309,6 +1303,55 @@ def classify_image(image_profile, reference_profiles):
     
     return predicted_category, normalized_series
 
+def get_score_margin(similarity_scores):
+    """
+    Get the gap between the two best normalized similarity scores.
+    
+    Args:
+        similarity_scores: Series with a similarity score per category
+        
+    Returns:
+        float: Difference between the top two scores after normalizing to sum to 1
+    """
+    normalized_scores = np.sort((similarity_scores / similarity_scores.sum()).to_numpy())
+    if len(normalized_scores) < 2:
+        return 1.0
+    return float(normalized_scores[-1] - normalized_scores[-2])
+
+def classify_pyramid(input_image, dataset_path, reference_profiles, max_images_per_category=None,
+                     pyramid=False, pyramid_margin=PYRAMID_MARGIN):
+    """
+    Classify an image, optionally deciding at low resolution when the result is clear.
+    
+    Args:
+        input_image: Path to the input image, its raw bytes, or a decoded RGB array
+        dataset_path: Path to the dataset root folder
+        reference_profiles: DataFrame with reference category profiles
+        max_images_per_category: Maximum number of images to use from each category
+        pyramid: Try the coarse (1/PYRAMID_FACTOR) resolution first
+        pyramid_margin: Minimum normalized score gap for the coarse result to stand
+        
+    Returns:
+        tuple: (predicted_category, similarity_scores, image_profile, pyramid_level)
+        where pyramid_level is "coarse" or "full"
+    """
+    # Decode the input once for every resolution level
+    input_array = load_input_array(input_image)
+    
+    if pyramid:
+        image_profile = calculate_image_distribution(
+            input_array, dataset_path, max_images_per_category, normalize=True, downsample=PYRAMID_FACTOR
+        )
+        predicted_category, similarity_scores = classify_image(image_profile, reference_profiles)
+        if get_score_margin(similarity_scores) >= pyramid_margin:
+            return predicted_category, similarity_scores, image_profile, "coarse"
+    
+    image_profile = calculate_image_distribution(
+        input_array, dataset_path, max_images_per_category, normalize=True
+    )
+    predicted_category, similarity_scores = classify_image(image_profile, reference_profiles)
+    return predicted_category, similarity_scores, image_profile, "full"
+
 def get_main_category(category):
     """
     Get the main category (in-range or out-of-range) from the detailed category.
@@ -326,15 +1369,20 @@ def get_main_category(category):
     else:
         return 'unknown'
 
-def classify_image_api(input_image_path, color="medium-cherry", max_images=20, verbose=False):
+def classify_image_api(input_image, color="medium-cherry", max_images=20, verbose=False,
+                       pyramid=False, pyramid_margin=PYRAMID_MARGIN):
     """
     API function for classifying a single image that can be called from external code.
     
     Args:
-        input_image_path: Path to the input image
+        input_image: Path to the input image, its raw encoded bytes, or an
+            already decoded RGB array
         color: Wood color to use for classification (medium-cherry, desert-oak, graphite-walnut)
         max_images: Maximum number of images to use per category for comparison
         verbose: Whether to print detailed information
+        pyramid: Classify at low resolution first and refine at full resolution
+            only when the top two similarity scores are within pyramid_margin
+        pyramid_margin: Minimum normalized score gap for the coarse result to stand
         
     Returns:
         dict: Classification results
@@ -356,30 +1404,29 @@ def classify_image_api(input_image_path, color="medium-cherry", max_images=20, v
         # Load reference profiles
         reference_profiles = load_reference_profiles(reference_csv)
         
-        # Calculate distance profile
-        image_profile = calculate_image_distribution(
-            input_image_path, dataset_path, max_images, normalize=True
+        # Calculate the distance profile and classify the image
+        predicted_category, similarity_scores, image_profile, pyramid_level = classify_pyramid(
+            input_image, dataset_path, reference_profiles, max_images, pyramid, pyramid_margin
         )
         
-        # Classify the image
-        predicted_category, similarity_scores = classify_image(image_profile, reference_profiles)
-        
         # Get main category
         main_category = get_main_category(predicted_category)
         
         # Prepare result
         result = {
-            "image_path": input_image_path,
+            "image_path": input_image if isinstance(input_image, str) else None,
             "color": color,
             "predicted_category": predicted_category,
             "main_category": main_category,
             "similarity_scores": {k: float(v) for k, v in similarity_scores.items()},
-            "distance_profile": {k: float(v) for k, v in image_profile.items()}
+            "distance_profile": {k: float(v) for k, v in image_profile.items()},
+            "pyramid_level": pyramid_level
         }
         
         if verbose:
             print(f"Predicted category: {predicted_category}")
             print(f"Main category: {main_category}")
+            print(f"Decided at {pyramid_level} resolution")
         
         return result
         
@@ -391,25 +1438,389 @@ def classify_image_api(input_image_path, color="medium-cherry", max_images=20, v
         return {"error": error_message}
 # =========================================================
 
-# ============= TENSORFLOW FUNCTIONS =============
-def preprocess_image(base64_string, color_space='lab'):
-    """
-    Preprocess image with optional color space conversion
-    
-    Args:
-        base64_string: Base64 encoded image
+# ============= RGB REFERENCE CACHE =============
+# Decoded reference images keyed by dataset path, loaded once at startup so
+# classification requests never decode reference JPEGs from disk
+reference_caches = {}
+# Downsampled copies for the coarse pyramid pass, keyed by (dataset path, factor)
+coarse_reference_caches = {}
+
+# File lists of every category folder, keyed by folder path. Scanned once at
+# startup so requests never list directories; refreshed by /admin/reload-dataset
+# or, when DATASET_MANIFEST_CHECK_INTERVAL is set, by a background thread that
+# checks folder and file mtimes and sizes
+dataset_manifest = {}
+dataset_manifest_lock = threading.Lock()
+dataset_watcher_pid = None
+DATASET_MANIFEST_CHECK_INTERVAL = float(os.environ.get("DATASET_MANIFEST_CHECK_INTERVAL", "0"))
+
+# Precomputed samples of sample_image_indices, keyed by (num_images, max_images)
+sample_indices_cache = {}
+
+for color_name, config in COLOR_CONFIG.items():
+    try:
+        color_cache = get_reference_cache(config["dataset_path"])
+        num_images = sum(len(entry["paths"]) for entry in color_cache.values())
+        for entry in color_cache.values():
+            sample_image_indices(len(entry["paths"]), 20)  # default max_images of /api/classify-wood
+        logger.info(f"Reference images for {color_name} cached ({num_images} images)")
+    except Exception as e:
+        logger.error(f"Error caching reference images for {color_name}: {e}")
+
+if DATASET_MANIFEST_CHECK_INTERVAL > 0:
+    start_dataset_watcher(DATASET_MANIFEST_CHECK_INTERVAL)
+# =========================================================
+
+# ============= PREPROCESSING AND RESULT CACHES =============
+# Maximum memory (MB) held by cached decoded/preprocessed images
+PREPROCESS_CACHE_MAX_MB = float(os.environ.get("PREPROCESS_CACHE_MAX_MB", "64"))
+
+# Seconds a computed endpoint result is reused, and how many results are kept
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "1024"))
+
+
+class ArrayCache:
+    """
+    Thread-safe LRU cache of numpy arrays bounded by their total size in bytes.
+    
+    Cached arrays are made read-only since they are shared between requests.
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+    
+    def get(self, key):
+        """Return the cached array for key (marking it recently used), or None."""
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return array
+    
+    def put(self, key, array):
+        """Cache an array, evicting the least recently used entries to stay within budget."""
+        if array.nbytes > self.max_bytes:
+            return array
+        array.setflags(write=False)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = array
+            self._bytes += array.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return array
+    
+    def metrics(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0
+            }
+
+
+# Shared by every endpoint: keyed by the hash of the raw image bytes, so the same
+# photo sent to several endpoints is only decoded once per representation (the
+# 8-bit model input image per color space, the 300x300 RGB classifier input)
+preprocess_cache = ArrayCache(int(PREPROCESS_CACHE_MAX_MB * 1024 * 1024))
+
+def image_digest(img_bytes):
+    """Return the content hash used to key cached results for raw image bytes."""
+    return hashlib.sha256(img_bytes).hexdigest()
+
+class ResultCache:
+    """
+    Thread-safe cache of endpoint results with request coalescing.
+    
+    Results expire after a TTL and the least recently used ones are evicted
+    beyond a maximum number of entries. While a result is being computed,
+    identical requests wait for that computation instead of starting their own.
+    """
+    
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Incremented by clear(), so results computed before it are not stored
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+    
+    def get_or_compute(self, key, compute, cacheable=None):
+        """
+        Return the cached result for key, computing it at most once at a time.
+        
+        Args:
+            key: Hashable key identifying the request (image hash, model, parameters)
+            compute: Function without arguments that computes the result
+            cacheable: Optional predicate deciding whether a result may be cached;
+                       by default None and error results are not cached
+            
+        Returns:
+            The result, shared with every other request for the same key
+        """
+        if cacheable is None:
+            cacheable = lambda result: result is not None and "error" not in result
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[key] = future
+                generation = self._generation
+                self._misses += 1
+            else:
+                self._coalesced += 1
+        
+        # Another request is computing this result; wait for it
+        if not is_owner:
+            return future.result()
+        
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        
+        with self._lock:
+            del self._in_flight[key]
+            if cacheable(result) and generation == self._generation:
+                self._entries[key] = (time.time() + self.ttl, result)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(result)
+        return result
+    
+    def clear(self):
+        """
+        Drop every cached result.
+        
+        In-flight computations still complete and are returned to their waiting
+        requests, but are not cached, since they may use the data being replaced.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+    
+    def metrics(self):
+        """Return hit/miss/coalescing counters and current size."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "in_flight": len(self._in_flight),
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced
+            }
+
+
+result_cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES)
+
+def load_input_array_cached(img_bytes, resize_to=(300, 300)):
+    """
+    Decode raw image bytes into the RGB classifier input array, reusing a cached copy.
+    
+    Args:
+        img_bytes: Raw encoded image bytes
+        resize_to: Tuple (width, height) to resize the image to
+        
+    Returns:
+        numpy.ndarray: Read-only array of shape (height, width, 3) with dtype uint8
+    """
+    key = (image_digest(img_bytes), "rgb", resize_to)
+    input_array = preprocess_cache.get(key)
+    if input_array is None:
+        input_array = preprocess_cache.put(key, load_input_array(img_bytes, resize_to))
+    return input_array
+
+# =========================================================
+
+# ============= TENSORFLOW FUNCTIONS =============
+# Lookup tables mapping 8-bit channel values to model input values, per
+# color space and input quantization
+input_luts = {}
+
+def get_input_lut(color_space, input_quantization=None):
+    """
+    Build the table mapping each 8-bit channel value to its normalized model input.
+    
+    The normalization is applied to all 256 possible values with the same
+    expressions the models were trained with (including uint8 wrap-around),
+    so looking values up gives identical inputs without full-size float
+    intermediates.
+    
+    Args:
+        color_space: Color space of the 8-bit image ('rgb', 'lab', or 'hsv')
+        input_quantization: Optional (scale, zero_point, dtype name) of a quantized model input
+        
+    Returns:
+        numpy.ndarray: Table of shape (1, 256, 3) for cv2.LUT, float32 or the quantized dtype
+    """
+    key = (color_space.lower(), input_quantization)
+    lut = input_luts.get(key)
+    if lut is None:
+        levels = np.arange(256, dtype=np.uint8)
+        if color_space.lower() == 'lab':
+            # L channel in range [0, 100], so divide by 100
+            # a and b channels in range [-127, 127], so shift by +127 and divide by 255
+            channels = [levels / 100.0, (levels + 127) / 255.0, (levels + 127) / 255.0]
+        else:
+            # RGB and HSV are normalized to [0, 1]
+            channels = [levels / 255.0] * 3
+        lut = np.stack(channels, axis=-1)[np.newaxis]
+        lut = quantize(lut, input_quantization) if input_quantization is not None else lut.astype(np.float32)
+        input_luts[key] = np.ascontiguousarray(lut)
+    return input_luts[key]
+
+
+class PreparedImage:
+    """
+    A decoded and resized 8-bit image in the color space a model expects.
+    
+    Normalization (or quantization, for quantized models) happens only when the
+    image is written into a model input, directly into the interpreter's input
+    tensor, so no full-size float intermediates are allocated per request.
+    """
+    
+    def __init__(self, pixels, color_space):
+        self.pixels = pixels
+        self.color_space = color_space.lower()
+        self.shape = (1,) + pixels.shape
+    
+    def write(self, out, input_quantization=None):
+        """
+        Write the normalized image into an (height, width, 3) array, e.g. an interpreter input view.
+        
+        Args:
+            out: Destination array of the model's input dtype
+            input_quantization: Optional (scale, zero_point, dtype name) of a quantized model input
+        """
+        if out.shape != self.pixels.shape:
+            raise ValueError(f"Prepared image of shape {self.pixels.shape} does not fit model input {out.shape}")
+        cv2.LUT(self.pixels, get_input_lut(self.color_space, input_quantization), dst=out)
+    
+    def to_array(self, input_quantization=None):
+        """
+        Return the model input as a standalone array with a batch dimension.
+        
+        Args:
+            input_quantization: Optional (scale, zero_point, dtype name) of a quantized model input
+        """
+        dtype = np.float32 if input_quantization is None else input_quantization[2]
+        out = np.empty(self.shape, dtype=dtype)
+        self.write(out[0], input_quantization)
+        return out
+
+
+def preprocess_image(base64_string, color_space='lab', input_size=(img_width, img_height)):
+    """
+    Preprocess a base64 encoded image with optional color space conversion
+    
+    Args:
+        base64_string: Base64 encoded image
         color_space: Target color space ('rgb', 'lab', or 'hsv')
+        input_size: Tuple (width, height) the model expects
         
     Returns:
-        Preprocessed numpy array ready for model input
+        PreparedImage ready to be written into a model input, or None on failure
     """
     try:
         # Decode the base64 string into a numpy array of bytes
         img_bytes = base64.b64decode(base64_string)
+    except Exception as e:
+        logger.error(f"Error processing image: {e}")
+        return None
+    return preprocess_image_bytes(img_bytes, color_space, input_size)
+
+# OpenCV flags that decode a JPEG directly at 1/factor of its resolution
+JPEG_REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+def get_imread_flag(img_bytes, input_size):
+    """
+    Pick the largest JPEG decode-time reduction that still leaves at least input_size.
+    
+    Args:
+        img_bytes: Raw encoded image bytes
+        input_size: Tuple (width, height) the image will be resized to
+        
+    Returns:
+        int: cv2.imdecode flag (IMREAD_COLOR for non-JPEG or small images)
+    """
+    if img_bytes[:2] != b'\xff\xd8':
+        return cv2.IMREAD_COLOR
+    try:
+        # Only the JPEG header is parsed here
+        width, height = Image.open(io.BytesIO(img_bytes)).size
+    except Exception:
+        return cv2.IMREAD_COLOR
+    
+    # EXIF orientation may swap width and height after decoding, so compare
+    # the short side against the larger target dimension
+    for factor, flag in JPEG_REDUCED_DECODE_FLAGS:
+        if min(width, height) // factor >= max(input_size):
+            return flag
+    return cv2.IMREAD_COLOR
+
+def preprocess_image_bytes(img_bytes, color_space='lab', input_size=(img_width, img_height)):
+    """
+    Preprocess raw image bytes with optional color space conversion
+    
+    Args:
+        img_bytes: Raw encoded image bytes
+        color_space: Target color space ('rgb', 'lab', or 'hsv')
+        input_size: Tuple (width, height) the model expects
+        
+    Returns:
+        PreparedImage ready to be written into a model input, or None on failure
+    """
+    try:
+        # The same photo is often sent to several endpoints within seconds
+        cache_key = (image_digest(img_bytes), color_space.lower(), tuple(input_size))
+        pixels = preprocess_cache.get(cache_key)
+        if pixels is not None:
+            return PreparedImage(pixels, color_space)
+        
         nparr = np.frombuffer(img_bytes, np.uint8)
         
-        # Decode the image using OpenCV (this reads in BGR format)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Decode the image using OpenCV (this reads in BGR format), at reduced
+        # resolution for JPEGs much larger than the model input
+        img = cv2.imdecode(nparr, get_imread_flag(img_bytes, input_size))
         if img is None:
             logger.error("Could not decode image")
             return None
@@ -418,61 +1829,56 @@ def preprocess_image(base64_string, color_space='lab'):
         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         
         # Resize the image to the target dimensions
-        img_resized = cv2.resize(img_rgb, (img_width, img_height))
+        img_resized = cv2.resize(img_rgb, tuple(input_size))
         
-        # Process according to the requested color space
+        # Convert to the requested color space; normalization happens when the
+        # image is written into the model input (see get_input_lut)
         if color_space.lower() == 'lab':
             # Convert RGB to LAB using OpenCV (matches training)
-            img_lab = cv2.cvtColor(img_resized, cv2.COLOR_RGB2LAB)
-            
-            # Normalize LAB values as done during training:
-            # L channel in range [0, 100], so divide by 100
-            # a and b channels in range [-127, 127], so shift by +127 and divide by 255
-            l_channel = img_lab[:, :, 0] / 100.0
-            a_channel = (img_lab[:, :, 1] + 127) / 255.0
-            b_channel = (img_lab[:, :, 2] + 127) / 255.0
-            
-            # Stack channels to form the final image array
-            img_array = np.stack([l_channel, a_channel, b_channel], axis=-1)
+            pixels = cv2.cvtColor(img_resized, cv2.COLOR_RGB2LAB)
         elif color_space.lower() == 'hsv':
-            # Convert RGB to HSV using OpenCV and normalize to [0, 1]
-            img_hsv = cv2.cvtColor(img_resized, cv2.COLOR_RGB2HSV)
-            img_array = img_hsv / 255.0
-        else:  # Default: use RGB and normalize to [0, 1]
-            img_array = img_resized / 255.0
-
-        # Add batch dimension and convert to float32 (as expected by TFLite)
-        img_array = np.expand_dims(img_array, axis=0).astype(np.float32)
+            pixels = cv2.cvtColor(img_resized, cv2.COLOR_RGB2HSV)
+        else:  # Default: use RGB
+            pixels = img_resized
 
-        logger.info(f"Preprocessed image in {color_space} color space with shape {img_array.shape}")
-        return img_array
+        logger.info(f"Preprocessed image in {color_space} color space with shape {pixels.shape}")
+        return PreparedImage(preprocess_cache.put(cache_key, pixels), color_space)
 
     except Exception as e:
         logger.error(f"Error processing image: {e}")
         return None
 
 
-def predict_classification(interpreter, preprocessed_image, class_names):
-    try:
-        # Get input and output details
-        input_details = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-
-        # Set the tensor to point to the input data to be inferred
-        interpreter.set_tensor(input_details[0]['index'], preprocessed_image)
+def softmax(logits):
+    """
+    Numerically stable softmax over the last axis.
+    
+    Args:
+        logits: Array of raw model outputs
+        
+    Returns:
+        numpy.ndarray: float32 probabilities summing to 1 along the last axis
+    """
+    logits = np.asarray(logits, dtype=np.float32)
+    exps = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+    return exps / np.sum(exps, axis=-1, keepdims=True)
 
-        # Run the inference
-        interpreter.invoke()
+def sigmoid(x):
+    """Logistic sigmoid of a scalar or array, computed in float32."""
+    x = np.asarray(x, dtype=np.float32)
+    return 1.0 / (1.0 + np.exp(-x))
 
-        # Retrieve the output
-        output_data = interpreter.get_tensor(output_details[0]['index'])
+def predict_classification(model_pool, preprocessed_image, class_names):
+    try:
+        # Run the inference on a free interpreter and retrieve the output
+        output_data = model_pool.run(preprocessed_image)
         logger.info(f"Output data shape: {output_data.shape}")
 
         probabilities = output_data[0]
         logger.info(f"Probabilities before softmax: {probabilities}")
 
         # Apply softmax if not already applied in the model
-        probabilities = tf.nn.softmax(probabilities).numpy()
+        probabilities = softmax(probabilities)
         logger.info(f"Probabilities after softmax: {probabilities}")
 
         predicted_index = np.argmax(probabilities)
@@ -493,24 +1899,16 @@ def predict_classification(interpreter, preprocessed_image, class_names):
             "all_probabilities": all_probabilities
         }
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error during classification prediction: {e}")
         return {"error": f"An error occurred during prediction: {str(e)}"}
 
-def predict_regression(interpreter, preprocessed_image):
+def predict_regression(model_pool, preprocessed_image):
     try:
-        # Get input and output details
-        input_details = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-
-        # Set the tensor to point to the input data to be inferred
-        interpreter.set_tensor(input_details[0]['index'], preprocessed_image)
-
-        # Run the inference
-        interpreter.invoke()
-
-        # Retrieve the output - regression models typically output a single value
-        output_data = interpreter.get_tensor(output_details[0]['index'])
+        # Run the inference on a free interpreter and retrieve the output - regression models typically output a single value
+        output_data = model_pool.run(preprocessed_image)
         
         # Get the predicted value (usually a single number)
         predicted_value = float(output_data[0][0])
@@ -519,16 +1917,18 @@ def predict_regression(interpreter, preprocessed_image):
             "predicted_value": predicted_value
         }
 
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error during regression prediction: {e}")
         return {"error": f"An error occurred during prediction: {str(e)}"}
         
-def predict_binary_classification(interpreter, preprocessed_image, threshold=0.5):
+def predict_binary_classification(model_pool, preprocessed_image, threshold=0.5):
     """
     Process a binary classification model with sigmoid output.
     
     Args:
-        interpreter: TFLite interpreter loaded with model
+        model_pool: InterpreterPool of the model
         preprocessed_image: Image data prepared for the model
         threshold: Threshold value (between 0-1) to determine "in range"
     
@@ -536,18 +1936,8 @@ def predict_binary_classification(interpreter, preprocessed_image, threshold=0.5
         Dictionary with results including in_range status and confidence
     """
     try:
-        # Get input and output details
-        input_details = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-
-        # Set the tensor to point to the input data to be inferred
-        interpreter.set_tensor(input_details[0]['index'], preprocessed_image)
-
-        # Run the inference
-        interpreter.invoke()
-
-        # Retrieve the output
-        output_data = interpreter.get_tensor(output_details[0]['index'])
+        # Run the inference on a free interpreter and retrieve the output
+        output_data = model_pool.run(preprocessed_image)
         logger.info(f"Binary model output shape: {output_data.shape}")
         logger.info(f"Binary model raw output: {output_data}")
         
@@ -557,7 +1947,7 @@ def predict_binary_classification(interpreter, preprocessed_image, threshold=0.5
             prediction_value = float(output_data[0][0])
         else:
             # If output shape is different, assume it's logits and apply sigmoid
-            prediction_value = float(tf.nn.sigmoid(output_data[0][0]).numpy())
+            prediction_value = float(sigmoid(output_data[0][0]))
         
         logger.info(f"Binary prediction value: {prediction_value}, threshold: {threshold}")
         
@@ -575,6 +1965,8 @@ def predict_binary_classification(interpreter, preprocessed_image, threshold=0.5
             "raw_prediction": raw_confidence
         }
     
+    except PoolTimeoutError:
+        raise
     except Exception as e:
         logger.error(f"Error during binary classification prediction: {e}")
         return {"error": f"An error occurred during prediction: {str(e)}"}
@@ -596,343 +1988,748 @@ def add_cors_headers(response):
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
-@app.route('/predict', methods=['POST'])
-def predict():
-    try:
-        # Get JSON data from request
-        data = request.json
+def check_admin_token(token):
+    """
+    Check a token sent in the X-Admin-Token header against ADMIN_TOKEN.
+    
+    Admin endpoints refuse every request unless the ADMIN_TOKEN environment
+    variable is set, so a deployment without one cannot be reloaded remotely.
+    
+    Args:
+        token: Header value sent by the client (None if missing)
         
-        image = data.get("image")
-        mime_type = data.get("mimeType")
+    Returns:
+        bool: True if the request may use the admin endpoints
+    """
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), admin_token.encode())
 
-        if not image or not mime_type:
-            return jsonify({"error": "Invalid input - missing image or mimeType"}), 400
+def is_admin_request():
+    """Check the admin token of the current request (see check_admin_token)."""
+    return check_admin_token(request.headers.get("X-Admin-Token"))
 
-        # Use default model
-        interpreter = interpreters.get('default')
-        if not interpreter:
-            return jsonify({"error": "Model not loaded"}), 500
+if not os.environ.get("ADMIN_TOKEN"):
+    logger.warning("ADMIN_TOKEN is not set, the /admin endpoints are disabled")
 
-        preprocessed_image = preprocess_image(image)
-        if preprocessed_image is None:
-            return jsonify({"error": "Error processing image"}), 400
+# Largest image accepted by the upload routes (multipart or raw image body)
+MAX_UPLOAD_BYTES = int(float(os.environ.get("MAX_UPLOAD_MB", 16)) * 1024 * 1024)
+# Allowance for multipart boundaries, part headers and form fields
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
 
-        result = predict_classification(
-            interpreter, 
-            preprocessed_image, 
-            CLASS_NAMES['default']
-        )
+def upload_body_limit(num_images):
+    """Largest upload body accepted for a request carrying num_images images."""
+    return MAX_UPLOAD_BYTES * num_images + UPLOAD_FORM_OVERHEAD_BYTES
+
+def read_uploaded_images(field_names=("image",)):
+    """
+    Read the images of an upload request, sent either as multipart/form-data files
+    or (for a single image) as a raw image/* or application/octet-stream body.
+    
+    The size limit is applied before the body is read: a larger Content-Length is
+    rejected with 413 without buffering anything, and a chunked body stops being
+    read as soon as it goes over the limit.
+    
+    Args:
+        field_names: Multipart file fields to read
         
-        return jsonify(result)
+    Returns:
+        list: Raw encoded image bytes per field (None for fields not sent)
+    """
+    request.max_content_length = upload_body_limit(len(field_names))
+    
+    if request.mimetype == 'multipart/form-data':
+        uploads = [request.files.get(name) for name in field_names]
+        images = [upload.read() if upload else None for upload in uploads]
+    elif len(field_names) == 1 and (request.mimetype.startswith('image/') or
+                                    request.mimetype == 'application/octet-stream'):
+        images = [request.get_data(cache=False)]
+    else:
+        return [None] * len(field_names)
+    
+    if any(image and len(image) > MAX_UPLOAD_BYTES for image in images):
+        raise RequestEntityTooLarge()
+    return images
 
+@app.route('/admin/reload-dataset', methods=['POST'])
+def reload_dataset():
+    """
+    Rescan the reference dataset and reload the cached reference images
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    try:
+        reloaded_colors = refresh_dataset_manifest(force=True)
+        return jsonify({"status": "ok", "reloaded_colors": reloaded_colors})
     except Exception as e:
-        logger.error(f"Error in prediction endpoint: {e}")
+        logger.error(f"Error reloading dataset: {e}")
         return jsonify({"error": str(e)}), 500
 
-# Medium Cherry Validation Endpoint
-@app.route('/validate/medium_cherry', methods=['POST'])
-def validate_medium_cherry():
+@app.route('/admin/reload-models', methods=['POST'])
+def reload_models():
+    """
+    Reload the model manifest (thresholds, metadata) and swap in changed model files
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+    
     try:
-        # Hardcoded threshold for medium cherry
-        THRESHOLD = 0.5082  # Adjust as needed
-        
-        # Get JSON data from request
-        data = request.json
-        
-        image = data.get("image")
-        mime_type = data.get("mimeType")
-        # Check if threshold is provided in the request
-        if (data.get("threshold") is not None):
-            THRESHOLD = data.get("threshold")
-        color_space = "lab"  # Always use LAB color space
-
-        if not image or not mime_type:
-            return jsonify({"error": "Invalid input - missing image or mimeType"}), 400
+        reload_result = model_registry.reload()
+        # Results of replaced models or changed thresholds are stale now
+        result_cache.clear()
+        return jsonify({"status": "ok", **reload_result})
+    except Exception as e:
+        logger.error(f"Error reloading models: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        # Use the medium cherry validation model
-        model_name = 'validation_model_medium_cherry'
-        interpreter = interpreters.get(model_name)
-        if not interpreter:
-            return jsonify({"error": f"Model {model_name} not loaded"}), 500
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Report loaded models, interpreter pool utilisation, queue depth and cache statistics
+    """
+    return jsonify({
+        "model_registry": model_registry.metrics(),
+        "preprocess_cache": preprocess_cache.metrics(),
+        "result_cache": result_cache.metrics()
+    })
 
-        preprocessed_image = preprocess_image(image, color_space)
-        if preprocessed_image is None:
-            return jsonify({"error": "Error processing image"}), 400
+# A data URI prefix ("data:image/jpeg;base64,") is only looked for this far into a value
+DATA_URI_PREFIX_MAX_BYTES = 256
 
-        # Run prediction with provided or default threshold
-        prediction_result = predict_binary_classification(
-            interpreter, 
-            preprocessed_image,
-            threshold=THRESHOLD
-        )
-        
-        if "error" in prediction_result:
-            return jsonify(prediction_result), 500
+def decode_base64(data):
+    """
+    Decode base64 text exactly as base64.b64decode(data) does.
+    
+    Characters outside the base64 alphabet (such as the line breaks of wrapped
+    base64) are skipped, as they always were.
+    
+    Args:
+        data: Bytes-like base64 text (e.g. a memoryview of a request body)
         
-        # Return the result in the expected format
-        result = {
-            "result": prediction_result["is_in_range"],
-            "confidence": prediction_result["confidence"],
-            "raw_confidence": prediction_result["raw_prediction"],
-            "position_score": 0.0,  # Neutral position score
-            "color_space_used": color_space,
-            "threshold_used": THRESHOLD  # Add the threshold used for transparency
-        }
+    Returns:
+        bytes: The decoded bytes
         
-        return jsonify(result)
-
-    except Exception as e:
-        logger.error(f"Error in medium cherry validation endpoint: {e}")
-        return jsonify({"error": str(e)}), 500
+    Raises:
+        binascii.Error: If data has incorrect padding
+    """
+    return binascii.a2b_base64(data)
 
-# Desert Oak Validation Endpoint
-@app.route('/validate/desert_oak', methods=['POST'])
-def validate_desert_oak():
-    try:
-        # Hardcoded threshold for desert oak
-        THRESHOLD = 0.507  # Adjust as needed
-        
-        # Get JSON data from request
-        data = request.json
+def decode_base64_span(buffer, start, end):
+    """
+    Decode the base64 image stored in buffer[start:end] without copying the encoded text.
+    
+    Args:
+        buffer: Bytes holding the base64 text
+        start: Offset of the first character
+        end: Offset just past the last character
         
-        image = data.get("image")
-        mime_type = data.get("mimeType")
-        # Check if threshold is provided in the request
-        if (data.get("threshold") is not None):
-            THRESHOLD = data.get("threshold")
-        color_space = "lab"  # Always use LAB color space
-
-        if not image or not mime_type:
-            return jsonify({"error": "Invalid input - missing image or mimeType"}), 400
-
-        # Use the desert oak validation model
-        model_name = 'validation_model_desert_oak'
-        interpreter = interpreters.get(model_name)
-        if not interpreter:
-            return jsonify({"error": f"Model {model_name} not loaded"}), 500
+    Returns:
+        bytes: Raw encoded image bytes
+    """
+    # Skip a data URI prefix by offset instead of splitting the string
+    comma = buffer.find(b',', start, min(end, start + DATA_URI_PREFIX_MAX_BYTES))
+    if comma >= 0:
+        start = comma + 1
+    
+    # Refuse to decode an image that would be over the upload limit
+    if (end - start) // 4 * 3 > MAX_UPLOAD_BYTES:
+        raise RequestEntityTooLarge()
+    return decode_base64(memoryview(buffer)[start:end])
 
-        preprocessed_image = preprocess_image(image, color_space)
-        if preprocessed_image is None:
-            return jsonify({"error": "Error processing image"}), 400
+def json_body_limit(num_images):
+    """Largest JSON body accepted for a request carrying num_images base64 images."""
+    # Base64 inflates every image by 4/3
+    return MAX_UPLOAD_BYTES * 4 // 3 * num_images + UPLOAD_FORM_OVERHEAD_BYTES
 
-        # Run prediction with provided or default threshold
-        prediction_result = predict_binary_classification(
-            interpreter, 
-            preprocessed_image,
-            threshold=THRESHOLD
-        )
+def read_json_images(field_names=("image",)):
+    """
+    Read a JSON request whose image fields are base64 strings, decoding the images
+    straight from the raw request bytes (see parse_json_images). Bodies over the
+    size limit are rejected with 413 before they are read, and bodies that are not
+    JSON with 415.
+    
+    Args:
+        field_names: Top-level JSON fields holding base64 images
         
-        if "error" in prediction_result:
-            return jsonify(prediction_result), 500
+    Returns:
+        tuple: (data, images) as returned by parse_json_images
+    """
+    request.max_content_length = json_body_limit(len(field_names))
+    if not request.is_json:
+        raise UnsupportedMediaType("Request Content-Type must be application/json")
+    return parse_json_images(request.get_data(cache=False), field_names)
+
+def parse_json_images(body, field_names=("image",)):
+    """
+    Parse a JSON body whose image fields are base64 strings.
+    
+    The base64 values are located by offset and cut out before the rest of the
+    body is parsed, so they are never turned into Python strings; each image is
+    decoded from a memoryview of the body.
+    
+    Args:
+        body: Raw request body
+        field_names: Top-level JSON fields holding base64 images
         
-        # Return the result in the expected format
-        result = {
-            "result": prediction_result["is_in_range"],
-            "confidence": prediction_result["confidence"],
-            "raw_confidence": prediction_result["raw_prediction"],
-            "position_score": 0.0,  # Neutral position score
-            "color_space_used": color_space,
-            "threshold_used": THRESHOLD  # Add the threshold used for transparency
-        }
+    Returns:
+        tuple: (data, images) with the other JSON fields, and the decoded bytes of
+        each image field (None if the field is missing)
         
-        return jsonify(result)
-
-    except Exception as e:
-        logger.error(f"Error in desert oak validation endpoint: {e}")
-        return jsonify({"error": str(e)}), 500
+    Raises:
+        ValueError: If the body is not a JSON object
+        binascii.Error: If an image is not valid base64
+    """
+    # Byte ranges of the string values of the image fields (base64 text has no
+    # quotes, so the value ends at the next quote unless it contains escapes)
+    spans = {}
+    for name in field_names:
+        match = re.search(rb'"%s"\s*:\s*"' % re.escape(name.encode()), body)
+        if not match:
+            continue
+        end = body.find(b'"', match.end())
+        if end < 0 or body.find(b'\\', match.end(), end) >= 0:
+            spans = None
+            break
+        spans[name] = (match.end(), end)
+    
+    if spans is not None:
+        # Parse the body with every image value replaced by an empty string
+        view = memoryview(body)
+        pieces = []
+        position = 0
+        for start, end in sorted(spans.values()):
+            pieces.append(view[position:start])
+            position = end
+        pieces.append(view[position:])
+        data = json.loads(b''.join(pieces))
+        
+        # A match inside a nested object leaves the top-level field missing
+        if isinstance(data, dict) and all(data.get(name) == "" for name in spans):
+            images = []
+            for name in field_names:
+                data.pop(name, None)
+                images.append(decode_base64_span(body, *spans[name]) if name in spans else None)
+            return data, images
+    
+    # Escaped or unusually nested values: parse the whole body
+    data = json.loads(body)
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    images = []
+    for name in field_names:
+        value = data.pop(name, None)
+        if isinstance(value, str):
+            value = value.encode()
+            images.append(decode_base64_span(value, 0, len(value)))
+        else:
+            images.append(None)
+    return data, images
 
-# Graphite Walnut Validation Endpoint
-@app.route('/validate/graphite_walnut', methods=['POST'])
-def validate_graphite_walnut():
+def predict_image(img_bytes):
+    """
+    Classify the wood type of an image with the default model.
+    
+    Args:
+        img_bytes: Raw encoded image bytes
+    
+    Returns:
+        Flask response with the predicted class and probabilities
+    """
     try:
-        # Hardcoded threshold for graphite walnut
-        THRESHOLD = 0.5125339031219482  # Adjust as needed
-        
-        # Get JSON data from request
-        data = request.json
+        # Use default model
+        model_pool = model_registry.get('default')
+        if not model_pool:
+            return jsonify({"error": "Model not loaded"}), 500
         
-        image = data.get("image")
-        mime_type = data.get("mimeType")
-        # Check if threshold is provided in the request
-        if (data.get("threshold") is not None):
-            THRESHOLD = data.get("threshold")
-        color_space = "lab"  # Always use LAB color space
-
-        if not image or not mime_type:
-            return jsonify({"error": "Invalid input - missing image or mimeType"}), 400
-
-        # Use the graphite walnut validation model
-        model_name = 'validation_model_graphite_walnut'
-        interpreter = interpreters.get(model_name)
-        if not interpreter:
-            return jsonify({"error": f"Model {model_name} not loaded"}), 500
-
-        preprocessed_image = preprocess_image(image, color_space)
-        if preprocessed_image is None:
+        def run_prediction():
+            model_spec = model_registry.spec('default')
+            preprocessed_image = preprocess_image_bytes(img_bytes, model_spec.get("color_space", "lab"), model_registry.input_size('default'))
+            if preprocessed_image is None:
+                return None
+            return predict_classification(
+                model_pool,
+                preprocessed_image,
+                model_registry.class_names('default')
+            )
+        
+        # Retries and identical concurrent uploads share one inference
+        cache_key = ("predict", "default", image_digest(img_bytes))
+        result = result_cache.get_or_compute(cache_key, run_prediction)
+        if result is None:
             return jsonify({"error": "Error processing image"}), 400
-
-        # Run prediction with provided or default threshold
-        prediction_result = predict_binary_classification(
-            interpreter, 
-            preprocessed_image,
-            threshold=THRESHOLD
-        )
-        
-        if "error" in prediction_result:
-            return jsonify(prediction_result), 500
-        
-        # Return the result in the expected format
-        result = {
-            "result": prediction_result["is_in_range"],
-            "confidence": prediction_result["confidence"],
-            "raw_confidence": prediction_result["raw_prediction"],
-            "position_score": 0.0,  # Neutral position score
-            "color_space_used": color_space,
-            "threshold_used": THRESHOLD  # Add the threshold used for transparency
-        }
         
         return jsonify(result)
-
+    
+    except PoolTimeoutError as e:
+        logger.warning(str(e))
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        logger.error(f"Error in graphite walnut validation endpoint: {e}")
+        logger.error(f"Error in prediction endpoint: {e}")
         return jsonify({"error": str(e)}), 500
-    
-# Full report endpoint
-@app.route('/generate-full-report', methods=['POST'])
-def generate_full_report():
+
+@app.route('/predict', methods=['POST'])
+def predict():
     try:
-        # Get JSON data from request
-        data = request.json
+        # Decode the base64 image straight from the request bytes
+        data, (img_bytes,) = read_json_images()
         
-        image = data.get("image")
         mime_type = data.get("mimeType")
-        color_space = data.get("colorSpace", "lab")
-
-        if not image or not mime_type:
+        
+        if not img_bytes or not mime_type:
             return jsonify({"error": "Invalid input - missing image or mimeType"}), 400
+    
+    except binascii.Error as e:
+        logger.error(f"Invalid base64 image data: {e}")
+        return jsonify({"error": "Error processing image"}), 400
+    except (RequestEntityTooLarge, UnsupportedMediaType):
+        raise
+    except Exception as e:
+        logger.error(f"Error in prediction endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+    return predict_image(img_bytes)
+
+@app.route('/predict/upload', methods=['POST'])
+def predict_upload():
+    """
+    Same as /predict, with the image sent as a multipart 'image' file or a raw image body
+    """
+    img_bytes, = read_uploaded_images()
+    if not img_bytes:
+        return jsonify({"error": "Invalid input - missing image"}), 400
+    
+    return predict_image(img_bytes)
+
+# Validation endpoints: URL name -> validation model in the manifest
+VALIDATION_MODELS = {
+    "medium_cherry": "validation_model_medium_cherry",
+    "desert_oak": "validation_model_desert_oak",
+    "graphite_walnut": "validation_model_graphite_walnut"
+}
+
+def format_validation_result(prediction_result, color_space, threshold):
+    """
+    Turn a binary prediction into the response of the validation endpoints.
+    
+    Args:
+        prediction_result: Result of predict_binary_classification
+        color_space: Color space the model was run in
+        threshold: Threshold the prediction was compared against
+    
+    Returns:
+        dict: Validation response
+    """
+    # Return the result in the expected format
+    return {
+        "result": prediction_result["is_in_range"],
+        "confidence": prediction_result["confidence"],
+        "raw_confidence": prediction_result["raw_prediction"],
+        "position_score": 0.0,  # Neutral position score
+        "color_space_used": color_space,
+        "threshold_used": threshold  # Add the threshold used for transparency
+    }
 
-        # 1. First, run the main classification model to determine wood type
-        main_interpreter = interpreters.get('default')
-        if not main_interpreter:
-            return jsonify({"error": "Default model not loaded"}), 500
-
-        preprocessed_image = preprocess_image(image, color_space)
-        if preprocessed_image is None:
+def parse_threshold(value):
+    """
+    Coerce a threshold sent by a client to a float.
+    
+    Args:
+        value: Threshold from the JSON body, form or query string (None if missing)
+    
+    Returns:
+        float or None: The threshold, or None if the request did not send one
+    
+    Raises:
+        ValueError: If the value is not a finite number
+    """
+    if value is None:
+        return None
+    try:
+        threshold = float(value)
+    except (TypeError, ValueError):
+        threshold = math.nan
+    if not math.isfinite(threshold):
+        raise ValueError(f"Invalid threshold {value!r}, expected a number")
+    return threshold
+
+def validate_image(model_name, img_bytes, threshold=None):
+    """
+    Check whether an image is within range for a color with its validation model.
+    
+    Args:
+        model_name: Name of the validation model in the manifest
+        img_bytes: Raw encoded image bytes
+        threshold: Optional threshold overriding the one in the manifest, as sent
+                   by the client (see parse_threshold)
+    
+    Returns:
+        Flask response with the validation result
+    """
+    try:
+        threshold = parse_threshold(threshold)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        # Threshold, color space and input size come from the model manifest
+        model_spec = model_registry.spec(model_name) or {}
+        THRESHOLD = model_spec.get("threshold", 0.5)
+        # Check if threshold is provided in the request
+        if threshold is not None:
+            THRESHOLD = threshold
+        color_space = model_spec.get("color_space", "lab")
+        
+        model_pool = model_registry.get(model_name)
+        if not model_pool:
+            return jsonify({"error": f"Model {model_name} not loaded"}), 500
+        
+        def run_prediction():
+            preprocessed_image = preprocess_image_bytes(img_bytes, color_space, model_registry.input_size(model_name))
+            if preprocessed_image is None:
+                return None
+            # Run prediction with provided or default threshold
+            return predict_binary_classification(
+                model_pool,
+                preprocessed_image,
+                threshold=THRESHOLD
+            )
+        
+        # Retries and identical concurrent uploads share one inference
+        cache_key = ("validate", model_name, image_digest(img_bytes), THRESHOLD)
+        prediction_result = result_cache.get_or_compute(cache_key, run_prediction)
+        if prediction_result is None:
             return jsonify({"error": "Error processing image"}), 400
+        
+        if "error" in prediction_result:
+            return jsonify(prediction_result), 500
+        
+        return jsonify(format_validation_result(prediction_result, color_space, THRESHOLD))
+    
+    except PoolTimeoutError as e:
+        logger.warning(str(e))
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error in {model_name} validation endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
 
-        main_result = predict_classification(
-            main_interpreter, 
-            preprocessed_image, 
-            CLASS_NAMES['default']
-        )
+def validate_json_request(model_name):
+    """
+    Validate the base64 image of a JSON request ({"image", "mimeType", optional "threshold"}).
+    
+    Args:
+        model_name: Name of the validation model in the manifest
+    
+    Returns:
+        Flask response with the validation result
+    """
+    try:
+        # Decode the base64 image straight from the request bytes
+        data, (img_bytes,) = read_json_images()
         
-        wood_type = main_result.get("predicted_class")
-        logger.info(f"Detected wood type: {wood_type}")
-        
-        # Initialize report structure
-        report = {
-            "wood_type": {
-                "classification": wood_type,
-                "confidence": main_result.get("confidence"),
-                "all_probabilities": main_result.get("all_probabilities")
-            },
-            "color_space_used": color_space,
-            "specialized_tests": {}
-        }
+        mime_type = data.get("mimeType")
         
-        # 2. If it's graphite walnut, run all graphite walnut tests
-        if wood_type == "graphite_walnut":
-            logger.info("Running specialized tests for graphite walnut")
-            
-            # 2.1 Binary classification
-            binary_model_name = 'validation_model_graphite_walnut'
-            binary_interpreter = interpreters.get(binary_model_name)
-            if binary_interpreter:
-                binary_result = predict_classification(
-                    binary_interpreter,
-                    preprocessed_image,
-                    CLASS_NAMES[binary_model_name]
-                )
-                report["specialized_tests"]["validation"] = binary_result
-            '''
-            # 2.2 Multiclass classification
-            multiclass_model_name = 'multiclass_model_graphite_walnut'
-            multiclass_interpreter = interpreters.get(multiclass_model_name)
-            if multiclass_interpreter:
-                multiclass_result = predict_classification(
-                    multiclass_interpreter,
-                    preprocessed_image,
-                    CLASS_NAMES[multiclass_model_name]
-                )
-                report["specialized_tests"]["multiclass"] = multiclass_result
-            
-            # 2.3 Regression model
-            regression_model_name = 'regression_model_graphite_walnut'
-            regression_interpreter = interpreters.get(regression_model_name)
-            if regression_interpreter:
-                regression_result = predict_regression(
-                    regression_interpreter,
-                    preprocessed_image
-                )
-                report["specialized_tests"]["regression"] = regression_result
-                '''
+        if not img_bytes or not mime_type:
+            return jsonify({"error": "Invalid input - missing image or mimeType"}), 400
+    
+    except binascii.Error as e:
+        logger.error(f"Invalid base64 image data: {e}")
+        return jsonify({"error": "Error processing image"}), 400
+    except (RequestEntityTooLarge, UnsupportedMediaType):
+        raise
+    except Exception as e:
+        logger.error(f"Error in {model_name} validation endpoint: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+    return validate_image(model_name, img_bytes, data.get("threshold"))
 
-                
-        if wood_type == "medium_cherry":
-            logger.info("Running specialized tests for medium cherry")
-            
-            # 2.1 Binary classification
-            binary_model_name = 'validation_model_medium_cherry'
-            binary_interpreter = interpreters.get(binary_model_name)
-            if binary_interpreter:
-                binary_result = predict_classification(
-                    binary_interpreter,
-                    preprocessed_image,
-                    CLASS_NAMES[binary_model_name]
-                )
-
-                report["specialized_tests"]["validation"] = binary_result
-
-        if wood_type == "desert_oak":
-            logger.info("Running specialized tests for desert oak")
-            
-            # 2.1 Binary classification
-            binary_model_name = 'validation_model_desert_oak'
-            binary_interpreter = interpreters.get(binary_model_name)
-            if binary_interpreter:
-                binary_result = predict_classification(
-                    binary_interpreter,
-                    preprocessed_image,
-                    CLASS_NAMES[binary_model_name]
-                )
-                report["specialized_tests"]["validation"] = binary_result
+# Medium Cherry Validation Endpoint
+@app.route('/validate/medium_cherry', methods=['POST'])
+def validate_medium_cherry():
+    return validate_json_request(VALIDATION_MODELS["medium_cherry"])
+
+# Desert Oak Validation Endpoint
+@app.route('/validate/desert_oak', methods=['POST'])
+def validate_desert_oak():
+    return validate_json_request(VALIDATION_MODELS["desert_oak"])
+
+# Graphite Walnut Validation Endpoint
+@app.route('/validate/graphite_walnut', methods=['POST'])
+def validate_graphite_walnut():
+    return validate_json_request(VALIDATION_MODELS["graphite_walnut"])
+
+@app.route('/validate/<color>/upload', methods=['POST'])
+def validate_upload(color):
+    """
+    Same as /validate/<color>, with the image sent as a multipart 'image' file or a
+    raw image body and the optional threshold as a form field or query parameter
+    """
+    model_name = VALIDATION_MODELS.get(color)
+    if not model_name:
+        return jsonify({"error": f"Unknown color {color}"}), 404
+    
+    img_bytes, = read_uploaded_images()
+    if not img_bytes:
+        return jsonify({"error": "Invalid input - missing image"}), 400
+    
+    return validate_image(model_name, img_bytes, request.values.get("threshold"))
+
+def build_full_report(main_pool, preprocessed_image, color_space='lab'):
+    """
+    Classify the wood type of a preprocessed image and run the specialized tests of that type.
+    
+    Args:
+        main_pool: Pool of the default (wood type) model
+        preprocessed_image: PreparedImage of the request
+        color_space: Color space the image was converted to
+    
+    Returns:
+        dict: Full report
+    """
+    main_result = predict_classification(
+        main_pool,
+        preprocessed_image,
+        model_registry.class_names('default')
+    )
+    
+    wood_type = main_result.get("predicted_class")
+    logger.info(f"Detected wood type: {wood_type}")
+    
+    # Initialize report structure
+    report = {
+        "wood_type": {
+            "classification": wood_type,
+            "confidence": main_result.get("confidence"),
+            "all_probabilities": main_result.get("all_probabilities")
+        },
+        "color_space_used": color_space,
+        "specialized_tests": {}
+    }
+    
+    # 2. If it's graphite walnut, run all graphite walnut tests
+    if wood_type == "graphite_walnut":
+        logger.info("Running specialized tests for graphite walnut")
+        
+        # 2.1 Binary classification
+        binary_model_name = 'validation_model_graphite_walnut'
+        binary_pool = model_registry.get(binary_model_name)
+        if binary_pool:
+            binary_result = predict_classification(
+                binary_pool,
+                preprocessed_image,
+                model_registry.class_names(binary_model_name)
+            )
+            report["specialized_tests"]["validation"] = binary_result
+        '''
+        # 2.2 Multiclass classification
+        multiclass_model_name = 'multiclass_model_graphite_walnut'
+        multiclass_pool = model_registry.get(multiclass_model_name)
+        if multiclass_pool:
+            multiclass_result = predict_classification(
+                multiclass_pool,
+                preprocessed_image,
+                model_registry.class_names(multiclass_model_name)
+            )
+            report["specialized_tests"]["multiclass"] = multiclass_result
+        
+        # 2.3 Regression model
+        regression_model_name = 'regression_model_graphite_walnut'
+        regression_pool = model_registry.get(regression_model_name)
+        if regression_pool:
+            regression_result = predict_regression(
+                regression_pool,
+                preprocessed_image
+            )
+            report["specialized_tests"]["regression"] = regression_result
             '''
-            # 2.2 Multiclass classification
-            multiclass_model_name = 'multiclass_model_graphite_walnut'
-            multiclass_interpreter = interpreters.get(multiclass_model_name)
-            if multiclass_interpreter:
-                multiclass_result = predict_classification(
-                    multiclass_interpreter,
-                    preprocessed_image,
-                    CLASS_NAMES[multiclass_model_name]
-                )
-                report["specialized_tests"]["multiclass"] = multiclass_result
+    
+    
+    if wood_type == "medium_cherry":
+        logger.info("Running specialized tests for medium cherry")
+        
+        # 2.1 Binary classification
+        binary_model_name = 'validation_model_medium_cherry'
+        binary_pool = model_registry.get(binary_model_name)
+        if binary_pool:
+            binary_result = predict_classification(
+                binary_pool,
+                preprocessed_image,
+                model_registry.class_names(binary_model_name)
+            )
             
-            # 2.3 Regression model
-            regression_model_name = 'regression_model_graphite_walnut'
-            regression_interpreter = interpreters.get(regression_model_name)
-            if regression_interpreter:
-                regression_result = predict_regression(
-                    regression_interpreter,
-                    preprocessed_image
-                )
-                report["specialized_tests"]["regression"] = regression_result
-            '''
+            report["specialized_tests"]["validation"] = binary_result
+    
+    if wood_type == "desert_oak":
+        logger.info("Running specialized tests for desert oak")
+        
+        # 2.1 Binary classification
+        binary_model_name = 'validation_model_desert_oak'
+        binary_pool = model_registry.get(binary_model_name)
+        if binary_pool:
+            binary_result = predict_classification(
+                binary_pool,
+                preprocessed_image,
+                model_registry.class_names(binary_model_name)
+            )
+            report["specialized_tests"]["validation"] = binary_result
+        '''
+        # 2.2 Multiclass classification
+        multiclass_model_name = 'multiclass_model_graphite_walnut'
+        multiclass_pool = model_registry.get(multiclass_model_name)
+        if multiclass_pool:
+            multiclass_result = predict_classification(
+                multiclass_pool,
+                preprocessed_image,
+                model_registry.class_names(multiclass_model_name)
+            )
+            report["specialized_tests"]["multiclass"] = multiclass_result
+        
+        # 2.3 Regression model
+        regression_model_name = 'regression_model_graphite_walnut'
+        regression_pool = model_registry.get(regression_model_name)
+        if regression_pool:
+            regression_result = predict_regression(
+                regression_pool,
+                preprocessed_image
+            )
+            report["specialized_tests"]["regression"] = regression_result
+        '''
+    return report
+
+def is_report_cacheable(report):
+    """Cache a full report only if the wood type and every specialized test were predicted."""
+    return (report is not None and report["wood_type"]["classification"] is not None and
+            not any("error" in result for result in report["specialized_tests"].values()))
+
+def generate_report(img_bytes, color_space='lab'):
+    """
+    Classify the wood type of an image and run the specialized tests of that type.
+    
+    Args:
+        img_bytes: Raw encoded image bytes
+        color_space: Color space the image is converted to for the models
+    
+    Returns:
+        Flask response with the full report
+    """
+    try:
+        # 1. First, run the main classification model to determine wood type
+        main_pool = model_registry.get('default')
+        if not main_pool:
+            return jsonify({"error": "Default model not loaded"}), 500
+        
+        def run_report():
+            preprocessed_image = preprocess_image_bytes(img_bytes, color_space)
+            if preprocessed_image is None:
+                return None
+            return build_full_report(main_pool, preprocessed_image, color_space)
+        
+        # Retries and identical concurrent uploads share one report
+        cache_key = ("report", image_digest(img_bytes), color_space)
+        report = result_cache.get_or_compute(cache_key, run_report, cacheable=is_report_cacheable)
+        if report is None:
+            return jsonify({"error": "Error processing image"}), 400
+        
         return jsonify(report)
     
+    except PoolTimeoutError as e:
+        logger.warning(str(e))
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error generating full report: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/generate-full-report', methods=['POST'])
+def generate_full_report():
+    try:
+        # Decode the base64 image straight from the request bytes
+        data, (img_bytes,) = read_json_images()
+        
+        mime_type = data.get("mimeType")
+        color_space = data.get("colorSpace", "lab")
+        
+        if not img_bytes or not mime_type:
+            return jsonify({"error": "Invalid input - missing image or mimeType"}), 400
+    
+    except binascii.Error as e:
+        logger.error(f"Invalid base64 image data: {e}")
+        return jsonify({"error": "Error processing image"}), 400
+    except (RequestEntityTooLarge, UnsupportedMediaType):
+        raise
     except Exception as e:
         logger.error(f"Error generating full report: {e}")
         return jsonify({"error": str(e)}), 500
+    
+    return generate_report(img_bytes, color_space)
+
+@app.route('/generate-full-report/upload', methods=['POST'])
+def generate_full_report_upload():
+    """
+    Same as /generate-full-report, with the image sent as a multipart 'image' file or a
+    raw image body and the optional colorSpace as a form field or query parameter
+    """
+    img_bytes, = read_uploaded_images()
+    if not img_bytes:
+        return jsonify({"error": "Invalid input - missing image"}), 400
+    
+    return generate_report(img_bytes, request.values.get("colorSpace", "lab"))
+
+def measure_rgb_difference(image1_data, image2_data):
+    """
+    Compute the mean per-pixel RGB Euclidean distance between two encoded images.
+    
+    Args:
+        image1_data: Raw encoded bytes of the first image
+        image2_data: Raw encoded bytes of the second image
+    
+    Returns:
+        dict: Response with the raw and normalized (0-100) difference
+    """
+    # Decode and resize to a standard size for comparison. Both images are
+    # decoded at full resolution (no JPEG draft mode), so the difference between
+    # two given images is the same as before reduced decoding was added
+    standard_size = (300, 300)
+    img1_array = load_image_array(io.BytesIO(image1_data), standard_size)
+    img2_array = load_image_array(io.BytesIO(image2_data), standard_size)
+    
+    # Calculate Euclidean distance using numpy directly
+    r_diff = (img1_array[:,:,0].astype(float) - img2_array[:,:,0].astype(float)) ** 2
+    g_diff = (img1_array[:,:,1].astype(float) - img2_array[:,:,1].astype(float)) ** 2
+    b_diff = (img1_array[:,:,2].astype(float) - img2_array[:,:,2].astype(float)) ** 2
+    
+    # Sum the channel differences for each pixel
+    pixel_diff = np.sqrt(r_diff + g_diff + b_diff)
+    
+    # Average difference across all pixels
+    difference = np.mean(pixel_diff)
+    
+    # Return the result
+    return {
+        'status': 'success',
+        'difference': float(difference),
+        'normalized_difference': float(min(100, difference / 2.55)),  # Normalize to 0-100 scale
+    }
+
+def compare_rgb_images(image1_data, image2_data):
+    """
+    Calculate the RGB Euclidean difference between two encoded images.
+    
+    Args:
+        image1_data: Raw encoded bytes of the first image
+        image2_data: Raw encoded bytes of the second image
+    
+    Returns:
+        Flask response with the raw and normalized (0-100) difference
+    """
+    try:
+        return jsonify(measure_rgb_difference(image1_data, image2_data))
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Error calculating RGB difference: {str(e)}'
+        }), 500
 
 @app.route('/rgb-difference', methods=['POST'])
 def calculate_rgb_difference():
@@ -946,111 +2743,79 @@ def calculate_rgb_difference():
     }
     """
     try:
-        # Get JSON data from request
-        data = request.get_json()
-        
-        if not data or 'image1' not in data or 'image2' not in data:
+        # Decode the base64 images straight from the request bytes
+        try:
+            data, (image1_data, image2_data) = read_json_images(("image1", "image2"))
+        except binascii.Error:
             return jsonify({
                 'status': 'error',
-                'message': 'Missing required image data'
+                'message': 'Invalid base64 image data'
             }), 400
         
-        # Decode base64 images
-        try:
-            image1_data = base64.b64decode(data['image1'].split(',')[1] if ',' in data['image1'] else data['image1'])
-            image2_data = base64.b64decode(data['image2'].split(',')[1] if ',' in data['image2'] else data['image2'])
-        except:
+        if image1_data is None or image2_data is None:
             return jsonify({
                 'status': 'error',
-                'message': 'Invalid base64 image data'
+                'message': 'Missing required image data'
             }), 400
-        
-        # Open images with PIL
-        image1 = Image.open(io.BytesIO(image1_data))
-        image2 = Image.open(io.BytesIO(image2_data))
-        
-        # Resize images to a standard size for comparison
-        standard_size = (300, 300)
-        image1 = image1.resize(standard_size)
-        image2 = image2.resize(standard_size)
-        
-        # Convert images to RGB if they aren't already
-        if image1.mode != 'RGB':
-            image1 = image1.convert('RGB')
-        if image2.mode != 'RGB':
-            image2 = image2.convert('RGB')
-        
-        # Convert to numpy arrays for efficient calculation
-        img1_array = np.array(image1)
-        img2_array = np.array(image2)
-        
-        # Calculate Euclidean distance using numpy directly
-        r_diff = (img1_array[:,:,0].astype(float) - img2_array[:,:,0].astype(float)) ** 2
-        g_diff = (img1_array[:,:,1].astype(float) - img2_array[:,:,1].astype(float)) ** 2
-        b_diff = (img1_array[:,:,2].astype(float) - img2_array[:,:,2].astype(float)) ** 2
-        
-        # Sum the channel differences for each pixel
-        pixel_diff = np.sqrt(r_diff + g_diff + b_diff)
-        
-        # Average difference across all pixels
-        difference = np.mean(pixel_diff)
-        
-        # Return the result
-        return jsonify({
-            'status': 'success',
-            'difference': float(difference),
-            'normalized_difference': float(min(100, difference / 2.55)),  # Normalize to 0-100 scale
-        })
-        
+    
+    except (RequestEntityTooLarge, UnsupportedMediaType):
+        raise
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': f'Error calculating RGB difference: {str(e)}'
         }), 500
+    
+    return compare_rgb_images(image1_data, image2_data)
 
-# RGB Classifier Endpoint
-@app.route('/api/classify-wood', methods=['POST', 'OPTIONS'])
-def classify_wood_rgb():
+@app.route('/rgb-difference/upload', methods=['POST'])
+def calculate_rgb_difference_upload():
     """
-    Endpoint to classify wood veneer images using base64-encoded images.
+    Same as /rgb-difference, with the images sent as multipart 'image1' and 'image2' files
+    """
+    image1_data, image2_data = read_uploaded_images(("image1", "image2"))
+    if not image1_data or not image2_data:
+        return jsonify({
+            'status': 'error',
+            'message': 'Missing required image data'
+        }), 400
     
-    Expects JSON with:
-    - 'image': A base64-encoded image string
-    - 'color': One of 'medium-cherry', 'desert-oak', or 'graphite-walnut'
+    return compare_rgb_images(image1_data, image2_data)
+
+def format_classification_result(result, color):
+    """
+    Turn a classify_image_api result into the response of the classify-wood endpoints.
+    
+    Args:
+        result: Result of classify_image_api
+        color: Color the image was classified against
     
     Returns:
-    - JSON with classification results
+        dict: Classification response
+    """
+    return {
+        'success': True,
+        'color': color,
+        'predicted_category': result['predicted_category'],
+        'main_category': result['main_category'],
+        'similarity_scores': result['similarity_scores'],
+        'pyramid_level': result['pyramid_level']
+    }
+
+def classify_wood_image(image_data, color, pyramid=False):
+    """
+    Classify a wood veneer image against the reference images of a color.
+    
+    Args:
+        image_data: Raw encoded image bytes
+        color: One of 'medium-cherry', 'desert-oak', or 'graphite-walnut'
+        pyramid: Classify at low resolution first and only refine at full
+            resolution for close calls
+    
+    Returns:
+        Flask response with the classification results
     """
-    # Handle preflight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = jsonify({'status': 'ok'})
-        return response
-        
     try:
-        # Get request data and log it for debugging
-        data = request.get_json()
-        logger.info(f"Received request to /api/classify-wood with data keys: {list(data.keys()) if data else None}")
-        
-        # Check if image data is provided
-        if not data or 'image' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'No image data provided'
-            }), 400
-        
-        # Get base64 image data
-        base64_image = data.get('image', '')
-        
-        # Check if the base64 string is empty
-        if not base64_image:
-            return jsonify({
-                'success': False,
-                'error': 'Empty image data'
-            }), 400
-        
-        # Get color parameter
-        color = data.get('color', 'medium-cherry')
-        
         # Validate color
         if color not in VALID_COLORS:
             return jsonify({
@@ -1060,32 +2825,9 @@ def classify_wood_rgb():
         
         logger.info(f"Processing image with color: {color}")
         
-        # Process the base64 image string (remove data URI prefix if present)
-        if ',' in base64_image:
-            # Handle data URLs like "data:image/jpeg;base64,/9j/4AAQSkZJRg..."
-            base64_image = base64_image.split(',', 1)[1]
-        
-        # Decode base64 image data
-        try:
-            image_data = base64.b64decode(base64_image)
-        except Exception as e:
-            logger.error(f"Invalid base64 image data: {str(e)}")
-            return jsonify({
-                'success': False,
-                'error': f'Invalid base64 image data: {str(e)}'
-            }), 400
-        
-        # Create a temporary file to save the image
-        temp_dir = tempfile.gettempdir()
-        temp_filename = f"{uuid.uuid4()}.jpg"
-        temp_path = os.path.join(temp_dir, temp_filename)
-        
-        # Save the decoded image data to the temporary file
+        # Decode the uploaded bytes in memory; nothing is written to disk
         try:
-            # First verify it's a valid image by opening it with PIL
-            image = Image.open(io.BytesIO(image_data))
-            image.save(temp_path)
-            logger.info(f"Saved image to temporary file: {temp_path}")
+            input_array = load_input_array_cached(image_data)
         except Exception as e:
             logger.error(f"Invalid image data: {str(e)}")
             return jsonify({
@@ -1093,9 +2835,14 @@ def classify_wood_rgb():
                 'error': f'Invalid image data: {str(e)}'
             }), 400
         
-        # Process the image using our integrated classifier function
+        # Process the image using our integrated classifier function; retries and
+        # identical concurrent uploads share one computation
         try:
-            result = classify_image_api(temp_path, color, max_images=20, verbose=True)
+            cache_key = ("classify-wood", image_digest(image_data), color, pyramid)
+            result = result_cache.get_or_compute(
+                cache_key,
+                lambda: classify_image_api(input_array, color, max_images=20, verbose=True, pyramid=pyramid)
+            )
             logger.info(f"Classification result: {result}")
         except Exception as e:
             logger.error(f"Error in classification: {str(e)}")
@@ -1103,12 +2850,6 @@ def classify_wood_rgb():
             traceback.print_exc()
             result = {"error": f"Classification error: {str(e)}"}
         
-        # Clean up the temporary file
-        try:
-            os.remove(temp_path)
-        except Exception as e:
-            logger.warning(f"Failed to delete temporary file: {e}")
-        
         # Check if there was an error in classification
         if 'error' in result:
             return jsonify({
@@ -1117,14 +2858,68 @@ def classify_wood_rgb():
             }), 500
         
         # Return success response
+        return jsonify(format_classification_result(result, color))
+    
+    except Exception as e:
+        logger.error(f"Error in classify_wood_rgb endpoint: {str(e)}")
+        import traceback
+        traceback.print_exc()
         return jsonify({
-            'success': True,
-            'color': color,
-            'predicted_category': result['predicted_category'],
-            'main_category': result['main_category'],
-            'similarity_scores': result['similarity_scores']
-        })
+            'success': False,
+            'error': f'Error processing image: {str(e)}'
+        }), 500
+
+# RGB Classifier Endpoint
+@app.route('/api/classify-wood', methods=['POST', 'OPTIONS'])
+def classify_wood_rgb():
+    """
+    Endpoint to classify wood veneer images using base64-encoded images.
+    
+    Expects JSON with:
+    - 'image': A base64-encoded image string
+    - 'color': One of 'medium-cherry', 'desert-oak', or 'graphite-walnut'
+    - 'pyramid' (optional): true to classify at low resolution first and only
+      refine at full resolution for close calls
+    
+    Returns:
+    - JSON with classification results
+    """
+    # Handle preflight OPTIONS request
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'ok'})
+        return response
+    
+    try:
+        # Decode the base64 image straight from the request bytes (data URI
+        # prefixes like "data:image/jpeg;base64," are skipped)
+        try:
+            data, (image_data,) = read_json_images()
+        except binascii.Error as e:
+            logger.error(f"Invalid base64 image data: {str(e)}")
+            return jsonify({
+                'success': False,
+                'error': f'Invalid base64 image data: {str(e)}'
+            }), 400
         
+        # Log the request fields for debugging
+        logger.info(f"Received request to /api/classify-wood with data keys: {list(data.keys())}")
+        
+        # Check if image data is provided
+        if image_data is None:
+            return jsonify({
+                'success': False,
+                'error': 'No image data provided'
+            }), 400
+        
+        # Check if the image is empty
+        if not image_data:
+            return jsonify({
+                'success': False,
+                'error': 'Empty image data'
+            }), 400
+    
+    except (RequestEntityTooLarge, UnsupportedMediaType):
+        raise
     except Exception as e:
         logger.error(f"Error in classify_wood_rgb endpoint: {str(e)}")
         import traceback
@@ -1133,7 +2928,26 @@ def classify_wood_rgb():
             'success': False,
             'error': f'Error processing image: {str(e)}'
         }), 500
+    
+    return classify_wood_image(image_data, data.get('color', 'medium-cherry'), bool(data.get('pyramid', False)))
+
+@app.route('/api/classify-wood/upload', methods=['POST'])
+def classify_wood_rgb_upload():
+    """
+    Same as /api/classify-wood, with the image sent as a multipart 'image' file or a
+    raw image body and 'color'/'pyramid' as form fields or query parameters
+    """
+    image_data, = read_uploaded_images()
+    if not image_data:
+        return jsonify({
+            'success': False,
+            'error': 'No image data provided'
+        }), 400
+    
+    pyramid = request.values.get('pyramid', 'false').lower() in ('1', 'true', 'yes')
+    return classify_wood_image(image_data, request.values.get('color', 'medium-cherry'), pyramid)
 # =========================================================
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=3050, debug=True)
\ No newline at end of file
+    # The debugger runs arbitrary code from the browser: only enable it locally
+    app.run(host='0.0.0.0', port=3050, debug=os.environ.get("FLASK_DEBUG", "0").lower() in ('1', 'true', 'yes'))
\ No newline at end of file
@@ -0,0 +1,86 @@
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import pool_interpreters, write_stub_model
+from server import BatchScheduler, InterpreterPool, get_batch_bucket
+
+
+def make_scheduler(tmp_path, max_batch_size, window_ms=1000.0, **model):
+    pool = InterpreterPool("stub", write_stub_model(tmp_path / "stub.tflite", **model), size=1)
+    return BatchScheduler(pool, max_batch_size, window_ms)
+
+
+def run_concurrently(scheduler, values):
+    """Run one request per value from separate threads; each input is filled with its value."""
+    outcomes = [None] * len(values)
+
+    def call(index):
+        try:
+            outcomes[index] = scheduler.run(np.full((1, 4, 4, 3), values[index], dtype=np.float32))
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(values))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5.0)
+    return outcomes
+
+
+@pytest.mark.parametrize("num_inputs, max_batch_size, expected", [
+    (1, 8, 1), (2, 8, 2), (3, 8, 4), (5, 8, 8), (8, 8, 8), (5, 6, 6), (3, 3, 3)
+])
+def test_batch_bucket(num_inputs, max_batch_size, expected):
+    assert get_batch_bucket(num_inputs, max_batch_size) == expected
+
+
+def test_each_request_gets_its_own_row_of_one_batched_invoke(tmp_path, stub_interpreters):
+    scheduler = make_scheduler(tmp_path, max_batch_size=4, scale=10.0)
+
+    outcomes = run_concurrently(scheduler, [1, 2, 3, 4])
+
+    assert [outcome.tolist() for outcome in outcomes] == [[[10.0]], [[20.0]], [[30.0]], [[40.0]]]
+    (interpreter,) = pool_interpreters(scheduler.pool)
+    assert interpreter.batch_sizes == [4]
+    assert scheduler.metrics()["batches"] == 1
+    scheduler.close()
+
+
+def test_batches_are_padded_to_a_bucket_without_reallocating(tmp_path, stub_interpreters):
+    scheduler = make_scheduler(tmp_path, max_batch_size=8, window_ms=200.0)
+    (interpreter,) = pool_interpreters(scheduler.pool)
+
+    first = run_concurrently(scheduler, [1, 2, 3])
+    allocations = interpreter.allocations
+    second = run_concurrently(scheduler, [4, 5, 6])
+
+    assert [outcome.tolist() for outcome in first + second] == [[[v]] for v in [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]]
+    assert interpreter.batch_sizes == [4, 4]
+    assert interpreter.allocations == allocations
+    scheduler.close()
+
+
+def test_fixed_batch_model_falls_back_to_one_by_one(tmp_path, stub_interpreters):
+    scheduler = make_scheduler(tmp_path, max_batch_size=4, fixed_batch=True)
+
+    outcomes = run_concurrently(scheduler, [1, 2, 3, 4])
+
+    assert [outcome.tolist() for outcome in outcomes] == [[[1.0]], [[2.0]], [[3.0]], [[4.0]]]
+    assert scheduler.batching_supported is False
+    # The failed resize left the interpreter at its original batch size
+    (interpreter,) = pool_interpreters(scheduler.pool)
+    assert interpreter.batch_sizes == [1, 1, 1, 1]
+    scheduler.close()
+
+
+def test_inference_errors_reach_every_request_and_keep_batching(tmp_path, stub_interpreters):
+    scheduler = make_scheduler(tmp_path, max_batch_size=4, fail=True)
+
+    outcomes = run_concurrently(scheduler, [1, 2, 3, 4])
+
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert scheduler.batching_supported is True
+    scheduler.close()
@@ -0,0 +1,153 @@
+import base64
+import io
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+from starlette.testclient import TestClient
+
+import asgi_server
+import server
+
+WOOD_TYPES = ["desert_oak", "graphite_walnut", "medium_cherry"]
+
+
+def encode_png(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+IMAGE = encode_png(np.full((8, 8, 3), 128, dtype=np.uint8))
+IMAGE_BASE64 = base64.b64encode(IMAGE).decode()
+
+
+def make_models(validation_stub=None):
+    # The report runs at the default 224x224 input size. The stub's single
+    # output always picks the first class, desert_oak.
+    stub = {"input_shape": [224, 224, 3]}
+    return {
+        "default": {"file": "default.tflite", "type": "classification", "class_names": WOOD_TYPES,
+                    "input_shape": [1, 224, 224, 3], "stub": stub},
+        "validation_model_desert_oak": {"file": "validation_desert_oak.tflite", "type": "classification",
+                                        "class_names": ["Out of Range", "In Range"], "threshold": 0.5,
+                                        "input_shape": [1, 224, 224, 3], "stub": dict(stub, **(validation_stub or {}))}
+    }
+
+
+class ServerClient:
+    """The same requests against the Flask app or the ASGI app; each returns (status, JSON body)."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.client = server.app.test_client() if kind == "flask" else TestClient(asgi_server.app)
+
+    def post_json(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.get_json() if self.kind == "flask" else response.json()
+
+    def post_image(self, path, image):
+        status, body = self.post_body(path, image, "image/png")
+        return status, json.loads(body)
+
+    def post_body(self, path, body, content_type):
+        """Post a raw body; returns (status, response body bytes)."""
+        if self.kind == "flask":
+            response = self.client.post(path, data=body, content_type=content_type)
+            return response.status_code, response.get_data()
+        response = self.client.post(path, content=body, headers={"Content-Type": content_type})
+        return response.status_code, response.content
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def make_client(request, stub_registry, monkeypatch):
+    """Return a function serving the given stub models from one of the two servers."""
+    def make(models):
+        registry = stub_registry(models)
+        if request.param == "asgi":
+            monkeypatch.setattr(asgi_server, "model_registry", registry)
+            for name in ("decode", "inference"):
+                monkeypatch.setitem(asgi_server.stages, name, asgi_server.Stage(name, 2))
+        return ServerClient(request.param)
+    return make
+
+
+def post_report(client):
+    return client.post_json("/generate-full-report", {"image": IMAGE_BASE64, "mimeType": "image/png"})
+
+
+def post_validation(client, threshold):
+    return client.post_json("/validate/desert_oak", {"image": IMAGE_BASE64, "mimeType": "image/png",
+                                                    "threshold": threshold})
+
+
+def cache_hits():
+    return server.result_cache.metrics()["hits"]
+
+
+def test_full_report_is_cached(make_client):
+    client = make_client(make_models())
+    hits = cache_hits()
+
+    first = post_report(client)
+    second = post_report(client)
+
+    assert first[0] == 200
+    assert first == second
+    assert cache_hits() == hits + 1
+    assert first[1]["wood_type"]["classification"] == "desert_oak"
+    assert "validation" in first[1]["specialized_tests"]
+
+
+def test_full_report_with_a_failed_test_is_not_cached(make_client):
+    client = make_client(make_models(validation_stub={"fail": True}))
+    hits = cache_hits()
+
+    post_report(client)
+    post_report(client)
+
+    assert cache_hits() == hits
+    assert server.result_cache.metrics()["entries"] == 0
+
+
+@pytest.mark.parametrize("threshold", [[0.5], {"value": 0.5}, "high", "nan", "inf"])
+def test_invalid_json_threshold_is_a_bad_request(make_client, threshold):
+    client = make_client(make_models())
+
+    status, body = post_validation(client, threshold)
+
+    assert status == 400
+    assert "threshold" in body["error"]
+
+
+def test_invalid_upload_threshold_is_a_bad_request(make_client):
+    client = make_client(make_models())
+
+    status, body = client.post_image("/validate/desert_oak/upload?threshold=high", IMAGE)
+
+    assert status == 400
+    assert "threshold" in body["error"]
+
+
+@pytest.mark.parametrize("threshold, expected", [(0.25, 0.25), ("0.25", 0.25), (None, 0.5)])
+def test_threshold_is_coerced_to_a_number(make_client, threshold, expected):
+    client = make_client(make_models())
+
+    status, body = post_validation(client, threshold)
+
+    assert status == 200
+    assert body["threshold_used"] == expected
+
+
+@pytest.mark.parametrize("path", ["/predict", "/validate/desert_oak", "/generate-full-report",
+                                  "/rgb-difference", "/api/classify-wood"])
+@pytest.mark.parametrize("content_type", ["text/plain", "application/x-www-form-urlencoded"])
+def test_json_route_rejects_other_content_types(make_client, path, content_type):
+    client = make_client(make_models())
+    body = json.dumps({"image": IMAGE_BASE64, "image1": IMAGE_BASE64, "image2": IMAGE_BASE64,
+                       "mimeType": "image/png"}).encode()
+
+    status, _ = client.post_body(path, body, content_type)
+
+    assert status == 415
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from rgb_reference import calculate_distances_batch
+
+
+def pairwise_distance(img1_array, img2_array):
+    """The per-pair float64 distance calculate_distances_batch replaced."""
+    r_diff = (img1_array[:,:,0].astype(float) - img2_array[:,:,0].astype(float)) ** 2
+    g_diff = (img1_array[:,:,1].astype(float) - img2_array[:,:,1].astype(float)) ** 2
+    b_diff = (img1_array[:,:,2].astype(float) - img2_array[:,:,2].astype(float)) ** 2
+    return np.mean(np.sqrt(r_diff + g_diff + b_diff))
+
+
+@pytest.fixture
+def images():
+    rng = np.random.default_rng(0)
+    input_array = rng.integers(0, 256, (300, 300, 3), dtype=np.uint8)
+    reference_stack = rng.integers(0, 256, (11, 300, 300, 3), dtype=np.uint8)
+    # Largest possible differences, where an int16 or uint8 kernel would overflow
+    reference_stack[0] = 255 - input_array
+    reference_stack[1] = np.where(input_array < 128, 255, 0)
+    reference_stack[2] = input_array
+    return input_array, reference_stack
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64])
+def test_matches_pairwise_float64_distances(images, chunk_size):
+    input_array, reference_stack = images
+    expected = [pairwise_distance(input_array, reference) for reference in reference_stack]
+
+    distances = calculate_distances_batch(input_array, reference_stack, chunk_size=chunk_size)
+
+    assert distances.dtype == np.float64
+    assert distances.tolist() == expected
+    assert distances[2] == 0.0
+
+
+def test_indices_select_stack_entries(images):
+    input_array, reference_stack = images
+    indices = [9, 0, 5, 5]
+    expected = [pairwise_distance(input_array, reference_stack[i]) for i in indices]
+
+    distances = calculate_distances_batch(input_array, reference_stack, indices=indices, chunk_size=3)
+
+    assert distances.tolist() == expected
+
+
+def test_empty_indices(images):
+    input_array, reference_stack = images
+    assert len(calculate_distances_batch(input_array, reference_stack, indices=[])) == 0
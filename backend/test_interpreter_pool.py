@@ -0,0 +1,79 @@
+import base64
+import io
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import server
+from conftest import pool_interpreters, write_stub_model
+from server import InterpreterPool, PoolTimeoutError
+
+
+def encode_png(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def registry(stub_registry, monkeypatch):
+    monkeypatch.setitem(server.MODEL_POOL_SIZES, "default", 1)
+    return stub_registry({"default": {"file": "default.tflite", "type": "classification",
+                                      "class_names": ["desert_oak", "medium_cherry"]}}, max_batch_size=1)
+
+
+def test_requests_use_separate_interpreters(tmp_path, stub_interpreters):
+    pool = InterpreterPool("stub", write_stub_model(tmp_path / "stub.tflite"), size=2)
+
+    with pool.checkout() as first, pool.checkout() as second:
+        assert first is not second
+        assert pool.metrics()["in_use"] == 2
+
+    assert pool.metrics()["in_use"] == 0
+    assert pool.metrics()["checkouts"] == 2
+
+
+def test_checkout_times_out_when_every_interpreter_is_busy(tmp_path, stub_interpreters):
+    pool = InterpreterPool("stub", write_stub_model(tmp_path / "stub.tflite"), size=1, timeout=0.05)
+
+    with pool.checkout():
+        with pytest.raises(PoolTimeoutError):
+            pool.run(np.ones((1, 4, 4, 3), dtype=np.float32))
+
+    assert pool.metrics()["timeouts"] == 1
+    # The interpreter is free again once it is checked in
+    assert pool.run(np.ones((1, 4, 4, 3), dtype=np.float32)).tolist() == [[1.0]]
+
+
+def test_waiting_request_gets_the_interpreter_when_it_is_checked_in(tmp_path, stub_interpreters):
+    pool = InterpreterPool("stub", write_stub_model(tmp_path / "stub.tflite", scale=2.0), size=1, timeout=5.0)
+    results = []
+
+    with pool.checkout():
+        thread = threading.Thread(target=lambda: results.append(pool.run(np.ones((1, 4, 4, 3), dtype=np.float32))))
+        thread.start()
+        thread.join(0.1)
+        assert results == []
+        assert pool.metrics()["queue_depth"] == 1
+    thread.join(5.0)
+
+    assert results[0].tolist() == [[2.0]]
+    assert len(pool_interpreters(pool)) == 1
+
+
+def test_busy_model_returns_503(registry):
+    client = server.app.test_client()
+    image = base64.b64encode(encode_png(np.full((8, 8, 3), 128, dtype=np.uint8))).decode()
+    pool = registry.get("default")
+    pool.timeout = 0.05
+
+    with pool.checkout():
+        busy = client.post("/predict", json={"image": image, "mimeType": "image/png"})
+    free = client.post("/predict", json={"image": image, "mimeType": "image/png"})
+
+    assert busy.status_code == 503
+    assert "interpreter" in busy.get_json()["error"]
+    assert free.status_code == 200
+    assert free.get_json()["predicted_class"] in ("desert_oak", "medium_cherry")
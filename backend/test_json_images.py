@@ -0,0 +1,161 @@
+import base64
+import binascii
+import io
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import server
+from server import decode_base64, parse_json_images
+
+IMAGE_BYTES = bytes(range(256)) * 3 + b"\xff\xd8 tail"
+IMAGE_BASE64 = base64.b64encode(IMAGE_BYTES).decode()
+
+# Base64 values of every kind the endpoints may receive, valid or not
+BASE64_VALUES = [
+    "",
+    "YQ==",
+    "YWI=",
+    "YWJj",
+    IMAGE_BASE64,
+    "YQ",
+    "YQ=",
+    "YQ===",
+    "YWJ",
+    "a",
+    "=",
+    "YW=j",
+    "YQ==YQ==",
+    "Y Q==",
+    "YQ==\n",
+    " YWJj",
+    IMAGE_BASE64[:76] + "\r\n" + IMAGE_BASE64[76:],
+    "YW*j",
+    "YWJjé",
+    "-_-_",
+    base64.encodebytes(IMAGE_BYTES).decode(),
+    base64.encodebytes(IMAGE_BYTES).decode().replace("\n", "\r\n"),
+    base64.encodebytes(b"abcd").decode(),
+]
+
+
+def b64decode_or_error(value):
+    try:
+        return base64.b64decode(value)
+    except binascii.Error:
+        return binascii.Error
+
+
+def parse_or_error(body, field_names=("image",)):
+    try:
+        return parse_json_images(body, field_names)
+    except binascii.Error:
+        return None, [binascii.Error]
+
+
+@pytest.mark.parametrize("value", BASE64_VALUES)
+def test_decode_base64_matches_b64decode(value):
+    encoded = value.encode()
+    expected = b64decode_or_error(encoded)
+    try:
+        assert decode_base64(memoryview(encoded)) == expected
+    except binascii.Error:
+        assert expected is binascii.Error
+
+
+@pytest.mark.parametrize("value", BASE64_VALUES)
+@pytest.mark.parametrize("prefix", ["", "data:image/jpeg;base64,"])
+def test_json_image_matches_b64decode(value, prefix):
+    body = json.dumps({"image": prefix + value, "mimeType": "image/jpeg"}).encode()
+
+    data, images = parse_or_error(body)
+
+    assert images == [b64decode_or_error(value.encode())]
+    if data is not None:
+        assert data == {"mimeType": "image/jpeg"}
+
+
+@pytest.mark.parametrize("value", BASE64_VALUES)
+def test_escaped_json_value_matches_b64decode(value):
+    # Values with JSON escapes (some encoders escape '/') go through the full parser
+    escaped = "".join("\\u%04x" % ord(c) for c in value)
+    body = ('{"image": "%s", "color": "desert-oak"}' % escaped).encode()
+
+    data, images = parse_or_error(body)
+
+    assert images == [b64decode_or_error(value.encode())]
+    if data is not None:
+        assert data == {"color": "desert-oak"}
+
+
+def test_fields_are_found_in_any_order_and_spacing():
+    image1 = base64.b64encode(b"first").decode()
+    image2 = base64.b64encode(b"second").decode()
+    body = ('{ "threshold" : 0.4, "image2":"%s",\n  "image1" :  "data:image/png;base64,%s" }'
+            % (image2, image1)).encode()
+
+    data, images = parse_json_images(body, ("image1", "image2"))
+
+    assert images == [b"first", b"second"]
+    assert data == {"threshold": 0.4}
+
+
+def test_missing_field_is_none():
+    data, images = parse_json_images(b'{"image1": "YWJj"}', ("image1", "image2"))
+
+    assert images == [b"abc", None]
+    assert data == {}
+
+
+def test_nested_field_with_the_same_name_is_not_the_image():
+    body = b'{"meta": {"image": "YWJj"}, "image": "ZGVm"}'
+
+    data, images = parse_json_images(body)
+
+    assert images == [b"def"]
+    assert data == {"meta": {"image": "YWJj"}}
+
+
+def test_only_nested_field_is_missing():
+    data, images = parse_json_images(b'{"meta": {"image": "YWJj"}}')
+
+    assert images == [None]
+    assert data == {"meta": {"image": "YWJj"}}
+
+
+def test_non_string_image_is_none():
+    data, images = parse_json_images(b'{"image": 42}')
+
+    assert images == [None]
+
+
+@pytest.mark.parametrize("body", [b'["YWJj"]', b'"YWJj"', b'{"image": "YWJj"'])
+def test_invalid_json_body_is_a_value_error(body):
+    with pytest.raises(ValueError):
+        parse_json_images(body)
+
+
+def test_oversized_image_is_rejected_before_decoding(monkeypatch):
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 1024)
+    body = json.dumps({"image": base64.b64encode(b"x" * 2048).decode()}).encode()
+
+    with pytest.raises(RequestEntityTooLarge):
+        parse_json_images(body)
+
+
+def test_wrapped_base64_image_is_predicted_like_unwrapped(stub_registry):
+    stub_registry({"default": {"file": "default.tflite", "type": "classification", "class_names": ["a", "b"]}})
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((8, 8, 3), 128, dtype=np.uint8)).save(buffer, format="PNG")
+    client = server.app.test_client()
+
+    wrapped = client.post("/predict", json={"image": base64.encodebytes(buffer.getvalue()).decode(),
+                                            "mimeType": "image/png"})
+    unwrapped = client.post("/predict", json={"image": base64.b64encode(buffer.getvalue()).decode(),
+                                              "mimeType": "image/png"})
+
+    assert wrapped.status_code == 200
+    assert wrapped.get_json() == unwrapped.get_json()
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from conftest import pool_interpreters, write_stub_model
+
+
+def make_models(names):
+    return {name: {"file": f"{name}.tflite", "type": "classification", "class_names": ["a", "b"]}
+            for name in names}
+
+
+def test_models_load_on_first_use(stub_registry):
+    registry = stub_registry(make_models(["first", "second"]))
+
+    assert registry.metrics()["loaded_models"] == []
+    pool = registry.get("first")
+
+    assert registry.get("first") is pool
+    assert registry.metrics()["loaded_models"] == ["first"]
+    assert registry.metrics()["loads"] == 1
+    assert registry.get("unknown") is None
+
+
+def test_concurrent_first_requests_load_once(stub_registry):
+    registry = stub_registry(make_models(["first"]))
+    pools = []
+
+    threads = [threading.Thread(target=lambda: pools.append(registry.get("first"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5.0)
+
+    assert len(pools) == 8 and all(pool is pools[0] for pool in pools)
+    assert registry.metrics()["loads"] == 1
+
+
+def test_least_recently_used_model_is_unloaded_over_budget(stub_registry):
+    registry = stub_registry(make_models(["first", "second", "third"]))
+    model_bytes = registry.get("first").memory_bytes
+    registry.memory_budget_bytes = int(model_bytes * 2.5)
+
+    registry.get("second")
+    registry.get("first")
+    registry.get("third")
+
+    assert registry.metrics()["loaded_models"] == ["first", "third"]
+    assert registry.metrics()["evictions"] == 1
+    assert registry.metrics()["memory_bytes"] <= registry.memory_budget_bytes
+
+
+def test_unloaded_model_is_loaded_again_on_its_next_request(stub_registry):
+    registry = stub_registry(make_models(["first", "second"]))
+    first = registry.get("first")
+    registry.memory_budget_bytes = first.memory_bytes
+
+    registry.get("second")
+    reloaded = registry.get("first")
+
+    assert reloaded is not first
+    assert registry.metrics()["loaded_models"] == ["first"]
+    assert reloaded.run(np.ones((1, 4, 4, 3), dtype=np.float32)).tolist() == [[1.0]]
+
+
+def test_model_over_the_budget_on_its_own_still_serves(stub_registry):
+    registry = stub_registry(make_models(["first"]))
+    registry.memory_budget_bytes = 1
+
+    pool = registry.get("first")
+
+    assert pool is not None
+    assert registry.metrics()["loaded_models"] == ["first"]
+
+
+def run_model(registry, name):
+    return registry.get(name).run(np.ones((1, 4, 4, 3), dtype=np.float32)).tolist()
+
+
+def test_reload_swaps_in_the_changed_model(stub_registry, tmp_path):
+    registry = stub_registry(make_models(["first", "second"]))
+    old_first, old_second = registry.get("first"), registry.get("second")
+    write_stub_model(tmp_path / "first.tflite", scale=2.0)
+
+    result = registry.reload()
+
+    assert result == {"rebuilt": ["first"], "removed": []}
+    assert run_model(registry, "first") == [[2.0]]
+    assert registry.get("first") is not old_first
+    assert registry.get("second") is old_second
+    # The new interpreters were warmed up before they were swapped in
+    assert all(interpreter.batch_sizes for interpreter in pool_interpreters(registry.get("first").pool))
+
+
+def test_requests_are_served_throughout_a_reload(stub_registry, tmp_path):
+    registry = stub_registry(make_models(["first"]))
+    registry.get("first")
+    results, errors = [], []
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            try:
+                results.append(run_model(registry, "first")[0][0])
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=serve) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    write_stub_model(tmp_path / "first.tflite", scale=2.0)
+    registry.reload()
+    served_after_reload = len(results)
+    deadline = time.time() + 5.0
+    while len(results) < served_after_reload + 20 and time.time() < deadline:
+        time.sleep(0.001)
+    stop.set()
+    for thread in threads:
+        thread.join(5.0)
+
+    assert errors == []
+    assert set(results) <= {1.0, 2.0}
+    # Requests that got the old pool before the swap may finish after it
+    assert set(results[served_after_reload + len(threads):]) == {2.0}
+
+
+def test_model_that_fails_to_rebuild_keeps_its_previous_version(stub_registry, tmp_path):
+    registry = stub_registry(make_models(["first"]))
+    old_first = registry.get("first")
+    with open(tmp_path / "first.tflite", "w") as f:
+        f.write("not a model")
+
+    result = registry.reload()
+
+    assert result == {"rebuilt": [], "removed": []}
+    assert registry.get("first") is old_first
+    assert run_model(registry, "first") == [[1.0]]
+
+
+def test_reload_applies_manifest_changes_and_removals(stub_registry, tmp_path):
+    registry = stub_registry(make_models(["first", "second"]))
+    registry.get("first")
+    registry.get("second")
+    with open(tmp_path / "manifest.json") as f:
+        manifest = json.load(f)
+    manifest["models"]["first"]["threshold"] = 0.8
+    del manifest["models"]["second"]
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump(manifest, f)
+    os.remove(tmp_path / "second.tflite")
+
+    result = registry.reload()
+
+    assert result == {"rebuilt": [], "removed": ["second"]}
+    assert registry.spec("first")["threshold"] == 0.8
+    assert registry.metrics()["loaded_models"] == ["first"]
+    assert registry.get("second") is None
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from conftest import StubInterpreter, write_stub_model
+from server import InterpreterPool, PreparedImage, dequantize, get_quantization, quantize
+
+QUANTIZATIONS = [(0.02, -5, "int8"), (1 / 255, -128, "int8"), (0.05, 128, "uint8")]
+
+
+@pytest.mark.parametrize("quantization", QUANTIZATIONS)
+def test_every_quantized_value_survives_a_round_trip(quantization):
+    info = np.iinfo(quantization[2])
+    values = np.arange(info.min, info.max + 1).astype(quantization[2])
+
+    restored = quantize(dequantize(values, quantization), quantization)
+
+    assert restored.dtype == values.dtype
+    assert restored.tolist() == values.tolist()
+
+
+@pytest.mark.parametrize("quantization", QUANTIZATIONS)
+def test_float_values_are_within_half_a_step(quantization):
+    scale, zero_point, dtype = quantization
+    info = np.iinfo(dtype)
+    low, high = (info.min - zero_point) * scale, (info.max - zero_point) * scale
+    values = np.random.default_rng(0).uniform(low, high, 1000).astype(np.float32)
+
+    restored = dequantize(quantize(values, quantization), quantization)
+
+    assert restored.dtype == np.float32
+    assert np.abs(restored - values).max() <= scale / 2 + 1e-6
+
+
+def test_out_of_range_values_are_clipped():
+    quantization = (0.1, 0, "int8")
+
+    assert quantize(np.array([-100.0, 100.0]), quantization).tolist() == [-128, 127]
+
+
+def test_float_tensors_have_no_quantization(tmp_path):
+    float_model = StubInterpreter(write_stub_model(tmp_path / "float.tflite"))
+    int8_model = StubInterpreter(write_stub_model(tmp_path / "int8.tflite",
+                                                  quantization={"input": [0.5, 3], "output": [0.25, -1]}))
+
+    assert get_quantization(float_model.get_input_details()[0]) is None
+    assert get_quantization(int8_model.get_input_details()[0]) == (0.5, 3, "int8")
+    assert get_quantization(int8_model.get_output_details()[0]) == (0.25, -1, "int8")
+
+
+def test_quantized_model_takes_and_returns_float_values(tmp_path, stub_interpreters):
+    float_pool = InterpreterPool("float", write_stub_model(tmp_path / "float.tflite", scale=0.5))
+    int8_pool = InterpreterPool("int8", write_stub_model(tmp_path / "int8.tflite", scale=0.5, quantization={
+        "input": [1 / 127, 0], "output": [1 / 254, 0]}))
+    inputs = np.random.default_rng(0).uniform(0, 1, (3, 4, 4, 3)).astype(np.float32)
+
+    expected = float_pool.run(inputs)
+    output = int8_pool.run(inputs)
+
+    assert output.dtype == np.float32
+    assert np.abs(output - expected).max() <= 1 / 127
+
+
+@pytest.mark.parametrize("color_space", ["lab", "rgb", "hsv"])
+def test_prepared_image_is_quantized_like_its_float_input(color_space):
+    pixels = np.random.default_rng(0).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    prepared = PreparedImage(pixels, color_space)
+    quantization = (1 / 255, -128, "int8")
+
+    quantized = prepared.to_array(quantization)
+
+    assert quantized.dtype == np.int8
+    difference = quantized.astype(int) - quantize(prepared.to_array(), quantization).astype(int)
+    assert np.abs(difference).max() <= 1
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from server import ResultCache
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+class BlockingCompute:
+    """A compute function that counts its calls and blocks until released."""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        assert self.release.wait(5.0)
+        if isinstance(self.result, BaseException):
+            raise self.result
+        return self.result
+
+
+def run_concurrently(cache, key, compute, num_threads):
+    """Call get_or_compute from several threads, once all but one are waiting on the first."""
+    outcomes = [None] * num_threads
+
+    def call(index):
+        try:
+            outcomes[index] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: cache.metrics()["coalesced"] == num_threads - 1)
+    compute.release.set()
+    for thread in threads:
+        thread.join(5.0)
+    return outcomes
+
+
+def test_concurrent_calls_compute_once():
+    cache = ResultCache(ttl=60, max_entries=16)
+    compute = BlockingCompute({"label": "desert_oak"})
+
+    outcomes = run_concurrently(cache, "key", compute, 8)
+
+    assert compute.calls == 1
+    assert all(outcome is compute.result for outcome in outcomes)
+    assert cache.metrics()["in_flight"] == 0
+
+    # Later calls are served from the cache
+    assert cache.get_or_compute("key", lambda: pytest.fail("recomputed")) is compute.result
+    assert cache.metrics()["hits"] == 1
+
+
+def test_exception_reaches_every_waiter_and_is_not_cached():
+    cache = ResultCache(ttl=60, max_entries=16)
+    error = RuntimeError("inference failed")
+    compute = BlockingCompute(error)
+
+    outcomes = run_concurrently(cache, "key", compute, 4)
+
+    assert compute.calls == 1
+    assert all(outcome is error for outcome in outcomes)
+    assert cache.get_or_compute("key", lambda: {"ok": True}) == {"ok": True}
+
+
+def test_error_results_are_not_cached():
+    cache = ResultCache(ttl=60, max_entries=16)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"error": "Model not loaded"}
+
+    cache.get_or_compute("key", compute)
+    cache.get_or_compute("key", compute)
+
+    assert len(calls) == 2
+    assert cache.metrics()["entries"] == 0
+
+
+def test_results_expire_after_ttl():
+    cache = ResultCache(ttl=0.05, max_entries=16)
+    cache.get_or_compute("key", lambda: {"value": 1})
+    time.sleep(0.1)
+
+    assert cache.get_or_compute("key", lambda: {"value": 2}) == {"value": 2}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(ttl=60, max_entries=2)
+    cache.get_or_compute("a", lambda: {"value": "a"})
+    cache.get_or_compute("b", lambda: {"value": "b"})
+    cache.get_or_compute("a", lambda: pytest.fail("recomputed"))
+    cache.get_or_compute("c", lambda: {"value": "c"})
+
+    assert cache.get_or_compute("a", lambda: pytest.fail("recomputed")) == {"value": "a"}
+    assert cache.get_or_compute("b", lambda: {"value": "b2"}) == {"value": "b2"}
+
+
+def test_result_computed_across_clear_is_not_cached():
+    cache = ResultCache(ttl=60, max_entries=16)
+    compute = BlockingCompute({"value": "old"})
+
+    thread = threading.Thread(target=cache.get_or_compute, args=("key", compute))
+    thread.start()
+    wait_until(lambda: compute.calls == 1)
+    cache.clear()
+    compute.release.set()
+    thread.join(5.0)
+
+    assert cache.get_or_compute("key", lambda: {"value": "new"}) == {"value": "new"}
@@ -0,0 +1,193 @@
+import asyncio
+import base64
+import io
+
+import httpx
+import numpy as np
+import pytest
+from PIL import Image
+from starlette.datastructures import Headers
+from starlette.formparsers import MultiPartParser
+from starlette.testclient import TestClient
+
+import asgi_server
+import server
+
+# Upload limit used by these tests (MAX_UPLOAD_MB is 16 by default)
+MAX_UPLOAD_BYTES = 4096
+
+
+def encode_png(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", MAX_UPLOAD_BYTES)
+    return server.app.test_client()
+
+
+@pytest.fixture
+def small_images():
+    image1 = encode_png(np.full((16, 16, 3), (120, 80, 40), dtype=np.uint8))
+    image2 = encode_png(np.full((16, 16, 3), (100, 90, 60), dtype=np.uint8))
+    assert len(image1) < MAX_UPLOAD_BYTES and len(image2) < MAX_UPLOAD_BYTES
+    return image1, image2
+
+
+@pytest.fixture
+def large_image():
+    pixels = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    image = encode_png(pixels)
+    assert len(image) > MAX_UPLOAD_BYTES
+    return image
+
+
+def test_upload_matches_json_route(client, small_images):
+    image1, image2 = small_images
+
+    upload = client.post("/rgb-difference/upload", data={
+        "image1": (io.BytesIO(image1), "image1.png"),
+        "image2": (io.BytesIO(image2), "image2.png")
+    })
+    json_route = client.post("/rgb-difference", json={
+        "image1": "data:image/png;base64," + base64.b64encode(image1).decode(),
+        "image2": base64.b64encode(image2).decode()
+    })
+
+    assert upload.status_code == 200
+    assert upload.get_json() == json_route.get_json()
+
+
+def test_oversized_multipart_body_is_rejected(client, large_image):
+    body = large_image * 3
+
+    response = client.post("/api/classify-wood/upload", data={
+        "image": (io.BytesIO(body), "image.png"),
+        "color": "desert-oak"
+    })
+
+    assert response.status_code == 413
+
+
+def test_oversized_image_within_the_body_limit_is_rejected(client, small_images, large_image):
+    # Two-image routes accept twice the body size, but each image is still limited
+    response = client.post("/rgb-difference/upload", data={
+        "image1": (io.BytesIO(large_image), "image1.png"),
+        "image2": (io.BytesIO(small_images[1]), "image2.png")
+    })
+
+    assert response.status_code == 413
+
+
+def test_oversized_raw_body_is_rejected(client, large_image):
+    response = client.post("/api/classify-wood/upload?color=desert-oak", data=large_image * 20,
+                           content_type="image/png")
+
+    assert response.status_code == 413
+
+
+def test_oversized_chunked_body_is_rejected(client, large_image):
+    # No Content-Length: the body is cut off while it is read
+    response = client.post("/api/classify-wood/upload?color=desert-oak",
+                           input_stream=io.BytesIO(large_image * 20), content_type="image/png",
+                           headers={"Transfer-Encoding": "chunked"},
+                           environ_overrides={"wsgi.input_terminated": True})
+
+    assert response.status_code == 413
+
+
+def test_oversized_json_body_is_rejected(client, large_image):
+    encoded = base64.b64encode(large_image * 3).decode()
+
+    response = client.post("/api/classify-wood", json={"image": encoded, "color": "desert-oak"})
+
+    assert response.status_code == 413
+
+
+def test_missing_upload_is_a_bad_request(client):
+    response = client.post("/api/classify-wood/upload", data={"color": "desert-oak"})
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def asgi_client(monkeypatch):
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", MAX_UPLOAD_BYTES)
+    monkeypatch.setattr(asgi_server, "MAX_UPLOAD_BYTES", MAX_UPLOAD_BYTES)
+    for name in ("decode", "inference"):
+        monkeypatch.setitem(asgi_server.stages, name, asgi_server.Stage(name, 2))
+    return TestClient(asgi_server.app)
+
+
+def chunks(body, size=1024):
+    """Stream a body in chunks, so it is sent without a Content-Length."""
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_asgi_upload_matches_json_route(asgi_client, small_images):
+    image1, image2 = small_images
+
+    upload = asgi_client.post("/rgb-difference/upload", files={
+        "image1": ("image1.png", image1, "image/png"),
+        "image2": ("image2.png", image2, "image/png")
+    })
+    json_route = asgi_client.post("/rgb-difference", json={
+        "image1": base64.b64encode(image1).decode(),
+        "image2": base64.b64encode(image2).decode()
+    })
+
+    assert upload.status_code == 200
+    assert upload.json() == json_route.json()
+
+
+@pytest.mark.parametrize("path, content_type", [
+    ("/api/classify-wood/upload?color=desert-oak", "image/png"),
+    ("/rgb-difference", "application/json")
+])
+def test_asgi_oversized_chunked_body_is_rejected(asgi_client, large_image, path, content_type):
+    response = asgi_client.post(path, content=chunks(large_image * 20), headers={"Content-Type": content_type})
+
+    assert response.status_code == 413
+
+
+def test_asgi_oversized_chunked_multipart_body_is_rejected(asgi_client, large_image):
+    form = httpx.Request("POST", "http://testserver/", files={
+        "image1": ("image1.png", large_image * 10, "image/png"),
+        "image2": ("image2.png", large_image * 10, "image/png")
+    })
+
+    response = asgi_client.post("/rgb-difference/upload", content=chunks(form.read()),
+                                headers={"Content-Type": form.headers["Content-Type"]})
+
+    assert response.status_code == 413
+
+
+def test_asgi_oversized_image_within_the_body_limit_is_rejected(asgi_client, small_images, large_image):
+    response = asgi_client.post("/rgb-difference/upload", files={
+        "image1": ("image1.png", large_image, "image/png"),
+        "image2": ("image2.png", small_images[1], "image/png")
+    })
+
+    assert response.status_code == 413
+
+
+def test_asgi_uploads_over_one_megabyte_stay_in_memory():
+    headers = Headers({"Content-Type": "multipart/form-data; boundary=x"})
+    body = (b'--x\r\nContent-Disposition: form-data; name="image"; filename="image.png"\r\n\r\n'
+            + b"\0" * (1536 * 1024) + b"\r\n--x--\r\n")
+
+    async def parse():
+        async def stream():
+            yield body
+        return await asgi_server.UploadParser(headers, stream()).parse()
+
+    form = asyncio.run(parse())
+
+    assert form["image"].size == 1536 * 1024
+    assert not form["image"].file._rolled
+    # Other multipart parsers keep Starlette's default
+    assert MultiPartParser.max_file_size == 1024 * 1024
@@ -0,0 +1,114 @@
+import importlib.util
+import json
+import os
+import threading
+
+import pytest
+
+import server
+from conftest import pool_interpreters
+
+GUNICORN_CONF_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+
+
+def make_models(names):
+    return {name: {"file": f"{name}.tflite", "type": "classification", "class_names": ["a", "b"]}
+            for name in names}
+
+
+class StubWorker:
+    """The parts of a gunicorn worker that post_fork uses."""
+
+    class log:
+        @staticmethod
+        def info(message):
+            pass
+
+    def __init__(self):
+        self.pid = os.getpid()
+
+
+@pytest.fixture
+def gunicorn_conf(monkeypatch):
+    """Load gunicorn.conf.py as gunicorn does, with long watcher intervals."""
+    monkeypatch.setenv("PRELOAD_MODELS", "first")
+    monkeypatch.setenv("MODEL_WATCH_INTERVAL", "3600")
+    monkeypatch.setenv("DATASET_MANIFEST_CHECK_INTERVAL", "3600")
+    monkeypatch.setattr(server, "dataset_watcher_pid", None)
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", GUNICORN_CONF_PATH)
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+    return conf
+
+
+def test_config_keeps_the_master_from_loading_models_or_watching(gunicorn_conf):
+    assert gunicorn_conf.preload_app is True
+    assert gunicorn_conf.preload_models == ["first"]
+    assert gunicorn_conf.model_watch_interval == 3600.0
+    # Read by server.py when the master imports it
+    assert os.environ["PRELOAD_MODELS"] == ""
+    assert os.environ["MODEL_WATCH_INTERVAL"] == "0"
+    assert os.environ["DATASET_MANIFEST_CHECK_INTERVAL"] == "0"
+
+
+def test_master_checks_models_without_keeping_them(gunicorn_conf, stub_registry):
+    registry = stub_registry(make_models(["first", "second"]))
+
+    gunicorn_conf.on_starting(arbiter=None)
+
+    assert registry.metrics()["loaded_models"] == []
+
+
+def test_post_fork_loads_and_warms_up_the_worker_models(gunicorn_conf, stub_registry):
+    registry = stub_registry(make_models(["first", "second"]))
+
+    gunicorn_conf.post_fork(arbiter=None, worker=StubWorker())
+
+    assert registry.metrics()["loaded_models"] == ["first"]
+    assert all(interpreter.batch_sizes for interpreter in pool_interpreters(registry.get("first").pool))
+    assert registry._watcher_pid == os.getpid()
+    assert server.dataset_watcher_pid == os.getpid()
+
+
+def test_watchers_start_once_per_process(gunicorn_conf, stub_registry):
+    stub_registry(make_models(["first"]))
+    gunicorn_conf.post_fork(arbiter=None, worker=StubWorker())
+    threads = threading.active_count()
+
+    gunicorn_conf.post_fork(arbiter=None, worker=StubWorker())
+
+    assert threading.active_count() == threads
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_worker_builds_its_own_interpreters_and_watchers(gunicorn_conf, stub_registry):
+    registry = stub_registry(make_models(["first"]))
+    gunicorn_conf.on_starting(arbiter=None)
+    registry.start_watcher(3600)
+    read_fd, write_fd = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        # Child: report back through the pipe and never return into pytest
+        try:
+            os.close(read_fd)
+            gunicorn_conf.post_fork(arbiter=None, worker=StubWorker())
+            pool = registry.get("first")
+            os.write(write_fd, json.dumps({
+                "pid": os.getpid(),
+                "watcher_pid": registry._watcher_pid,
+                "loaded_models": registry.metrics()["loaded_models"],
+                "warmed_up": all(interpreter.batch_sizes for interpreter in pool_interpreters(pool.pool))
+            }).encode())
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        child = json.loads(f.read() or "{}")
+    os.waitpid(pid, 0)
+
+    assert child == {"pid": pid, "watcher_pid": pid, "loaded_models": ["first"], "warmed_up": True}
+    # The master is untouched by what the worker loaded
+    assert registry._watcher_pid == os.getpid()
+    assert registry.metrics()["loaded_models"] == []
@@ -0,0 +1,37 @@
+# TFLite interpreter creation shared by the server and the model tools
+# (server.py, tune_models.py, compare_quantized.py), so they all run models
+# on the same runtime with the same thread and delegate options.
+
+# Prefer the standalone TFLite runtime (a few MB, fast import); the full
+# TensorFlow package is only imported when tflite_runtime is not installed
+try:
+    from tflite_runtime.interpreter import Interpreter, OpResolverType, load_delegate
+    TFLITE_BACKEND = "tflite_runtime"
+except ImportError:
+    from tensorflow.lite.python.interpreter import Interpreter, OpResolverType, load_delegate
+    TFLITE_BACKEND = "tensorflow"
+
+
+def create_interpreter(model_path, num_threads=None, delegate=None, delegate_options=None):
+    """
+    Create a TFLite interpreter with the thread and delegate settings of a model.
+
+    Args:
+        model_path: Path to the .tflite file
+        num_threads: Number of CPU threads per invoke (None uses the runtime default)
+        delegate: 'xnnpack' or None for the default XNNPACK CPU delegate, 'none' for
+                  plain builtin kernels, or the path of an external delegate library
+        delegate_options: Options passed to an external delegate library
+
+    Returns:
+        Interpreter: Interpreter with tensors allocated
+    """
+    kwargs = {"model_path": model_path, "num_threads": num_threads}
+    if delegate == "none":
+        kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    elif delegate not in (None, "xnnpack"):
+        kwargs["experimental_delegates"] = [load_delegate(delegate, delegate_options or {})]
+
+    interpreter = Interpreter(**kwargs)
+    interpreter.allocate_tensors()
+    return interpreter
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from tflite_interpreter import create_interpreter
+
+# ============= CONFIGURATION =============
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(SCRIPT_DIR, "assets", "models")
+MODEL_MANIFEST_PATH = os.path.join(MODELS_DIR, "manifest.json")
+
+# Candidate batch sizes (the server's micro-batching groups up to this many requests)
+DEFAULT_BATCH_SIZES = [1, 2, 4, 8]
+# Timed invokes per configuration, after one warm-up invoke
+DEFAULT_RUNS = 20
+
+# Model files of a manifest entry, with the key their tuned settings are stored
+# under (None: the entry itself). The int8 variant has its own latency profile,
+# so it is tuned and stored separately.
+MODEL_VARIANTS = [
+    ("file", None),
+    ("quantized_file", "quantized_settings")
+]
+# =========================================================
+
+def load_manifest(manifest_path=MODEL_MANIFEST_PATH):
+    """
+    Load the model manifest.
+
+    Args:
+        manifest_path: Path to manifest.json
+
+    Returns:
+        dict: The parsed manifest
+    """
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def benchmark_model(model_path, num_threads, batch_size, delegate=None, delegate_options=None, runs=DEFAULT_RUNS):
+    """
+    Time batched invokes of a model with the given settings.
+
+    Args:
+        model_path: Path to the .tflite file
+        num_threads: Number of CPU threads per invoke
+        batch_size: Number of images per invoke
+        delegate: Delegate setting (see create_interpreter)
+        delegate_options: Options of an external delegate
+        runs: Number of timed invokes
+
+    Returns:
+        dict: Median latency per invoke (ms) and throughput (images/sec)
+    """
+    interpreter = create_interpreter(model_path, num_threads, delegate, delegate_options)
+    input_details = interpreter.get_input_details()[0]
+
+    input_shape = list(input_details['shape'])
+    if input_shape[0] != batch_size:
+        input_shape[0] = batch_size
+        interpreter.resize_tensor_input(input_details['index'], input_shape)
+        interpreter.allocate_tensors()
+        input_details = interpreter.get_input_details()[0]
+
+    # Random input so kernels cannot take shortcuts on constant data
+    rng = np.random.RandomState(0)
+    if np.issubdtype(input_details['dtype'], np.integer):
+        info = np.iinfo(input_details['dtype'])
+        input_data = rng.randint(info.min, info.max + 1, size=input_shape).astype(input_details['dtype'])
+    else:
+        input_data = rng.random_sample(input_shape).astype(input_details['dtype'])
+
+    interpreter.set_tensor(input_details['index'], input_data)
+    interpreter.invoke()
+
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        interpreter.set_tensor(input_details['index'], input_data)
+        interpreter.invoke()
+        timings.append(time.perf_counter() - start_time)
+
+    latency = float(np.median(timings))
+    return {
+        "latency_ms": latency * 1000,
+        "images_per_sec": batch_size / latency
+    }
+
+def tune_model(model_name, entry, thread_counts, batch_sizes, objective="throughput", runs=DEFAULT_RUNS,
+               models_dir=MODELS_DIR, file_key="file"):
+    """
+    Benchmark one model file across thread counts and batch sizes and pick the best settings.
+
+    Args:
+        model_name: Name of the model in the manifest
+        entry: Manifest entry of the model
+        thread_counts: Candidate num_threads values
+        batch_sizes: Candidate batch sizes
+        objective: 'throughput' maximizes images/sec, 'latency' minimizes single-image latency
+        runs: Number of timed invokes per configuration
+        models_dir: Folder containing the model files
+        file_key: Entry key of the file to benchmark ('file' or 'quantized_file')
+
+    Returns:
+        dict: Best num_threads and max_batch_size, or None if the model could not be benchmarked
+    """
+    model_path = os.path.join(models_dir, entry[file_key])
+    delegate = entry.get("delegate")
+    delegate_options = entry.get("delegate_options")
+
+    # Latency tuning only looks at single-image invokes
+    if objective == "latency":
+        batch_sizes = [1]
+
+    print(f"\n{model_name} ({entry[file_key]})")
+    results = []
+    for num_threads in thread_counts:
+        for batch_size in batch_sizes:
+            try:
+                stats = benchmark_model(model_path, num_threads, batch_size, delegate, delegate_options, runs)
+            except Exception as e:
+                # Models converted with a fixed batch size cannot be resized
+                print(f"  threads={num_threads} batch={batch_size}: skipped ({str(e).strip()})")
+                continue
+            print(f"  threads={num_threads} batch={batch_size}: "
+                  f"{stats['latency_ms']:.2f} ms/invoke, {stats['images_per_sec']:.1f} images/sec")
+            results.append((num_threads, batch_size, stats))
+
+    if not results:
+        return None
+
+    if objective == "latency":
+        num_threads, batch_size, stats = min(results, key=lambda r: r[2]["latency_ms"])
+    else:
+        # Prefer fewer threads and smaller batches when throughput is within 5%
+        best_throughput = max(r[2]["images_per_sec"] for r in results)
+        candidates = [r for r in results if r[2]["images_per_sec"] >= 0.95 * best_throughput]
+        num_threads, batch_size, stats = min(candidates, key=lambda r: (r[0], r[1]))
+
+    print(f"  -> num_threads={num_threads}, max_batch_size={batch_size}")
+    return {"num_threads": num_threads, "max_batch_size": batch_size}
+
+def tune_models(model_names=None, workers=1, batch_sizes=None, objective="throughput",
+                runs=DEFAULT_RUNS, manifest_path=MODEL_MANIFEST_PATH, dry_run=False):
+    """
+    Tune every model of the manifest for this host and write the best settings back.
+
+    Args:
+        model_names: Optional list of models to tune (defaults to all manifest models)
+        workers: Number of server processes sharing the host's cores
+        batch_sizes: Candidate batch sizes (defaults to DEFAULT_BATCH_SIZES)
+        objective: 'throughput' or 'latency'
+        runs: Number of timed invokes per configuration
+        manifest_path: Path to manifest.json
+        dry_run: Only print the results without updating the manifest
+
+    Returns:
+        dict: Chosen settings per model, keyed by the file key of each variant
+    """
+    manifest = load_manifest(manifest_path)
+    models = manifest.get("models", {})
+    model_names = model_names or list(models)
+    batch_sizes = batch_sizes or DEFAULT_BATCH_SIZES
+
+    # Each worker process gets an equal share of the cores
+    max_threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    thread_counts = sorted({1, max_threads} | {2 ** i for i in range(max_threads.bit_length()) if 2 ** i <= max_threads})
+    print(f"Tuning for {objective} with up to {max_threads} threads per model ({workers} workers, {os.cpu_count()} cores)")
+
+    models_dir = os.path.dirname(os.path.abspath(manifest_path))
+    chosen = {}
+    for model_name in model_names:
+        if model_name not in models:
+            print(f"\nSkipping {model_name}: not in the manifest")
+            continue
+        entry = models[model_name]
+        for file_key, _ in MODEL_VARIANTS:
+            if not entry.get(file_key):
+                continue
+            if not os.path.exists(os.path.join(models_dir, entry[file_key])):
+                print(f"\nSkipping {model_name} {file_key}: {entry[file_key]} not found")
+                continue
+            settings = tune_model(model_name, entry, thread_counts, batch_sizes, objective, runs,
+                                  models_dir, file_key)
+            if settings is not None:
+                chosen.setdefault(model_name, {})[file_key] = settings
+
+    if dry_run:
+        print("\nDry run: manifest not updated")
+        return chosen
+
+    for model_name, variants in chosen.items():
+        for file_key, settings_key in MODEL_VARIANTS:
+            if file_key not in variants:
+                continue
+            if settings_key is None:
+                models[model_name].update(variants[file_key])
+            else:
+                models[model_name].setdefault(settings_key, {}).update(variants[file_key])
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"\nUpdated {len(chosen)} models in {manifest_path} (POST /admin/reload-models to apply)")
+
+    return chosen
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TFLite models across thread counts and batch sizes and store the best settings.')
+    parser.add_argument('--models', type=str, nargs='+', help='Models to tune (default: every model in the manifest)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of server worker processes on this host')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES, help='Candidate batch sizes')
+    parser.add_argument('--objective', type=str, default='throughput', choices=['throughput', 'latency'],
+                        help='Optimize images/sec or single-image latency')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='Timed invokes per configuration')
+    parser.add_argument('--manifest', type=str, default=MODEL_MANIFEST_PATH, help='Path to the model manifest')
+    parser.add_argument('--dry_run', action='store_true', help='Print the results without updating the manifest')
+
+    args = parser.parse_args()
+
+    tune_models(args.models, args.workers, args.batch_sizes, args.objective,
+                args.runs, args.manifest, args.dry_run)
+
+if __name__ == "__main__":
+    main()